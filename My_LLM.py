@@ -1,12 +1,22 @@
 import requests
 import json
-from ddgs import DDGS
+from time import perf_counter
+from requests.adapters import HTTPAdapter
+from My_history import ChatHistory
+from My_search import WebSearch
+import My_tracing as tracing
+
+
+def pooled_session(size: int) -> requests.Session:
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=size))
+    return session
 
 
 class MyLlm:
     # Public
     SERVER_URL = "http://localhost:11434/api/chat"
-    conversation_history: list = None
+    history: ChatHistory = None
     instructions: str = None
     Model: str = None
     ModelTemperature = 0.7
@@ -30,66 +40,211 @@ class MyLlm:
         instructions: str = None,
         Model: str = "llama3.2",
         getTokenCount: bool = False,
+        keep_alive: str = "30m",
+        token_budget: int = 1500,
+        summarize_history: bool = False,
+        search_backend=None,
+        search_timeout: float = 2.0,
+        session: requests.Session = None,
+        response_cache=None,
     ):
         self.Model = Model
         self.instructions = instructions if instructions else ""
-        self.conversation_history = [
-            {
-                "role": "system",
-                "content": f" {self.instructions}. {self.__LLM_CONFIG_INSTRUCTION__}",
-            }
-        ]
+        self.history = ChatHistory(
+            f" {self.instructions}. {self.__LLM_CONFIG_INSTRUCTION__}",
+            token_budget=token_budget,
+            summarizer=self.__summarize__ if summarize_history else None,
+        )
         self.getTokenCount = getTokenCount
+        self._cancelled = False
+        self._active_response = None
+        # How long Ollama keeps the model loaded after a request ("-1" = forever)
+        self.keep_alive = keep_alive
+        # Pooled keep-alive connections instead of a new TCP connection per
+        # turn; several MyLlm can share one pool (session)
+        self.session = session or pooled_session(4)
+        # The reply goes ahead without results if the search misses its deadline
+        self.search = WebSearch(
+            search_backend, timeout=search_timeout, max_results=self.__depth_search__
+        )
+        # Opt-in ResponseCache: repeated prompts are answered without a request
+        self.response_cache = response_cache
+
+    def __web_search__(self, query):
+        return self.search.search(query)
 
-    def __web_search__(self, query, max_results=__depth_search__):
-        print("Searching Online ...")
-        with DDGS() as ddgs:
-            results = list(ddgs.text(query, max_results=max_results))
-            return "\n".join([f"- {r['title']}: {r['body']}" for r in results])
+    @property
+    def conversation_history(self) -> list:
+        return self.history.messages()
 
     def clearChat(self):
-        self.conversation_history.clear()
+        self.history.clear()
         print("[🧹] Chat Cleared")
 
     def chat(self, prompt: str, isStream=True, needFullConvo=False, print_output=True):
-        # Check if needs any online search
-        if self.__needOnlineSearch__(prompt):
-            try:
-                search_results = self.__web_search__(prompt)
-                augmented_prompt = f"""User question: {prompt}
-                    Web search results:
-                    {search_results}
-                    Answer based on the search results above."""
-                self.conversation_history.append(
-                    {"role": "user", "content": augmented_prompt}
-                )
-            except Exception:
-                print(
-                    "[System] No WiFi connection. For updated results, connect to WiFi."
-                )
-                self.conversation_history.append({"role": "user", "content": prompt})
-        else:
-            self.conversation_history.append({"role": "user", "content": prompt})
+        self._cancelled = False
+        key, cached = self.__cached_reply__(prompt)
+        if cached is not None:
+            if print_output:
+                print(f"‣ {cached}")
+            return cached
+        store = self.__cache_store__(key, prompt)
+        self.__add_user_turn__(prompt)
+
+        if isStream:
+            if print_output:
+                print("‣ ", end="")
+            response = ""
+            for chunk in self.__stream_reply__(store):
+                response += chunk
+                if print_output:
+                    print(chunk, end="", flush=True)
+            if print_output:
+                print("")
+            return response
+
+        try:
+            RES = self.session.post(self.SERVER_URL, json=self.__request_data__(False))
+            RES.raise_for_status()
+            response = self.__chat_without_stream__(RES)
+        except Exception:
+            self.history.discard_pending()
+            raise
+        self.history.add_assistant(response)
+        if store is not None:
+            store(response)
+        return response
+
+    # Yields the reply chunk by chunk; the (possibly partial) reply is added
+    # to the history once the stream ends or is cancelled after output began.
+    # If the request fails, or is cancelled before any output, the question
+    # is dropped from the history again. Not a generator itself, so a cancel()
+    # between this call and the first next() still applies.
+    def chat_stream(self, prompt: str):
+        self._cancelled = False
+        return self.__chat_stream__(prompt)
 
-        data = {
+    def __chat_stream__(self, prompt: str):
+        if self._cancelled:
+            return
+        key, cached = self.__cached_reply__(prompt)
+        if cached is not None:
+            yield cached
+            return
+        store = self.__cache_store__(key, prompt)
+        self.__add_user_turn__(prompt)
+        yield from self.__stream_reply__(store)
+
+    def warm(self, prime: bool = False) -> float:
+        # A request without messages makes Ollama load the model and keep it
+        # resident for keep_alive, without generating anything. prime also
+        # evaluates the system prompt (generating a single token), so it is
+        # already in Ollama's prompt cache on the first turn.
+        start = perf_counter()
+        data = {"model": self.Model, "messages": [], "keep_alive": self.keep_alive}
+        if prime:
+            data["messages"] = self.history.messages()[:1]
+            data["stream"] = False
+            data["options"] = {"num_predict": 1, "temperature": self.ModelTemperature}
+        RES = self.session.post(self.SERVER_URL, json=data)
+        RES.raise_for_status()
+        return perf_counter() - start
+
+    def cancel(self):
+        self._cancelled = True
+        RES = self._active_response
+        if RES is not None:
+            RES.close()
+
+    def __request_data__(self, isStream: bool):
+        return {
             "model": self.Model,
-            "messages": self.conversation_history,
+            "messages": self.history.prepare(),
             "options": {"num_predict": 512, "temperature": self.ModelTemperature},
             "stream": isStream,
+            "keep_alive": self.keep_alive,
         }
 
-        RES = requests.post(self.SERVER_URL, json=data, stream=isStream)
-        response = None
+    def __stream_reply__(self, store=None):
+        # store(response) is called if the reply completes
+        response = ""
+        RES = None
+        failed = False
+        try:
+            if self._cancelled:
+                return
+            RES = self.session.post(
+                self.SERVER_URL, json=self.__request_data__(True), stream=True
+            )
+            self._active_response = RES
+            RES.raise_for_status()
+            for chunk in self.__chat_with_stream__(RES):
+                if self._cancelled:
+                    break
+                if not response:
+                    tracing.mark("first_token")
+                response += chunk
+                yield chunk
+            if store is not None and not self._cancelled:
+                store(response)
+        except Exception:
+            # Closing the response from cancel() aborts the read mid-stream
+            if not self._cancelled:
+                failed = True
+                raise
+        finally:
+            if response:
+                tracing.mark("last_token")
+            self._active_response = None
+            if RES is not None:
+                RES.close()
+            if failed or (self._cancelled and not response):
+                self.history.discard_pending()
+            else:
+                self.history.add_assistant(response)
 
-        if print_output:
-            print("‣ ", end="")
-        if isStream:
-            response = self.__chat_with_stream__(RES, print_output)
-        else:
-            response = self.__chat_without_stream__(RES)
+    def __cached_reply__(self, prompt: str):
+        # (cache key, cached reply or None); a hit goes into the history as if
+        # it had been generated
+        if self.response_cache is None:
+            return None, None
+        key = self.response_cache.key(
+            prompt, self.Model, self.ModelTemperature, self.history.messages()
+        )
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            tracing.mark("first_token")
+            tracing.mark("last_token")
+            tracing.annotate(response_cache="hit")
+            self.history.add_user(prompt)
+            self.history.add_assistant(cached)
+        return key, cached
 
-        self.conversation_history.append({"role": "assistant", "content": response})
-        return response
+    def __cache_store__(self, key: str, prompt: str):
+        # Stores the reply to prompt under key once it completes; the latency
+        # saved on a hit includes the web search
+        if key is None:
+            return None
+        started = perf_counter()
+        searched = self.__needOnlineSearch__(prompt)
+        return lambda response: self.response_cache.put(
+            key, response, perf_counter() - started, searched
+        )
+
+    def __add_user_turn__(self, prompt: str):
+        # Check if needs any online search
+        search_results = None
+        if self.__needOnlineSearch__(prompt):
+            search_results = self.__web_search__(prompt)
+
+        if search_results:
+            augmented_prompt = f"""User question: {prompt}
+                Web search results:
+                {search_results}
+                Answer based on the search results above."""
+            self.history.add_user(augmented_prompt, plain=prompt)
+        else:
+            self.history.add_user(prompt)
 
     def __format_tokens__(self, count):
         if count >= 1000:
@@ -102,33 +257,52 @@ class MyLlm:
             f"\n[🤖] Tokens Burned 🔥: {self.__format_tokens__(self.totalTokensUsed)}"
         )
 
+    def __record_usage__(self, data: dict):
+        prompt_tokens = data.get("prompt_eval_count", 0)
+        eval_tokens = data.get("eval_count", 0)
+        self.history.record_usage(prompt_tokens, eval_tokens)
+        tracing.record_ollama(data)
+        if self.getTokenCount:
+            self.__print_token_count__(prompt_tokens, eval_tokens)
+
+    def __summarize__(self, summary: str, messages: list[dict]) -> str:
+        # Fold dropped turns into the running summary; runs only on compaction
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        RES = self.session.post(
+            self.SERVER_URL,
+            json={
+                "model": self.Model,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": "Summarize this conversation in at most 3 "
+                        "sentences, keeping names, facts and user preferences.\n"
+                        f"Summary so far: {summary or 'none'}\n{transcript}",
+                    }
+                ],
+                "options": {"num_predict": 128, "temperature": 0},
+                "stream": False,
+                "keep_alive": self.keep_alive,
+            },
+        )
+        RES.raise_for_status()
+        return RES.json()["message"]["content"].strip()
+
     def __needOnlineSearch__(self, prompt: str):
         return any(word in prompt.lower() for word in self.__ONLINE_TRIGGER_LIST__)
 
-    def __chat_with_stream__(self, RES, print_output=True):
-        full_response = ""
+    def __chat_with_stream__(self, RES):
         for line in RES.iter_lines():
             if line:
                 json_response = json.loads(line)
                 if "message" in json_response:
-                    chunk = json_response["message"]["content"]
-                    full_response += chunk
-                    if print_output:
-                        print(chunk, end="", flush=True)
-                if json_response.get("done") and self.getTokenCount:
-                    prompt_tokens = json_response.get("prompt_eval_count", 0)
-                    eval_tokens = json_response.get("eval_count", 0)
-                    self.__print_token_count__(prompt_tokens, eval_tokens)
-        if print_output:
-            print("")
-        return full_response
+                    yield json_response["message"]["content"]
+                if json_response.get("done"):
+                    self.__record_usage__(json_response)
 
     def __chat_without_stream__(self, RES):
         data = RES.json()
-        if self.getTokenCount:
-            prompt_tokens = data.get("prompt_eval_count", 0)
-            eval_tokens = data.get("eval_count", 0)
-            self.__print_token_count__(prompt_tokens, eval_tokens)
+        self.__record_usage__(data)
         return data["message"]["content"]
 
     # ! Requires string cleaning
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from My_capture import load_audio_file
+
+
+class AudioCache:
+    # Decoded audio files as memory-mapped .npy, keyed by a hash of the file's
+    # content (and the sample rate), so reruns across models and processes
+    # skip ffmpeg. Optionally caches Whisper's 30 s log-mel window as well.
+    # Size-capped on disk; least recently used entries go first.
+    __DEFAULT__ = None
+
+    @classmethod
+    def default(cls) -> "AudioCache":
+        if cls.__DEFAULT__ is None:
+            cls.__DEFAULT__ = cls()
+        return cls.__DEFAULT__
+
+    def __init__(self, cache_dir: str = "./cache/audio", disk_bytes: int = 1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.disk_bytes = disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._keys = {}  # (path, size, mtime) -> content key, saves rehashing
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._disk_size = sum(size for _, _, size in self.__disk_entries__())
+
+    def key(self, path: str, sample_rate: int = 16000) -> str:
+        stat = os.stat(path)
+        file_id = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        digest = self._keys.get(file_id)
+        if digest is None:
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(block)
+            digest = self._keys[file_id] = h.hexdigest()
+        return f"{digest}.{sample_rate}"
+
+    def load(self, path: str, sample_rate: int = 16000) -> np.ndarray:
+        # float32 mono audio; on a hit memory-mapped copy-on-write, so callers
+        # (and torch.from_numpy) may still write to it
+        key = self.key(path, sample_rate)
+        audio = self.__read__(key)
+        if audio is None:
+            audio = load_audio_file(path, sample_rate)
+            self.__write__(key, audio)
+        return audio
+
+    def mel(self, path: str, n_mels: int = 80) -> np.ndarray:
+        # log-mel of the audio padded or trimmed to Whisper's 30 s window, as
+        # fed to whisper.decode (n_mels=128 for large-v3 models)
+        import whisper
+
+        key = f"{self.key(path)}.mel{n_mels}"
+        mel = self.__read__(key)
+        if mel is None:
+            audio = whisper.pad_or_trim(np.asarray(self.load(path), np.float32))
+            mel = whisper.log_mel_spectrogram(audio, n_mels).numpy()
+            self.__write__(key, mel)
+        return mel
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "disk_bytes": self._disk_size,
+        }
+
+    def __file_path__(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def __read__(self, key: str):
+        path = self.__file_path__(key)
+        try:
+            array = np.load(path, mmap_mode="c")
+        except (FileNotFoundError, ValueError):
+            # ValueError: truncated or foreign file, rebuilt on the miss
+            with self._lock:
+                self.misses += 1
+            return None
+        os.utime(path)  # evicts least recently used by mtime
+        with self._lock:
+            self.hits += 1
+        return array
+
+    def __write__(self, key: str, array: np.ndarray):
+        if array.nbytes > self.disk_bytes:
+            return
+        path = self.__file_path__(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        size = os.path.getsize(tmp_path)
+        exists = os.path.exists(path)  # written meanwhile by another process
+        os.replace(tmp_path, path)
+        if exists:
+            return
+        with self._lock:
+            self._disk_size += size
+            if self._disk_size > self.disk_bytes:
+                self.__evict__()
+
+    def __disk_entries__(self):
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".npy"):
+                stat = entry.stat()
+                yield entry.path, stat.st_mtime, stat.st_size
+
+    def __evict__(self):
+        # Trim to 90% of the cap so we don't rescan on every insert
+        target = self.disk_bytes * 0.9
+        for path, _, size in sorted(self.__disk_entries__(), key=lambda e: e[1]):
+            if self._disk_size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._disk_size -= size
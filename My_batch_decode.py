@@ -0,0 +1,53 @@
+import numpy as np
+import torch
+import whisper
+from whisper.audio import N_SAMPLES
+
+from My_fast_decode import COMPRESSION_RATIO_THRESHOLD, LOGPROB_THRESHOLD, NO_SPEECH_THRESHOLD
+
+
+def transcribe_batch(model, segments: list, language: str = "en", fp16: bool = True) -> list[str]:
+    # Several short segments through one encoder/decoder pass: each is padded
+    # to Whisper's 30 s window and the mels are stacked into one batch, decoded
+    # greedily. Results that whisper.transcribe would skip as no speech come
+    # back empty; those failing its log-probability or compression-ratio
+    # checks, and segments longer than the window, go through model.transcribe
+    # (temperature fallback, sliding window).
+    fp16 = fp16 and model.device.type != "cpu"
+
+    def full(audio) -> str:
+        result = model.transcribe(audio, language=language, fp16=fp16, verbose=None)
+        return result["text"].strip()
+
+    texts = [None] * len(segments)
+    short = []
+    for i, audio in enumerate(segments):
+        if len(audio) <= N_SAMPLES:
+            short.append(i)
+        else:
+            texts[i] = full(audio)
+    if not short:
+        return texts
+
+    mel = torch.stack(
+        [
+            whisper.log_mel_spectrogram(
+                whisper.pad_or_trim(np.asarray(segments[i], dtype=np.float32)),
+                model.dims.n_mels,
+            )
+            for i in short
+        ]
+    ).to(model.device)
+    options = whisper.DecodingOptions(language=language, without_timestamps=True, fp16=fp16)
+    results = whisper.decode(model, mel, options)
+    for i, result in zip(short, results):
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+            texts[i] = ""
+        elif (
+            result.avg_logprob < LOGPROB_THRESHOLD
+            or result.compression_ratio > COMPRESSION_RATIO_THRESHOLD
+        ):
+            texts[i] = full(segments[i])
+        else:
+            texts[i] = result.text.strip()
+    return texts
@@ -0,0 +1,201 @@
+import threading
+import time
+import wave
+
+import numpy as np
+
+try:
+    import sounddevice as sd
+except OSError:  # PortAudio missing (headless CI): only replayed input works
+    sd = None
+
+
+class RingBuffer:
+    # Preallocated float32 ring. Every sample is written twice (at i and
+    # i + capacity), so any window of up to capacity samples is a single
+    # contiguous slice and can be handed out as a view, even across the wrap.
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.total = 0  # absolute position: samples written so far
+        self._data = np.zeros(2 * capacity, dtype=np.float32)
+
+    def write(self, samples: np.ndarray):
+        n = len(samples)
+        if n > self.capacity:
+            samples = samples[-self.capacity :]
+            self.total += n - self.capacity
+            n = self.capacity
+        offset = self.total % self.capacity
+        first = min(n, self.capacity - offset)
+        for base in (0, self.capacity):
+            self._data[base + offset : base + offset + first] = samples[:first]
+            self._data[base : base + n - first] = samples[first:]
+        self.total += n
+
+    def oldest(self) -> int:
+        return max(0, self.total - self.capacity)
+
+    def view(self, start: int, end: int = None) -> np.ndarray:
+        # Samples [start, end) by absolute position, without copying
+        end = self.total if end is None else end
+        start = max(start, self.oldest())
+        offset = start % self.capacity
+        return self._data[offset : offset + max(0, end - start)]
+
+    def reset(self):
+        self.total = 0
+
+
+class AudioCapture:
+    # Microphone capture into a RingBuffer, written in place from the audio
+    # callback. on_chunk(chunk, position) runs on the audio thread for each
+    # block; position is the absolute end of the chunk in the ring.
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        chunk_duration: float = 0.1,
+        buffer_duration: float = 60.0,
+        preroll: float = 0.3,
+        stream_factory=None,
+    ):
+        self.sample_rate = sample_rate
+        self.blocksize = int(sample_rate * chunk_duration)
+        self.preroll_samples = int(sample_rate * preroll)
+        self.ring = RingBuffer(int(sample_rate * buffer_duration))
+        self.stream_factory = stream_factory
+        self.on_chunk = None
+        self._stream = None
+
+    @property
+    def running(self) -> bool:
+        return self._stream is not None
+
+    def start(self, on_chunk=None):
+        # Already running: only the consumer changes, no audio is lost
+        self.on_chunk = on_chunk
+        if self._stream is not None:
+            return
+        if self.stream_factory is None and sd is None:
+            raise RuntimeError("No audio input: PortAudio is not installed")
+        stream_factory = self.stream_factory or sd.InputStream
+        self._stream = stream_factory(
+            samplerate=self.sample_rate,
+            channels=1,
+            dtype="float32",
+            blocksize=self.blocksize,
+            callback=self._callback,
+        )
+        self._stream.start()
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+    def onset(self, position: int) -> int:
+        # Where an utterance detected at position starts, keeping the pre-roll
+        # so word onsets that were below the VAD threshold are not clipped
+        return max(position - self.preroll_samples, self.ring.oldest())
+
+    def audio(self, start: int, end: int = None) -> np.ndarray:
+        return self.ring.view(start, end)
+
+    def _callback(self, indata, frames, time_info, status):
+        if status:
+            print(f"[Audio: {status}]")
+        chunk = indata[:, 0]
+        self.ring.write(chunk)
+        if self.on_chunk:
+            self.on_chunk(chunk, self.ring.total)
+
+
+class ReplayInputStream:
+    # Stand-in for sd.InputStream that replays audio files through the
+    # callback, in real time (speed=1) or faster, followed by silence.
+    def __init__(
+        self,
+        paths,
+        speed: float = 1.0,
+        lead_silence: float = 1.0,
+        tail_silence: float = 2.0,
+        gap: float = 1.0,
+        samplerate: int = 16000,
+        channels: int = 1,
+        dtype: str = "float32",
+        blocksize: int = 1600,
+        callback=None,
+    ):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.callback = callback
+        self.speed = speed
+        self.started_at = None
+        self.finished = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        def silence(seconds):
+            return np.zeros(int(seconds * samplerate), np.float32)
+
+        parts = [silence(lead_silence)]
+        for path in [paths] if isinstance(paths, str) else paths:
+            parts += [load_audio_file(path, samplerate), silence(gap)]
+        parts[-1] = silence(tail_silence)
+        self.audio = np.concatenate(parts)
+
+    @classmethod
+    def factory(cls, paths, **kwargs):
+        # Drop-in for stream_factory=sd.InputStream
+        return lambda **stream_kwargs: cls(paths, **kwargs, **stream_kwargs)
+
+    def start(self):
+        self._stop.clear()
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def close(self):
+        self.stop()
+
+    @property
+    def active(self) -> bool:
+        return self._thread is not None and not self.finished.is_set()
+
+    def _run(self):
+        # speed=0 replays as fast as the callback keeps up
+        block_time = self.blocksize / self.samplerate / self.speed if self.speed else 0
+        for i, start in enumerate(range(0, len(self.audio), self.blocksize)):
+            if self._stop.is_set():
+                break
+            if self.speed:
+                delay = self.started_at + (i + 1) * block_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            block = self.audio[start : start + self.blocksize]
+            if len(block) < self.blocksize:
+                block = np.pad(block, (0, self.blocksize - len(block)))
+            self.callback(block.reshape(-1, 1), self.blocksize, None, None)
+        self.finished.set()
+
+
+def load_audio_file(path: str, sample_rate: int = 16000) -> np.ndarray:
+    # 16-bit mono WAVs at the right rate are read directly; anything else is
+    # decoded and resampled with ffmpeg (via whisper)
+    if path.endswith(".wav"):
+        with wave.open(path, "rb") as wav_file:
+            if (
+                wav_file.getframerate() == sample_rate
+                and wav_file.getnchannels() == 1
+                and wav_file.getsampwidth() == 2
+            ):
+                pcm = np.frombuffer(wav_file.readframes(wav_file.getnframes()), np.int16)
+                return pcm.astype(np.float32) / 32768.0
+    from whisper.audio import load_audio
+
+    return load_audio(path, sample_rate)
@@ -0,0 +1,97 @@
+import gc
+import os
+import warnings
+
+import torch
+import whisper
+from torch import nn
+
+
+def best_device() -> str:
+    # WHISPER_DEVICE overrides the detection, e.g. to force "cpu" on a Mac
+    forced = os.environ.get("WHISPER_DEVICE")
+    if forced:
+        return forced
+    if torch.cuda.is_available():
+        return "cuda"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def cpu_threads() -> int:
+    # CPUs this process may run on (containers and taskset limit this below
+    # os.cpu_count())
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class WhisperRuntime:
+    # Device, precision and CPU settings for Whisper. fp16 only on GPUs; on
+    # CPU the model runs in fp32 with int8 dynamically quantized Linear layers
+    # and torch threads pinned to the available CPUs.
+    def __init__(self, device: str = None, quantize: bool = None, threads: int = None):
+        self.device = device or best_device()
+        self.fp16 = self.device != "cpu"
+        self.quantize = self.device == "cpu" if quantize is None else quantize
+        self.threads = threads or cpu_threads()
+
+    def load(self, model_name: str, download_root: str = None, label: str = "[Transcriber]"):
+        if self.device == "cpu":
+            torch.set_num_threads(self.threads)
+        model = whisper.load_model(model_name, device=self.device, download_root=download_root)
+        if self.quantize:
+            model = quantize_linear(model)
+        print(f"{label} {model_name}: {self.describe()}")
+        return model
+
+    def snapshot_name(self, model_name: str) -> str:
+        precision = "int8" if self.quantize else "fp16" if self.fp16 else "fp32"
+        return f"{os.path.basename(model_name)}.{self.device}.{precision}.pt"
+
+    def save_snapshot(self, model, path: str):
+        # The loaded model as it is (on its device, quantized), pickled whole:
+        # reloading it skips the checkpoint's checksum, the random weight
+        # initialization and the quantization that load() goes through
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        torch.save(model, tmp_path)
+        os.replace(tmp_path, path)
+
+    def load_snapshot(self, path: str):
+        # Memory-mapped, so the file's pages are shared with the OS page cache
+        # (a reload shortly after an unload reads little from disk). Only our
+        # own snapshots are loaded: weights_only=False unpickles the modules.
+        if self.device == "cpu":
+            torch.set_num_threads(self.threads)
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", category=UserWarning)
+            return torch.load(path, map_location=self.device, mmap=True, weights_only=False)
+
+    def describe(self) -> str:
+        parts = [self.device, "fp16" if self.fp16 else "fp32"]
+        if self.quantize:
+            parts.append("int8 dynamic linear layers")
+        if self.device == "cpu":
+            parts.append(f"{self.threads} threads")
+        return ", ".join(parts)
+
+    def release(self):
+        gc.collect()
+        if self.device == "mps":
+            torch.mps.empty_cache()
+        elif self.device == "cuda":
+            torch.cuda.empty_cache()
+
+
+def quantize_linear(model):
+    # Whisper subclasses nn.Linear (to cast weights to the input dtype), which
+    # quantize_dynamic does not recognise; in fp32 on CPU the cast is a no-op,
+    # so the layers are turned back into plain nn.Linear first
+    for module in model.modules():
+        if type(module) is whisper.model.Linear:
+            module.__class__ = nn.Linear
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="torch.quantize_per_tensor")
+        return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
@@ -0,0 +1,141 @@
+import numpy as np
+import torch
+import torch.nn.functional as F
+import whisper
+from whisper.tokenizer import get_tokenizer
+from whisper.utils import compression_ratio
+
+SAMPLE_RATE = 16000
+FRAME_DURATION = 0.02
+TRIM_PADDING = 0.2  # seconds kept around the trimmed speech
+CONTEXT_PADDING = 1.0  # seconds of silence after the speech in the encoder window
+MAX_DURATION = 10.0  # longer utterances take the full path
+TOKENS_PER_SECOND = 8  # decoding cap, generous for fast speech
+# whisper.transcribe's thresholds for falling back to another temperature
+LOGPROB_THRESHOLD = -1.0
+COMPRESSION_RATIO_THRESHOLD = 2.4
+NO_SPEECH_THRESHOLD = 0.6
+
+
+def trim_silence(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> tuple[int, int]:
+    # Sample range from the first to the last frame 12 dB above the quietest
+    # frames (the utterance's own noise floor; the endpointer leaves plenty of
+    # silence on it) and within 40 dB of the loudest, plus TRIM_PADDING
+    # either side
+    frame = int(sample_rate * FRAME_DURATION)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return 0, len(audio)
+    frames = np.asarray(audio[: n_frames * frame], np.float32).reshape(n_frames, frame)
+    energy = np.sqrt(np.mean(frames**2, axis=1))
+    floor, peak = np.percentile(energy, 10), energy.max()
+    loud = np.flatnonzero(energy > max(4 * floor, 0.01 * peak))
+    if len(loud) == 0:
+        return 0, len(audio)
+    padding = int(sample_rate * TRIM_PADDING)
+    return max(0, loud[0] * frame - padding), min(len(audio), (loud[-1] + 1) * frame + padding)
+
+
+@torch.no_grad()
+def transcribe_short(
+    model,
+    audio: np.ndarray,
+    language: str = "en",
+    fp16: bool = True,
+    max_duration: float = MAX_DURATION,
+):
+    # Low-latency transcription of a short utterance: silence is trimmed, the
+    # encoder only sees a window sized to the speech (rather than 30 s of
+    # mostly padding) and the decoder runs once, greedily, without temperature
+    # fallback and with a token cap from the duration. Returns None when this
+    # does not apply or the result looks unreliable by whisper.transcribe's
+    # own measures; callers then take the full path (model.transcribe).
+    if language is None:
+        return None  # language detection is left to the full path
+    fp16 = fp16 and model.device.type != "cpu"
+    start, end = trim_silence(audio)
+    seconds = (end - start) / SAMPLE_RATE
+    if seconds > max_duration:
+        return None
+
+    # The encoder turns every 2 mel frames (320 samples) into one position;
+    # the window is rounded up to whole seconds
+    n_ctx = min(model.dims.n_audio_ctx, int(np.ceil(seconds + CONTEXT_PADDING)) * 50)
+    window = np.zeros(n_ctx * 320, np.float32)
+    speech = np.asarray(audio[start:end], np.float32)[: len(window)]
+    window[: len(speech)] = speech
+    mel = whisper.log_mel_spectrogram(window, model.dims.n_mels).to(model.device)
+    features = _encode(model, mel[None].half() if fp16 else mel[None])
+
+    tokenizer = get_tokenizer(
+        model.is_multilingual,
+        num_languages=model.num_languages,
+        language=language,
+        task="transcribe",
+    )
+    max_tokens = min(int(seconds * TOKENS_PER_SECOND) + 8, model.dims.n_text_ctx // 2)
+    tokens, logprob, no_speech = _greedy(model, tokenizer, features, max_tokens)
+    if tokens is None:
+        return None  # no end of text within the cap: most likely a repetition loop
+
+    text = tokenizer.decode(tokens).strip()
+    avg_logprob = logprob / (len(tokens) + 1)
+    if no_speech > NO_SPEECH_THRESHOLD and avg_logprob < LOGPROB_THRESHOLD:
+        return ""  # what the full path makes of silence
+    if not text or avg_logprob < LOGPROB_THRESHOLD:
+        return None
+    if compression_ratio(text) > COMPRESSION_RATIO_THRESHOLD:
+        return None
+    return text
+
+
+def _encode(model, mel: torch.Tensor) -> torch.Tensor:
+    # AudioEncoder.forward with the positional embedding cut to the window
+    # (the original asserts a full 30 s window)
+    encoder = model.encoder
+    x = F.gelu(encoder.conv1(mel))
+    x = F.gelu(encoder.conv2(x))
+    x = x.permute(0, 2, 1)
+    x = (x + encoder.positional_embedding[: x.shape[1]]).to(x.dtype)
+    for block in encoder.blocks:
+        x = block(x)
+    return encoder.ln_post(x)
+
+
+def _greedy(model, tokenizer, features: torch.Tensor, max_tokens: int):
+    # Text tokens, their summed log probability and the no-speech probability;
+    # tokens is None if max_tokens ran out before the end of text
+    sot_sequence = list(tokenizer.sot_sequence_including_notimestamps)
+    suppress = sorted(
+        set(tokenizer.non_speech_tokens)
+        | {tokenizer.transcribe, tokenizer.translate, tokenizer.sot}
+        | {tokenizer.sot_prev, tokenizer.sot_lm}
+        | ({tokenizer.no_speech} if tokenizer.no_speech is not None else set())
+    )
+    blank = tokenizer.encode(" ") + [tokenizer.eot]
+    tokens = torch.tensor([sot_sequence], device=model.device)
+    text_tokens, logprob, no_speech = [], 0.0, 0.0
+    cache, hooks = model.install_kv_cache_hooks()
+    try:
+        for step in range(max_tokens):
+            # The whole prompt first, then one token at a time off the cache
+            step_tokens = tokens if step == 0 else tokens[:, -1:]
+            logits = model.decoder(step_tokens, features, kv_cache=cache)
+            if step == 0 and tokenizer.no_speech is not None:
+                probs = logits[0, sot_sequence.index(tokenizer.sot)].float().softmax(-1)
+                no_speech = probs[tokenizer.no_speech].item()
+            logits = logits[0, -1].float()
+            logits[suppress] = -np.inf
+            logits[tokenizer.timestamp_begin :] = -np.inf
+            if step == 0:
+                logits[blank] = -np.inf
+            token = int(logits.argmax())
+            logprob += F.log_softmax(logits, -1)[token].item()
+            if token == tokenizer.eot:
+                return text_tokens, logprob, no_speech
+            text_tokens.append(token)
+            tokens = torch.cat([tokens, torch.tensor([[token]], device=model.device)], dim=1)
+    finally:
+        for hook in hooks:
+            hook.remove()
+    return None, logprob, no_speech
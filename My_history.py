@@ -0,0 +1,116 @@
+class ChatHistory:
+    # Conversation sent to Ollama on every turn. The system prompt and the
+    # (rarely changing) summary form a stable prefix so the server's prompt
+    # cache stays valid; old turns are dropped in one go when the estimate
+    # crosses token_budget, down to low_water * token_budget.
+    CHARS_PER_TOKEN = 4
+
+    def __init__(
+        self,
+        system_prompt: str,
+        token_budget: int = 1500,
+        keep_recent_turns: int = 2,
+        low_water: float = 0.6,
+        summarizer=None,
+    ):
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.low_water = low_water
+        # summarizer(previous_summary, dropped_messages) -> str, or None to drop
+        self.summarizer = summarizer
+        self.summary = ""
+        self.stats = []
+        self._turns = []
+
+    def messages(self) -> list[dict]:
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if self.summary:
+            messages.append(
+                {"role": "system", "content": f"Earlier in this conversation: {self.summary}"}
+            )
+        messages += [{"role": t["role"], "content": t["content"]} for t in self._turns]
+        return messages
+
+    def add_user(self, content: str, plain: str = None):
+        # plain: the question without web search results, kept once answered
+        self._turns.append({"role": "user", "content": content, "plain": plain})
+
+    def add_assistant(self, content: str):
+        # The search payload has been answered: only the question stays in the
+        # history, so the answer keeps its context without the 10 results
+        last = self._turns[-1] if self._turns else None
+        if last and last["role"] == "user" and last["plain"] is not None:
+            last["content"], last["plain"] = last["plain"], None
+        self._turns.append({"role": "assistant", "content": content, "plain": None})
+
+    def discard_pending(self):
+        # The last question got no reply (the request failed): forget it, so
+        # it is not sent again unanswered on every later request
+        if self._turns and self._turns[-1]["role"] == "user":
+            self._turns.pop()
+
+    def clear(self):
+        self._turns.clear()
+        self.summary = ""
+
+    def checkpoint(self):
+        # State to roll back to if the next exchange is abandoned (speculative
+        # replies). Turns are copied: add_assistant edits the last one.
+        return [dict(t) for t in self._turns], self.summary, len(self.stats)
+
+    def rollback(self, checkpoint):
+        turns, self.summary, n_stats = checkpoint
+        self._turns = [dict(t) for t in turns]
+        del self.stats[n_stats:]
+
+    def estimate_tokens(self, messages: list[dict] = None) -> int:
+        messages = self.messages() if messages is None else messages
+        # ~4 tokens of chat template overhead per message
+        return sum(len(m["content"]) // self.CHARS_PER_TOKEN + 4 for m in messages)
+
+    def prepare(self) -> list[dict]:
+        # Messages for the next request, compacting first if over budget
+        compacted = False
+        if self.estimate_tokens() > self.token_budget:
+            compacted = self.__compact__()
+        messages = self.messages()
+        self.stats.append(
+            {
+                "turn": len(self.stats) + 1,
+                "messages": len(messages),
+                "estimated_tokens": self.estimate_tokens(messages),
+                "compacted": compacted,
+                "prompt_eval_count": None,
+                "eval_count": None,
+            }
+        )
+        return messages
+
+    def record_usage(self, prompt_eval_count: int, eval_count: int):
+        if self.stats:
+            self.stats[-1]["prompt_eval_count"] = prompt_eval_count
+            self.stats[-1]["eval_count"] = eval_count
+
+    def __compact__(self) -> bool:
+        # Keep the pending user message plus the last keep_recent_turns exchanges
+        protected = 2 * self.keep_recent_turns + 1
+        target = self.token_budget * self.low_water
+        dropped = []
+        while len(self._turns) > protected and self.estimate_tokens() > target:
+            # Drop whole user/assistant pairs so roles keep alternating
+            dropped += self._turns[:2]
+            del self._turns[:2]
+        if not dropped:
+            return False
+
+        if self.summarizer:
+            try:
+                self.summary = self.summarizer(
+                    self.summary,
+                    [{"role": t["role"], "content": t["content"]} for t in dropped],
+                )
+            except Exception as e:
+                print(f"[History] Summary failed, dropping old turns: {e}")
+        print(f"[History] Compacted {len(dropped) // 2} old turns")
+        return True
@@ -0,0 +1,488 @@
+import argparse
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+import My_tracing as tracing
+from My_segmenter import SentenceSegmenter
+from My_startup import Startup
+from My_tracing import Tracer, Turn, percentile
+
+
+class Speculation:
+    # A reply requested at a pause in the user's speech, before the end of the
+    # utterance is confirmed. Its chunks are buffered until it is committed
+    # (the pause was the end) or abandoned (the user went on), in which case
+    # the history is rolled back to the checkpoint.
+    def __init__(self, text: str, checkpoint):
+        self.text = text
+        self.checkpoint = checkpoint
+        self.chunks = asyncio.Queue()  # None once the reply is complete
+        self.turn = Turn(0)  # LLM marks, merged into the real turn on commit
+        self.started = perf_counter()
+        self.finished = None
+        self.generated = 0  # chunks, one token each from Ollama
+        self.task = None
+
+
+class Pipeline:
+    # A conversation turn as asyncio stages connected by bounded queues:
+    #   listen -> generate -> (sentences) -> synthesize -> (audio) -> play
+    # Blocking Whisper, Ollama and Piper calls run in executor threads, so the
+    # reply is generated, synthesized and played at the same time. Cancelling
+    # the turn cancels every stage, interrupts the call each one is blocked
+    # in, and returns only once all of them have finished.
+    SENTENCE_QUEUE = 4  # sentences generated ahead of synthesis
+    AUDIO_QUEUE = 2  # synthesized sentences waiting to be played
+    WORKERS = 8  # executor threads for blocking calls
+
+    def __init__(
+        self,
+        transcriber,
+        llm,
+        tts,
+        tracer: Tracer = None,
+        full_duplex: bool = False,
+        on_status=None,
+        speculative: bool = False,
+        residency=None,
+    ):
+        # full_duplex: keep listening while speaking, so the user can cut in.
+        # on_status(text) is called from the event loop thread.
+        # speculative: transcribe and request the reply at the first short
+        # pause (transcriber.PAUSE_DURATION) and keep it if the pause turns
+        # out to be the end of the utterance.
+        # residency: a ResidencyManager that may unload the models between
+        # turns; they are reloaded at the start of the next one.
+        self.transcriber = transcriber
+        self.llm = llm
+        self.tts = tts
+        self.tracer = tracer or Tracer()
+        self.full_duplex = full_duplex
+        self.transcriber.keep_listening = full_duplex
+        self.on_status = on_status or (lambda status: None)
+        self._executor = ThreadPoolExecutor(self.WORKERS, thread_name_prefix="pipeline")
+        self._loop = None
+        self._task = None
+        self.speculative = speculative
+        self.speculation_stats = {
+            "started": 0,
+            "committed": 0,
+            "abandoned": 0,
+            "saved_ms": [],
+            "wasted_s": 0.0,
+            "wasted_chunks": 0,
+        }
+        self._speculation = None
+        self._speculation_lock = None
+        self._background = set()
+        self.residency = residency
+
+    async def load(self, lazy_whisper: bool = False) -> list[str]:
+        # Loads and warms up all three stages at once; returns the stages that
+        # failed. Ollama may come up later, so only whisper and tts count.
+        startup = Startup()
+        if not lazy_whisper:
+            startup.add(
+                "whisper",
+                ("load", self.transcriber.init_model),
+                ("warm-up", self.transcriber.warmup),
+            )
+        startup.add("llm", ("warm-up", lambda: self.llm.warm(prime=True)))
+        startup.add("tts", ("load", self.tts.preload), ("warm-up", self.tts.warmup))
+        await asyncio.get_running_loop().run_in_executor(self._executor, startup.run)
+        return [stage for stage in ("whisper", "tts") if stage in startup.errors]
+
+    async def converse(self):
+        # Listens for one utterance and answers it. In full duplex, speech
+        # over the reply cuts it and is answered in turn.
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        self._speculation_lock = asyncio.Lock()
+        turn = self.tracer.start_turn()
+        if self.residency is not None:
+            self.residency.acquire()
+        try:
+            if self.residency is not None:
+                await self.__reload__(turn)
+            if self.transcriber.model is None:
+                await self.__load_whisper__()
+
+            self.on_status("Listening...")
+            hooks = {}
+            if self.speculative:
+                hooks = {"on_pause": self.__on_pause__, "on_resume": self.__on_resume__}
+            text = await self.__listen__(**hooks)
+            while True:
+                if not text:
+                    print("[System] No speech detected.")
+                    return
+                print(f"\nYou: {text}")
+                self.on_status("Thinking...")
+                speculation = await self.__claim__(text, turn)
+                text, next_turn = await self.__respond__(text, speculation)
+                if next_turn is None:
+                    return
+                self.tracer.end_turn(turn)
+                turn = next_turn
+                self.tracer.activate(turn)
+        except asyncio.CancelledError:
+            turn.annotate(stopped=True)
+            raise
+        except Exception as e:
+            print(f"[Error] {e}")
+        finally:
+            if self.full_duplex:
+                self.transcriber.capture.stop()
+            await self.__claim__(None, turn)  # drops a speculation left unclaimed
+            self.tracer.end_turn(turn)
+            if self.residency is not None:
+                self.residency.release()
+            self._task = None
+
+    def cancel(self):
+        # Thread-safe: stops the turn in progress, whatever stage it is in
+        task, loop = self._task, self._loop
+        if task is not None:
+            loop.call_soon_threadsafe(task.cancel)
+
+    def speculation_summary(self) -> dict:
+        stats = self.speculation_stats
+        saved = stats["saved_ms"]
+        return {
+            "started": stats["started"],
+            "committed": stats["committed"],
+            "abandoned": stats["abandoned"],
+            # Share of speculative requests thrown away
+            "waste_rate": stats["abandoned"] / stats["started"] if stats["started"] else 0.0,
+            "wasted_llm_s": round(stats["wasted_s"], 2),
+            "wasted_tokens": stats["wasted_chunks"],
+            "saved_ms_p50": percentile(saved, 50) if saved else None,
+            "saved_ms_p95": percentile(saved, 95) if saved else None,
+        }
+
+    async def __load_whisper__(self):
+        self.on_status("Loading Whisper...")
+        start = perf_counter()
+        await self.__blocking__(self.transcriber.init_model)
+        await self.__blocking__(self.transcriber.warmup)
+        print(f"[Startup] whisper  {perf_counter() - start:6.2f}s  (on first use)")
+
+    async def __reload__(self, turn):
+        # Models unloaded while idle come back before listening starts; also
+        # waits for an unload that was under way
+        if not self.residency.loaded():
+            self.on_status("Reloading models...")
+        elapsed = await self.__blocking__(self.residency.ensure_loaded)
+        if elapsed:
+            turn.annotate(reload_ms=round(elapsed * 1000))
+
+    async def __listen__(self, turn=None, **kwargs) -> str:
+        # turn: record the utterance into this turn instead of the current one
+        def listen():
+            tracing.bind(turn)
+            try:
+                return self.transcriber.listen_and_transcribe(**kwargs)
+            finally:
+                tracing.bind(None)
+
+        return await self.__blocking__(listen, on_cancel=self.transcriber.stop)
+
+    def __on_pause__(self, text: str):
+        # Listener thread: the user paused, text is what they said so far
+        self._loop.call_soon_threadsafe(self.__spawn__, self.__speculate__(text))
+
+    def __on_resume__(self):
+        # Audio thread: the user went on after the pause
+        self._loop.call_soon_threadsafe(self.__spawn__, self.__speculate__(None))
+
+    def __spawn__(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def __speculate__(self, text):
+        # Replaces the speculative reply with one to text (None: drops it).
+        # Serialized by the lock, in the order pauses and resumes happened.
+        async with self._speculation_lock:
+            if self._speculation is not None:
+                await self.__abandon__(self._speculation)
+                self._speculation = None
+            if text:
+                speculation = Speculation(text, self.llm.history.checkpoint())
+                speculation.task = asyncio.ensure_future(self.__prefetch__(speculation))
+                self._speculation = speculation
+                self.speculation_stats["started"] += 1
+
+    async def __claim__(self, text, turn):
+        # The speculative reply if it answers exactly what was said in the
+        # end; any other is abandoned
+        await asyncio.gather(*self._background, return_exceptions=True)
+        async with self._speculation_lock:
+            speculation, self._speculation = self._speculation, None
+            if speculation is None:
+                return None
+            if speculation.text != text:
+                await self.__abandon__(speculation)
+                return None
+            # Without it, transcription and the request would only have
+            # started at the end of speech
+            saved = (turn.started + turn.marks.get("eos", 0.0) - speculation.started) * 1000
+            self.speculation_stats["committed"] += 1
+            self.speculation_stats["saved_ms"].append(max(saved, 0.0))
+            turn.annotate(speculation_saved_ms=round(max(saved, 0.0)))
+            print("[System] Speculative reply committed.")
+            return speculation
+
+    async def __abandon__(self, speculation: Speculation):
+        await cancel_and_wait(speculation.task)
+        self.llm.history.rollback(speculation.checkpoint)
+        stats = self.speculation_stats
+        stats["abandoned"] += 1
+        stats["wasted_s"] += (speculation.finished or perf_counter()) - speculation.started
+        stats["wasted_chunks"] += speculation.generated
+
+    async def __prefetch__(self, speculation: Speculation):
+        chunks = self.__stream__(speculation.text, speculation.turn)
+        try:
+            async for chunk in chunks:
+                speculation.generated += 1
+                speculation.chunks.put_nowait(chunk)
+        finally:
+            await chunks.aclose()
+            speculation.finished = perf_counter()
+            speculation.chunks.put_nowait(None)
+
+    async def __respond__(self, text: str, speculation: Speculation = None):
+        # Returns what the user said over the reply and the turn it starts,
+        # or (None, None) if the reply played to the end
+        self.tts.reset()
+        if not self.full_duplex:
+            await self.__speak__(text, speculation)
+            return None, None
+
+        barged_in = asyncio.Event()
+        next_turn = self.tracer.start_turn(activate=False, barge_in=True)
+
+        def on_speech_start():
+            # Runs on the audio thread: stop talking right away, the rest of
+            # the reply is cancelled from the loop
+            tracing.mark("barge_in")
+            turn = tracing.current()
+            self.tts.stop(
+                on_silent=lambda at: turn.mark("playback_stopped", at) if turn else None
+            )
+            print("[System] Barge-in: listening.")
+            self._loop.call_soon_threadsafe(barged_in.set)
+
+        listen = asyncio.ensure_future(
+            self.__listen__(
+                next_turn, echo_level=self.tts.playback_level, on_speech_start=on_speech_start
+            )
+        )
+        speak = asyncio.ensure_future(self.__speak__(text, speculation))
+        interrupted = asyncio.ensure_future(barged_in.wait())
+        try:
+            await asyncio.wait({speak, interrupted}, return_when=asyncio.FIRST_COMPLETED)
+            if barged_in.is_set():
+                self.on_status("Listening...")
+                await cancel_and_wait(speak)
+            else:
+                speak.result()
+                self.transcriber.stop()
+            text = await listen
+        finally:
+            await cancel_and_wait(speak, listen, interrupted)
+
+        if not barged_in.is_set():
+            self.tracer.discard(next_turn)
+            return None, None
+        return text, next_turn
+
+    async def __speak__(self, text: str, speculation: Speculation = None):
+        sentences = asyncio.Queue(self.SENTENCE_QUEUE)
+        if self.tts.engine is None:
+            # A piper process per sentence: synthesis and playback are one step
+            await run_stages(
+                self.__generate__(text, sentences, speculation),
+                self.__play__(sentences, self.tts.process_play),
+            )
+            return
+        audio = asyncio.Queue(self.AUDIO_QUEUE)
+        await run_stages(
+            self.__generate__(text, sentences, speculation),
+            self.__synthesize__(sentences, audio),
+            self.__play__(audio, self.tts.play),
+        )
+
+    async def __generate__(self, text: str, sentences: asyncio.Queue, speculation=None):
+        # Streams the reply (or a committed speculative one), cutting it into
+        # sentences as it arrives
+        segmenter = SentenceSegmenter()
+        chunks = self.__replay__(speculation) if speculation else self.__stream__(text)
+        response = ""
+        try:
+            async for chunk in chunks:
+                response += chunk
+                for sentence in segmenter.feed(chunk):
+                    await sentences.put(sentence)
+            rest = segmenter.flush()
+            if rest:
+                await sentences.put(rest)
+            print(f"LLM: {response}")
+        finally:
+            await chunks.aclose()
+        await sentences.put(None)
+
+    async def __stream__(self, text: str, turn: Turn = None):
+        # The reply chunk by chunk; closing it adds the (possibly partial)
+        # reply to the history. turn: where the LLM's trace marks go, if not
+        # to the current turn
+        stream = self.llm.chat_stream(text)
+
+        def step():
+            tracing.bind(turn)
+            try:
+                return next(stream, None)
+            finally:
+                tracing.bind(None)
+
+        try:
+            while (chunk := await self.__blocking__(step, on_cancel=self.llm.cancel)) is not None:
+                yield chunk
+        finally:
+            tracing.bind(turn)
+            try:
+                stream.close()
+            finally:
+                tracing.bind(None)
+
+    async def __replay__(self, speculation: Speculation):
+        # What was buffered, then the rest as it streams in
+        try:
+            while (chunk := await speculation.chunks.get()) is not None:
+                yield chunk
+            await speculation.task  # raises if the request failed
+        finally:
+            await cancel_and_wait(speculation.task)
+            turn = tracing.current()
+            if turn is not None:
+                turn.merge(speculation.turn)
+
+    async def __synthesize__(self, sentences: asyncio.Queue, audio: asyncio.Queue):
+        while (sentence := await sentences.get()) is not None:
+            await audio.put(await self.__blocking__(self.tts.synthesize, sentence))
+        await audio.put(None)
+
+    async def __play__(self, items: asyncio.Queue, play):
+        first = True
+        try:
+            while (item := await items.get()) is not None:
+                if first:
+                    first = False
+                    self.on_status("Speaking...")
+                await self.__blocking__(play, item, on_cancel=self.tts.stop)
+            # play() returns a little before the end, to queue the next one
+            await self.__blocking__(self.tts.drain, on_cancel=self.tts.stop)
+        finally:
+            tracing.mark("playback_end")
+
+    async def __blocking__(self, fcn, *args, on_cancel=None):
+        # Runs a blocking call in an executor thread. If the caller is
+        # cancelled, on_cancel() interrupts the call and it is waited for, so
+        # nothing keeps running after its stage has been cancelled.
+        future = self._loop.run_in_executor(self._executor, functools.partial(fcn, *args))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if on_cancel is not None:
+                on_cancel()
+            await asyncio.wait([future])
+            raise
+
+
+async def cancel_and_wait(*tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_stages(*stages):
+    # Runs the stage coroutines concurrently. The first failure, or the caller
+    # being cancelled, cancels the others; all have finished on return.
+    tasks = [asyncio.ensure_future(stage) for stage in stages]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+    finally:
+        await cancel_and_wait(*tasks)
+
+
+class PipelineThread:
+    # Runs the event loop in a background thread, for front ends with a main
+    # loop of their own (Tk). Coroutines are submitted from any thread.
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+
+    def submit(self, coro, on_done=None):
+        # on_done(result) runs in the loop thread; result is None on failure
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        if on_done is not None:
+            future.add_done_callback(
+                lambda f: on_done(None if f.cancelled() or f.exception() else f.result())
+            )
+        return future
+
+
+async def main(args):
+    from My_LLM import MyLlm
+    from My_response_cache import ResponseCache
+    from My_transcriber import MyTranscriber
+    from My_tts import MyTTS
+
+    cache = ResponseCache("./cache/responses.json") if args.response_cache else None
+    pipeline = Pipeline(
+        MyTranscriber(),
+        MyLlm(response_cache=cache),
+        MyTTS(args.voice),
+        Tracer("./traces/turns.jsonl"),
+        full_duplex=args.full_duplex,
+        on_status=lambda status: print(f"[System] {status}"),
+        speculative=args.speculative,
+    )
+    failed = await pipeline.load(args.lazy_whisper)
+    if failed:
+        print(f"[System] Failed to load {', '.join(failed)}")
+        return
+    print("[System] All models initialized. Ctrl+C to quit.")
+    turns = 0
+    try:
+        while not args.turns or turns < args.turns:
+            await pipeline.converse()
+            turns += 1
+    finally:
+        if args.speculative:
+            print(f"[System] Speculation: {pipeline.speculation_summary()}")
+        if cache is not None:
+            print(f"[System] Response cache: {cache.stats()}")
+        print(f"[System] Playback: {pipeline.tts.player.stats()}")
+
+
+if __name__ == "__main__":
+    # Headless voice assistant: python My_pipeline.py --full-duplex
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--voice", default="joe-medium")
+    parser.add_argument("--turns", type=int, default=0, help="0: until Ctrl+C")
+    parser.add_argument("--lazy-whisper", action="store_true")
+    parser.add_argument("--full-duplex", action="store_true")
+    parser.add_argument("--speculative", action="store_true", help="request replies at pauses")
+    parser.add_argument("--response-cache", action="store_true", help="reuse replies to repeats")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,269 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+try:
+    import sounddevice as sd
+except OSError:  # PortAudio missing (headless CI): only NullOutputStream works
+    sd = None
+
+
+class AudioPlayer:
+    # Persistent output stream for 16-bit mono PCM, one per sample rate and
+    # shared by every MyTTS using it. Chunks are queued with write() and
+    # played back to back from the stream's callback, so nothing is spawned
+    # or opened per reply. A jitter buffer holds playback until jitter_buffer
+    # seconds are queued (or the end of the utterance is known, drain()), at
+    # the start and again after the queue ran dry mid-utterance (an underrun).
+    # stop() silences the output from the next callback block on, and can
+    # report when that block reaches the speaker.
+    STREAM_FACTORY = None  # None: sd.OutputStream; harness: NullOutputStream
+    BLOCK_DURATION = 0.01
+    LEVEL_WINDOW = 0.3  # seconds of output that level() is taken over
+    __PLAYERS__: dict = {}
+    __LOCK__ = threading.Lock()
+
+    @classmethod
+    def get(cls, sample_rate: int) -> "AudioPlayer":
+        with cls.__LOCK__:
+            player = cls.__PLAYERS__.get(sample_rate)
+            if player is None:
+                player = cls.__PLAYERS__[sample_rate] = cls(sample_rate)
+            return player
+
+    @classmethod
+    def close_all(cls):
+        with cls.__LOCK__:
+            for player in cls.__PLAYERS__.values():
+                player.close()
+            cls.__PLAYERS__.clear()
+
+    def __init__(self, sample_rate: int, jitter_buffer: float = 0.1, stream_factory=None):
+        self.sample_rate = sample_rate
+        self.jitter_samples = int(sample_rate * jitter_buffer)
+        self.stream_factory = stream_factory
+        self.underruns = 0  # the queue ran dry before the utterance ended
+        self.device_underflows = 0  # the device wanted audio before the callback gave it
+        self.played = 0  # samples handed to the device
+        self.stopped_at = None  # self.played when stop() last cut playback
+        self._chunks = deque()  # int16 arrays; the first is played from _offset
+        self._offset = 0
+        self._queued = 0  # samples not yet played
+        self._active = False  # an utterance is queued or playing
+        self._buffering = True
+        self._ending = False  # drain(): nothing more is coming for this utterance
+        self._recent = np.zeros(int(sample_rate * self.LEVEL_WINDOW * 2), np.int16)
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._stream = None
+        self._on_silent = []  # from stop(), called once the output is silent
+
+    def write(self, pcm):
+        # Queues PCM (bytes or an int16 array) behind whatever is playing
+        samples = pcm if isinstance(pcm, np.ndarray) else np.frombuffer(pcm, np.int16)
+        if not len(samples):
+            return
+        self.__open__()
+        with self._lock:
+            self._chunks.append(samples)
+            self._queued += len(samples)
+            self._active = True
+            self._ending = False
+
+    def wait(self, ahead: float = 0.0):
+        # Blocks until at most ahead seconds are left to play. ahead=0 waits
+        # for the end of the utterance (drain) and lets a jitter buffer that
+        # is still filling play out.
+        limit = int(ahead * self.sample_rate)
+        with self._changed:
+            if not ahead:
+                self._ending = True
+            while self._active and self._queued > limit and self._stream is not None:
+                self._changed.wait(0.1)
+
+    def drain(self):
+        self.wait(0.0)
+
+    def stop(self, on_silent=None):
+        # Drops everything queued; the device only plays out the block it
+        # already has (BLOCK_DURATION plus its own latency). on_silent gets the
+        # perf_counter() time the first silent block is due at the speaker.
+        with self._changed:
+            active = self._active
+            if active:
+                self.stopped_at = self.played
+                if on_silent is not None and self._stream is not None:
+                    self._on_silent.append(on_silent)
+            self.__reset__()
+            self._changed.notify_all()
+        if on_silent is not None and (not active or self._stream is None):
+            on_silent(time.perf_counter())  # nothing was playing
+
+    def level(self) -> float:
+        # RMS (0..1) of the last LEVEL_WINDOW seconds handed to the device
+        if not self._active:
+            return 0.0
+        with self._lock:
+            window = self._recent[-int(self.sample_rate * self.LEVEL_WINDOW) :]
+            return float(np.sqrt(np.mean(np.square(window.astype(np.float32))))) / 32768
+
+    def recent(self, seconds: float) -> np.ndarray:
+        # Copy of the last seconds of output (up to twice LEVEL_WINDOW)
+        with self._lock:
+            return self._recent[-int(self.sample_rate * seconds) :].copy()
+
+    def stats(self) -> dict:
+        return {
+            "sample_rate": self.sample_rate,
+            "played_s": round(self.played / self.sample_rate, 2),
+            "underruns": self.underruns,
+            "device_underflows": self.device_underflows,
+        }
+
+    def close(self):
+        self.stop()
+        with self._lock:
+            stream, self._stream = self._stream, None
+            on_silent, self._on_silent = self._on_silent, []
+        if stream is not None:
+            stream.stop()
+            stream.close()
+        for callback in on_silent:
+            callback(time.perf_counter())
+
+    def __open__(self):
+        if self._stream is not None:
+            return
+        stream_factory = self.stream_factory or type(self).STREAM_FACTORY
+        if stream_factory is None:
+            if sd is None:
+                raise RuntimeError("No audio output: PortAudio is not installed")
+            stream_factory = sd.OutputStream
+        kwargs = {}
+        if sd is not None and stream_factory is sd.OutputStream:
+            kwargs["latency"] = "low"
+        with self._lock:
+            if self._stream is not None:
+                return
+            self._stream = stream_factory(
+                samplerate=self.sample_rate,
+                channels=1,
+                dtype="int16",
+                blocksize=int(self.sample_rate * self.BLOCK_DURATION),
+                callback=self.__callback__,
+                **kwargs,
+            )
+            self._stream.start()
+
+    def __reset__(self):
+        self._chunks.clear()
+        self._offset = 0
+        self._queued = 0
+        self._active = False
+        self._buffering = True
+        self._ending = False
+
+    def __callback__(self, outdata, frames, time_info, status):
+        if status is not None and status.output_underflow:
+            self.device_underflows += 1
+        out = outdata[:, 0]
+        with self._changed:
+            if self._buffering and (self._queued >= self.jitter_samples or self._ending):
+                self._buffering = False
+            n = 0
+            while not self._buffering and n < frames and self._chunks:
+                chunk = self._chunks[0]
+                take = min(frames - n, len(chunk) - self._offset)
+                out[n : n + take] = chunk[self._offset : self._offset + take]
+                n += take
+                self._offset += take
+                if self._offset == len(chunk):
+                    self._chunks.popleft()
+                    self._offset = 0
+            out[n:] = 0
+            self._queued -= n
+            self.played += n
+            if self._active and not self._queued:
+                if self._ending:
+                    self.__reset__()
+                elif not self._buffering and n < frames:
+                    # Audible gap: refill the jitter buffer before resuming
+                    self.underruns += 1
+                    self._buffering = True
+            recent = self._recent
+            shift = min(frames, len(recent))
+            recent[:-shift] = recent[shift:]
+            recent[-shift:] = out[frames - shift :]
+            on_silent, self._on_silent = self._on_silent, []
+            self._changed.notify_all()
+        if on_silent:
+            # This block is the first after stop(): silent from when it plays
+            at = time.perf_counter() + self.__output_latency__(time_info)
+            for callback in on_silent:
+                callback(at)
+
+    def __output_latency__(self, time_info) -> float:
+        # Seconds until the block being filled is heard: the stream's own
+        # timestamps if it gives them, else its nominal latency
+        if time_info is not None:
+            ahead = time_info.outputBufferDacTime - time_info.currentTime
+            if 0 < ahead < 1:
+                return ahead
+        return getattr(self._stream, "latency", 0.0) or 0.0
+
+
+class NullOutputStream:
+    # Stand-in for sd.OutputStream that discards the audio, pulling blocks
+    # from the callback in real time (realtime=True) or as fast as it fills
+    # them (paced in real time while it only gets silence)
+    def __init__(
+        self,
+        samplerate: int,
+        channels: int = 1,
+        dtype: str = "int16",
+        blocksize: int = 256,
+        callback=None,
+        realtime: bool = True,
+    ):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.callback = callback
+        self.realtime = realtime
+        self.frames = 0
+        self._buffer = np.zeros((blocksize, channels), dtype=dtype)
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def factory(cls, **kwargs):
+        # Drop-in for AudioPlayer.STREAM_FACTORY / stream_factory
+        return lambda **stream_kwargs: cls(**stream_kwargs, **kwargs)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def close(self):
+        self.stop()
+
+    def _run(self):
+        block_time = self.blocksize / self.samplerate
+        next_block = time.perf_counter()
+        while not self._stop.is_set():
+            self.callback(self._buffer, self.blocksize, None, None)
+            self.frames += self.blocksize
+            if self.realtime or not self._buffer.any():
+                next_block += block_time
+                delay = next_block - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                next_block = time.perf_counter()
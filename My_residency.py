@@ -0,0 +1,286 @@
+import ctypes
+import gc
+import os
+import sys
+import statistics
+import threading
+import time
+from time import perf_counter
+
+import torch
+
+
+def available_memory():
+    # Bytes the system can still hand out without swapping, None if unknown
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def resident_memory():
+    # This process's resident set size in bytes, None if unknown
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def _trim_heap():
+    # glibc keeps freed memory in its arenas; hand it back to the OS so an
+    # unload actually lowers the resident size
+    if sys.platform.startswith("linux"):
+        try:
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass  # not glibc (e.g. musl)
+
+
+def _state_bytes(module) -> int:
+    # Quantized layers keep their weights in packed params, not parameters()
+    total = 0
+    for value in module.state_dict().values():
+        for tensor in value if isinstance(value, tuple) else (value,):
+            if isinstance(tensor, torch.Tensor):
+                total += tensor.nelement() * tensor.element_size()
+    return total
+
+
+class WhisperResident:
+    # MyTranscriber's Whisper model. It is snapshotted on the first unload
+    # (WhisperRuntime.save_snapshot, under cache_dir), and reloads map the
+    # snapshot back in instead of going through whisper.load_model.
+    def __init__(self, transcriber, cache_dir: str = "./cache/weights"):
+        self.transcriber = transcriber
+        self.cache_dir = cache_dir
+
+    @property
+    def loaded(self) -> bool:
+        return self.transcriber.model is not None
+
+    def nbytes(self) -> int:
+        return _state_bytes(self.transcriber.model) if self.loaded else 0
+
+    def load(self):
+        transcriber = self.transcriber
+        path = self.__snapshot_path__()
+        if os.path.exists(path):
+            try:
+                transcriber.model = transcriber.runtime.load_snapshot(path)
+                return
+            except Exception as e:
+                # e.g. written by another torch version
+                print(f"[Residency] Snapshot {path} unusable, loading the checkpoint: {e}")
+                os.remove(path)
+        transcriber.init_model()
+
+    def unload(self):
+        transcriber = self.transcriber
+        path = self.__snapshot_path__()
+        if not os.path.exists(path):
+            transcriber.runtime.save_snapshot(transcriber.model, path)
+        transcriber.cleanup()
+
+    def __snapshot_path__(self) -> str:
+        name = self.transcriber.runtime.snapshot_name(self.transcriber.MODEL_NAME)
+        return os.path.join(self.cache_dir, name)
+
+
+class VoiceResident:
+    # MyTTS's resident Piper voice; reloaded from its .onnx file, which the
+    # OS usually still has cached
+    def __init__(self, tts):
+        self.engine = tts.engine
+
+    @property
+    def loaded(self) -> bool:
+        return self.engine.voice is not None
+
+    def nbytes(self) -> int:
+        return os.path.getsize(self.engine.voice_path) if self.loaded else 0
+
+    def load(self):
+        self.engine.load()
+
+    def unload(self):
+        self.engine.close()
+
+
+class ResidencyManager:
+    # Unloads models after idle_timeout seconds without a turn (None: not
+    # for idling), or when the system's available memory drops below
+    # min_available_mb, and reloads them when they are next used
+    # (ensure_loaded) or expected to be (preload). Residents have loaded,
+    # load(), unload() and nbytes().
+    def __init__(
+        self,
+        idle_timeout: float = 600,
+        min_available_mb: float = None,
+        check_interval: float = 5.0,
+    ):
+        self.idle_timeout = idle_timeout
+        self.min_available_mb = min_available_mb
+        self.check_interval = check_interval
+        self.residents = {}
+        self.reloads = {}  # name -> [seconds]
+        self.unloads = {}  # reason -> count
+        self._unloaded = set()  # by this manager, to reload on next use
+        self._busy = 0
+        self._last_used = time.monotonic()
+        self._lock = threading.Lock()  # held while loading or unloading
+        self._busy_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._preloading = False
+
+    def add(self, name: str, resident) -> "ResidencyManager":
+        self.residents[name] = resident
+        return self
+
+    def start(self):
+        if self.min_available_mb and available_memory() is None:
+            print("[Residency] Available memory is unknown here; unloading on idle only")
+        self._thread = threading.Thread(target=self.__monitor__, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def acquire(self):
+        # A turn starts: nothing is unloaded until release(). An unload that
+        # is already under way finishes; ensure_loaded() waits for it.
+        with self._busy_lock:
+            self._busy += 1
+
+    def release(self):
+        with self._busy_lock:
+            self._busy -= 1
+            self._last_used = time.monotonic()
+
+    def loaded(self) -> bool:
+        return not self._unloaded
+
+    def ensure_loaded(self) -> float:
+        # Blocking: reloads every resident this manager unloaded, in parallel;
+        # returns the seconds it took (0 if there was nothing to reload)
+        with self._lock:
+            missing = sorted(self._unloaded)
+            if not missing:
+                return 0.0
+            start = perf_counter()
+            errors = []
+            threads = [
+                threading.Thread(target=self.__reload__, args=(name, errors)) for name in missing
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self._last_used = time.monotonic()
+            elapsed = perf_counter() - start
+        if errors:
+            raise errors[0]
+        print(f"[Residency] Reloaded {', '.join(missing)} in {elapsed:.2f}s")
+        return elapsed
+
+    def preload(self):
+        # Reloads in the background, e.g. when the window gains focus
+        if self._preloading or self.loaded():
+            return
+        self._preloading = True
+
+        def run():
+            try:
+                self.ensure_loaded()
+            except Exception as e:
+                print(f"[Residency] Preload failed: {e}")
+            finally:
+                self._preloading = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def unload(self, reason: str = "manual", names=None, idle_for: float = None) -> int:
+        # Unloads the given (default: all) loaded residents unless a turn is
+        # running (or they were used within idle_for seconds, checked once any
+        # reload under way is done); returns the bytes released
+        with self._lock:
+            if self._busy:
+                return 0
+            if idle_for is not None and time.monotonic() - self._last_used < idle_for:
+                return 0
+            names = [name for name in names or self.residents if self.residents[name].loaded]
+            released = 0
+            for name in names:
+                resident = self.residents[name]
+                released += resident.nbytes()
+                resident.unload()
+            if not names:
+                return 0
+            gc.collect()
+            _trim_heap()
+            self._unloaded.update(names)
+            self.unloads[reason] = self.unloads.get(reason, 0) + 1
+        print(f"[Residency] Unloaded {', '.join(names)} ({reason}), "
+              f"{released / 2**20:.0f} MB released")
+        return released
+
+    def stats(self) -> dict:
+        available = available_memory()
+        rss = resident_memory()
+        return {
+            "resident_mb": {
+                name: round(resident.nbytes() / 2**20, 1)
+                for name, resident in self.residents.items()
+            },
+            "process_rss_mb": round(rss / 2**20) if rss is not None else None,
+            "available_mb": round(available / 2**20) if available is not None else None,
+            "idle_s": round(time.monotonic() - self._last_used, 1) if not self._busy else 0.0,
+            "unloads": dict(self.unloads),
+            "reloads": {
+                name: {
+                    "count": len(times),
+                    "p50_ms": round(statistics.median(times) * 1000),
+                    "last_ms": round(times[-1] * 1000),
+                }
+                for name, times in self.reloads.items()
+            },
+        }
+
+    def __reload__(self, name: str, errors: list):
+        start = perf_counter()
+        try:
+            self.residents[name].load()
+        except Exception as e:
+            errors.append(e)
+            return
+        self._unloaded.discard(name)
+        self.reloads.setdefault(name, []).append(perf_counter() - start)
+
+    def __monitor__(self):
+        while not self._stop.wait(self.check_interval):
+            if self._busy:
+                continue
+            idle = time.monotonic() - self._last_used
+            if self.idle_timeout is not None and idle >= self.idle_timeout:
+                self.unload("idle", idle_for=self.idle_timeout)
+            elif self.__under_pressure__():
+                # Largest first, until enough is free again
+                for name in sorted(
+                    self.residents, key=lambda n: self.residents[n].nbytes(), reverse=True
+                ):
+                    if not self.__under_pressure__():
+                        break
+                    self.unload("memory pressure", [name])
+
+    def __under_pressure__(self) -> bool:
+        if not self.min_available_mb:
+            return False
+        available = available_memory()
+        return available is not None and available < self.min_available_mb * 2**20
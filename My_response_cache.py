@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    # Replies to repeated prompts ("what can you do"), so they skip the Ollama
+    # round trip. Keyed by the normalized prompt, model, temperature and a
+    # fingerprint of the history the reply can depend on: the system prompt
+    # and summary, plus the last context_turns exchanges, since a follow-up
+    # ("and what about tomorrow?", "why?") means something else after every
+    # exchange. Only the STANDALONE_PROMPTS skip the exchanges, so they hit
+    # whatever came before. Replies built on web search results expire after
+    # search_ttl, others after ttl. LRU-bounded in memory, optionally
+    # persisted to a JSON file across restarts.
+    STANDALONE_PROMPTS = {  # normalized
+        "what can you do", "what can you help me with", "who are you",
+        "what are you", "what is your name", "what s your name", "help",
+        "hello", "hi", "hi there", "hey", "good morning", "good evening",
+        "thanks", "thank you", "tell me a joke",
+    }
+
+    def __init__(
+        self,
+        path: str = None,
+        max_entries: int = 256,
+        ttl: float = 24 * 3600,
+        search_ttl: float = 300,
+        context_turns: int = 2,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.search_ttl = search_ttl
+        self.context_turns = context_turns
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.saved_s = 0.0
+        # key -> {"response", "expires" (wall clock, survives restarts), "latency"}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if self.path:
+            self.__load__()
+
+    @staticmethod
+    def normalize(prompt: str) -> str:
+        return " ".join(re.sub(r"[^\w\s]", " ", prompt.lower()).split())
+
+    def key(self, prompt: str, model: str, temperature: float, messages: list[dict]) -> str:
+        # messages: the history before this prompt, as sent to Ollama
+        prompt = self.normalize(prompt)
+        context = [m for m in messages if m["role"] == "system"]
+        if prompt not in self.STANDALONE_PROMPTS and self.context_turns:
+            turns = [m for m in messages if m["role"] != "system"]
+            context += turns[-2 * self.context_turns :]
+        fingerprint = "\n".join(f"{m['role']}: {m['content']}" for m in context)
+        raw = f"{model}|{temperature:.2f}|{fingerprint}|{prompt}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.time() >= entry["expires"]:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_s += entry["latency"]
+            return entry["response"]
+
+    def put(self, key: str, response: str, latency: float, searched: bool = False):
+        # latency: what generating the reply took, saved on every hit
+        if not response:
+            return
+        ttl = self.search_ttl if searched else self.ttl
+        with self._lock:
+            self._entries[key] = {
+                "response": response,
+                "expires": time.time() + ttl,
+                "latency": round(latency, 3),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            if self.path:
+                self.__save__()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.path:
+                self.__save__()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "saved_s": round(self.saved_s, 2),
+            "entries": len(self._entries),
+        }
+
+    def __load__(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except (ValueError, OSError) as e:
+            print(f"[Cache] Ignoring unreadable response cache {self.path}: {e}")
+            return
+        now = time.time()
+        # Saved least recently used first
+        for key, entry in entries[-self.max_entries :]:
+            if entry["expires"] > now:
+                self._entries[key] = entry
+
+    def __save__(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(self._entries.items()), f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
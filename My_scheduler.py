@@ -0,0 +1,148 @@
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from time import perf_counter
+
+from My_batch_decode import transcribe_batch
+
+
+class SchedulerBusy(Exception):
+    # submit() refused: the session, or the scheduler as a whole, has too many
+    # utterances waiting. Clients should back off and retry.
+    pass
+
+
+class TranscriptionScheduler:
+    # Shares one Whisper model between many sessions. Utterances waiting from
+    # different sessions are decoded together in one batch (My_batch_decode).
+    # Batches are filled round-robin, one utterance per session at a time, so
+    # a session with a backlog cannot starve the others, and submit() refuses
+    # work beyond per-session and total limits instead of queueing without
+    # bound.
+    def __init__(
+        self,
+        model,
+        fp16: bool = False,
+        language: str = "en",
+        max_batch: int = 8,
+        max_wait: float = 0.01,
+        per_session: int = 2,
+        max_pending: int = 32,
+    ):
+        # max_wait: how long the first utterance waits for others to batch with
+        self.model = model
+        self.fp16 = fp16
+        self.language = language
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.per_session = per_session
+        self.max_pending = max_pending
+        self.batches = 0
+        self.utterances = 0
+        self.max_queue_wait = 0.0  # seconds from submit() to the start of decoding
+        self.rejected = 0
+        self._queues = OrderedDict()  # session -> deque of (audio, future, submitted)
+        self._pending = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self.__run__, daemon=True)
+        self._thread.start()
+
+    def submit(self, session, audio) -> Future:
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise SchedulerBusy("scheduler closed")
+            queue = self._queues.setdefault(session, deque())
+            if len(queue) >= self.per_session or self._pending >= self.max_pending:
+                self.rejected += 1
+                raise SchedulerBusy(f"{self._pending} utterances waiting")
+            queue.append((audio, future, perf_counter()))
+            self._pending += 1
+            self._cond.notify()
+        return future
+
+    def forget(self, session):
+        # Drops a closed session; its waiting utterances are cancelled
+        with self._cond:
+            for _, future, _ in self._queues.pop(session, ()):
+                future.cancel()
+                self._pending -= 1
+
+    def close(self):
+        # Utterances still waiting fail with SchedulerBusy; a batch already
+        # being decoded completes
+        with self._cond:
+            self._closed = True
+            for queue in self._queues.values():
+                for _, future, _ in queue:
+                    future.set_exception(SchedulerBusy("scheduler closed"))
+            self._queues.clear()
+            self._pending = 0
+            self._cond.notify()
+        self._thread.join()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "batches": self.batches,
+                "utterances": self.utterances,
+                "mean_batch": round(self.utterances / self.batches, 2) if self.batches else 0.0,
+                "max_queue_wait_ms": round(self.max_queue_wait * 1000, 1),
+                "pending": self._pending,
+                "rejected": self.rejected,
+            }
+
+    def __next_batch__(self) -> list:
+        # Round-robin over sessions; the session served last goes to the back
+        batch = []
+        while len(batch) < self.max_batch and self._pending:
+            for session in list(self._queues):
+                queue = self._queues[session]
+                if not queue:
+                    continue
+                batch.append(queue.popleft())
+                self._pending -= 1
+                self._queues.move_to_end(session)
+                if len(batch) == self.max_batch:
+                    break
+        return batch
+
+    def __run__(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                # Give other sessions a moment to join the batch
+                deadline = perf_counter() + self.max_wait
+                while (
+                    self._pending < self.max_batch
+                    and perf_counter() < deadline
+                    and not self._closed
+                ):
+                    self._cond.wait(deadline - perf_counter())
+                batch = [
+                    item for item in self.__next_batch__() if item[1].set_running_or_notify_cancel()
+                ]
+            if not batch:
+                continue
+
+            start = perf_counter()
+            with self._cond:
+                self.batches += 1
+                self.utterances += len(batch)
+                self.max_queue_wait = max(
+                    [self.max_queue_wait] + [start - submitted for _, _, submitted in batch]
+                )
+            try:
+                texts = transcribe_batch(
+                    self.model, [audio for audio, _, _ in batch], self.language, self.fp16
+                )
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), text in zip(batch, texts):
+                future.set_result(text)
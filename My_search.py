@@ -0,0 +1,128 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError
+
+
+class DDGSBackend:
+    def __call__(self, query: str, max_results: int) -> list[dict]:
+        from ddgs import DDGS
+
+        with DDGS() as ddgs:
+            return list(ddgs.text(query, max_results=max_results))
+
+
+class StaticSearchBackend:
+    # Local stand-in for tests and benchmarks: canned results after a delay
+    def __init__(self, results: list[dict] = None, delay: float = 0.0, fail=False):
+        self.results = results or [
+            {"title": "Weather", "body": "Sunny with a high of 20 degrees."}
+        ]
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def __call__(self, query: str, max_results: int) -> list[dict]:
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("search backend unreachable")
+        return self.results[:max_results]
+
+
+class WebSearch:
+    def __init__(
+        self,
+        backend=None,
+        timeout: float = 2.0,
+        ttl: float = 600,
+        max_results: int = 10,
+        max_entries: int = 128,
+    ):
+        # backend(query, max_results) -> [{"title": ..., "body": ...}]
+        self.backend = backend or DDGSBackend()
+        self.timeout = timeout
+        self.ttl = ttl
+        self.max_results = max_results
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+        self.errors = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+    def search(self, query: str):
+        # Formatted results, or None if the backend failed or missed the deadline
+        key = self.normalize(query)
+        cached = self.__lookup__(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+
+        print("Searching Online ...")
+        future = Future()
+        future.add_done_callback(lambda f: self.__store__(key, f))
+
+        def run():
+            try:
+                future.set_result(self.backend(query, self.max_results))
+            except Exception as e:
+                future.set_exception(e)
+
+        # Daemon thread: a stalled request must not hold up exit or the reply
+        threading.Thread(target=run, daemon=True).start()
+        try:
+            results = future.result(timeout=self.timeout)
+        except TimeoutError:
+            self.timeouts += 1
+            print(f"[Search] No results within {self.timeout}s, answering without them.")
+            return None
+        except Exception:
+            self.errors += 1
+            print("[System] No WiFi connection. For updated results, connect to WiFi.")
+            return None
+        return self.__format_results__(results)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
+
+    def __format_results__(self, results: list[dict]) -> str:
+        return "\n".join([f"- {r['title']}: {r['body']}" for r in results])
+
+    def __lookup__(self, key: str):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            expires, text = entry
+            if time.monotonic() >= expires:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return text
+
+    def __store__(self, key: str, future: Future):
+        # Also runs for searches that finished after the deadline, so the next
+        # ask within the TTL is served from cache
+        if future.exception() is not None:
+            return
+        results = future.result()
+        if not results:
+            return
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl, self.__format_results__(results))
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
@@ -0,0 +1,47 @@
+import re
+
+# Sentence end: terminal punctuation (plus closing quotes/brackets) that is
+# followed by whitespace, or a line break. A trailing "." with nothing after it
+# is left in the buffer since the next chunk may turn it into "3.5" or "...".
+_BOUNDARY = re.compile(r"[.!?]+[\"')\]]*(?=\s)|\n+")
+_ABBREVIATIONS = {
+    "mr.", "mrs.", "ms.", "dr.", "prof.", "sr.", "jr.", "st.",
+    "vs.", "etc.", "e.g.", "i.e.", "a.m.", "p.m.", "no.",
+}
+
+
+class SentenceSegmenter:
+    def __init__(self, min_chars: int = 12):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> list[str]:
+        self._buffer += chunk
+        sentences = []
+        start = 0
+        for match in _BOUNDARY.finditer(self._buffer):
+            sentence = self._buffer[start : match.end()].strip()
+            if not sentence:
+                start = match.end()
+                continue
+            last_word = sentence.rsplit(maxsplit=1)[-1].lower()
+            if last_word in _ABBREVIATIONS or len(sentence) < self.min_chars:
+                continue
+            sentences.append(sentence)
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> str:
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return rest
+
+
+def split_sentences(text: str, min_chars: int = 12) -> list[str]:
+    segmenter = SentenceSegmenter(min_chars)
+    sentences = segmenter.feed(text + " ")
+    rest = segmenter.flush()
+    if rest:
+        sentences.append(rest)
+    return sentences
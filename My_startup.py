@@ -0,0 +1,55 @@
+import threading
+from time import perf_counter
+
+
+class Startup:
+    # Runs independent startup stages in parallel, one thread each. A stage is
+    # a list of named steps (e.g. load, then warm-up) run in order; every step
+    # is timed, and a failing step ends its stage without stopping the others.
+    def __init__(self):
+        self.stages = {}
+        self.timings = {}  # stage -> [(step, seconds)]
+        self.errors = {}  # stage -> exception
+        self.elapsed = 0.0
+
+    def add(self, stage: str, *steps):
+        # steps: (name, fcn) pairs
+        self.stages[stage] = steps
+        return self
+
+    def run(self) -> bool:
+        start = perf_counter()
+        threads = [
+            threading.Thread(target=self.__run_stage__, args=(stage,), daemon=True)
+            for stage in self.stages
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.elapsed = perf_counter() - start
+        self.report()
+        return not self.errors
+
+    def stage_time(self, stage: str) -> float:
+        return sum(seconds for _, seconds in self.timings.get(stage, []))
+
+    def report(self):
+        for stage in self.stages:
+            steps = " + ".join(f"{step} {seconds:.2f}s" for step, seconds in self.timings[stage])
+            status = f" (failed: {self.errors[stage]})" if stage in self.errors else ""
+            print(f"[Startup] {stage:<8} {self.stage_time(stage):6.2f}s  {steps}{status}")
+        sequential = sum(self.stage_time(stage) for stage in self.stages)
+        print(f"[Startup] Ready in {self.elapsed:.2f}s (one after another: {sequential:.2f}s)")
+
+    def __run_stage__(self, stage: str):
+        self.timings[stage] = []
+        for step, fcn in self.stages[stage]:
+            start = perf_counter()
+            try:
+                fcn()
+            except Exception as e:
+                self.errors[stage] = e
+                return
+            finally:
+                self.timings[stage].append((step, perf_counter() - start))
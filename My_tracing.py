@@ -0,0 +1,200 @@
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from time import perf_counter
+
+# Turn being traced. Components call mark()/annotate() without knowing about
+# the tracer; both are no-ops when nothing is being traced. A thread can be
+# bound to another turn (e.g. listening for the next one during playback).
+_current = None
+_local = threading.local()
+
+# Derived spans, in ms: name -> (from mark, to mark)
+SPANS = {
+    "stt": ("eos", "transcribed"),
+    "llm_first_token": ("transcribed", "first_token"),
+    "llm_generation": ("first_token", "last_token"),
+    "tts_first_audio": ("first_token", "first_audio"),
+    "response": ("eos", "first_audio"),  # what the user waits for
+    "playback": ("first_audio", "playback_end"),
+    "turn": ("eos", "playback_end"),
+    "interruption": ("barge_in", "playback_stopped"),
+}
+
+
+def current():
+    return getattr(_local, "turn", None) or _current
+
+
+def bind(turn):
+    # Marks from this thread go to turn (None: back to the current turn)
+    _local.turn = turn
+
+
+def mark(name: str, at: float = None):
+    turn = current()
+    if turn is not None:
+        turn.mark(name, at)
+
+
+def annotate(**info):
+    turn = current()
+    if turn is not None:
+        turn.annotate(**info)
+
+
+def record_ollama(data: dict):
+    # Timings from the final chunk of an Ollama response (durations in ns)
+    eval_count = data.get("eval_count")
+    eval_duration = data.get("eval_duration")
+    annotate(
+        prompt_eval_count=data.get("prompt_eval_count"),
+        prompt_eval_ms=_ms(data.get("prompt_eval_duration")),
+        eval_count=eval_count,
+        eval_ms=_ms(eval_duration),
+        load_ms=_ms(data.get("load_duration")),
+        tokens_per_sec=(
+            round(eval_count / (eval_duration / 1e9), 1) if eval_count and eval_duration else None
+        ),
+    )
+
+
+def _ms(ns):
+    return round(ns / 1e6, 1) if ns is not None else None
+
+
+class Turn:
+    def __init__(self, turn_id: int):
+        self.id = turn_id
+        self.wall_time = time.time()
+        self.marks = {}  # name -> seconds since the turn started
+        self.info = {}
+        self.started = perf_counter()
+        self._lock = threading.Lock()
+
+    def mark(self, name: str, at: float = None):
+        # First occurrence wins: "first_audio" is only the first chunk.
+        # at: perf_counter() time the event happened, if not now
+        now = (perf_counter() if at is None else at) - self.started
+        with self._lock:
+            self.marks.setdefault(name, now)
+
+    def annotate(self, **info):
+        with self._lock:
+            self.info.update(info)
+
+    def merge(self, other: "Turn"):
+        # Marks and info recorded into another turn (first occurrence still
+        # wins), e.g. a reply requested before this turn knew about it
+        for name, t in list(other.marks.items()):
+            self.mark(name, other.started + t)
+        self.annotate(**other.info)
+
+    def spans(self) -> dict:
+        return {
+            name: round((self.marks[end] - self.marks[start]) * 1000, 1)
+            for name, (start, end) in SPANS.items()
+            if start in self.marks and end in self.marks
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "turn": self.id,
+            "time": self.wall_time,
+            "marks": {name: round(t * 1000, 1) for name, t in self.marks.items()},
+            "spans": self.spans(),
+            **self.info,
+        }
+
+
+class Tracer:
+    # Collects one Turn per conversation turn and appends each finished turn
+    # to a JSONL file (if path is set). keep: only hold the latest turns in
+    # memory (long-running servers)
+    def __init__(self, path: str = None, keep: int = None):
+        self.path = path
+        self.turns = [] if keep is None else deque(maxlen=keep)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start_turn(self, activate: bool = True, **info) -> Turn:
+        turn = Turn(next(self._ids))
+        turn.annotate(**info)
+        with self._lock:
+            self.turns.append(turn)
+        if activate:
+            self.activate(turn)
+        return turn
+
+    def activate(self, turn: Turn):
+        global _current
+        _current = turn
+
+    def discard(self, turn: Turn):
+        # A turn that never happened (e.g. nobody talked over the reply)
+        with self._lock:
+            if turn in self.turns:
+                self.turns.remove(turn)
+
+    def end_turn(self, turn: Turn = None):
+        global _current
+        turn = turn or _current
+        if turn is None:
+            return
+        if _current is turn:
+            _current = None
+        if self.path:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(turn.to_dict()) + "\n")
+
+    def summary(self) -> dict:
+        with self._lock:
+            turns = list(self.turns)
+        return summarize([turn.to_dict() for turn in turns])
+
+
+def load(path: str) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values: list, q: float) -> float:
+    # Nearest-rank percentile
+    values = sorted(values)
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def summarize(turns: list[dict]) -> dict:
+    # name -> {"n", "p50", "p95"} over every span and numeric LLM metric
+    columns = {}
+    for turn in turns:
+        values = dict(turn["spans"])
+        for key in ("prompt_eval_ms", "eval_ms", "tokens_per_sec"):
+            if turn.get(key) is not None:
+                values[key] = turn[key]
+        for name, value in values.items():
+            columns.setdefault(name, []).append(value)
+    return {
+        name: {"n": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95)}
+        for name, values in columns.items()
+    }
+
+
+def format_summary(summary: dict) -> str:
+    lines = [f"{'':<18}{'n':>5}{'p50':>10}{'p95':>10}"]
+    for name, s in summary.items():
+        lines.append(f"{name:<18}{s['n']:>5}{s['p50']:>10.1f}{s['p95']:>10.1f}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # python My_tracing.py traces/turns.jsonl
+    import sys
+
+    print(format_summary(summarize(load(sys.argv[1] if len(sys.argv) > 1 else "traces/turns.jsonl"))))
@@ -1,102 +1,287 @@
+import threading
+import time
 import numpy as np
-import sounddevice as sd
 import whisper
-import torch
-import gc
+from My_capture import AudioCapture
+from My_device import WhisperRuntime
+from My_fast_decode import transcribe_short
+import My_tracing as tracing
+from My_vad import EchoGate, Endpointer, VoiceActivityDetector
+
+
+class LocalAgreement:
+    # LocalAgreement-2 (as in whisper_streaming): a word is committed once two
+    # consecutive decodes of the growing window agree on it
+    def __init__(self):
+        self.committed = []  # (word, start, end), times in seconds
+        self._previous = []
+
+    @property
+    def offset(self) -> float:
+        # End of the committed audio; later decodes only need what follows
+        return self.committed[-1][2] if self.committed else 0.0
+
+    def update(self, words: list) -> list:
+        agreed = 0
+        for new, old in zip(words, self._previous):
+            if self.__norm__(new[0]) != self.__norm__(old[0]):
+                break
+            agreed += 1
+        self.committed += words[:agreed]
+        self._previous = words[agreed:]
+        return words[:agreed]
+
+    def text(self) -> str:
+        return " ".join(word for word, _, _ in self.committed)
+
+    def tentative_text(self) -> str:
+        return " ".join(word for word, _, _ in self._previous)
+
+    @staticmethod
+    def __norm__(word: str) -> str:
+        return "".join(c for c in word.lower() if c.isalnum())
 
 
 class MyTranscriber:
-    DEVICE = "mps"
+    DEVICE = None  # None: best available (cuda > mps > cpu)
     MODEL_DIR = "./models"
     MODEL_NAME = "large-v3-turbo"
     SAMPLE_RATE = 16000
-    SILENCE_THRESHOLD = 0.01
+    FRAME_DURATION = 0.02  # VAD frame size, finer than the capture chunks
     SILENCE_DURATION = 1.5
     CHUNK_DURATION = 0.1
     MIN_SPEECH_DURATION = 0.5
+    STREAM_INTERVAL = 1.0  # seconds of new audio between partial decodes
+    PREROLL_DURATION = 0.3  # audio kept from before speech was detected
+    MAX_UTTERANCE_DURATION = 60.0  # ring buffer size
+    FAST_PATH = True  # short utterances skip the 30 s window (My_fast_decode)
+    PAUSE_DURATION = 0.3  # silence before transcribing ahead (on_pause)
 
-    def __init__(self, model_name: str = None, device: str = None):
+    def __init__(
+        self,
+        model_name: str = None,
+        device: str = None,
+        stream_factory=None,
+        quantize: bool = None,
+    ):
         if model_name:
             self.MODEL_NAME = model_name
         if device:
             self.DEVICE = device
+        # quantize: int8 linear layers, by default only on CPU
+        self.runtime = WhisperRuntime(self.DEVICE, quantize)
+        self.DEVICE = self.runtime.device
         self.model = None
         self._stopped = False
+        # Kept across calls so the noise floor is calibrated only once
+        self.vad = VoiceActivityDetector(self.SAMPLE_RATE, self.FRAME_DURATION)
+        self.echo_gate = EchoGate()  # None disables echo gating
+        # Leave the microphone open between calls (full duplex), so nothing
+        # said right after an utterance or during playback is lost
+        self.keep_listening = False
+        # stream_factory: sd.InputStream by default, or a ReplayInputStream
+        self.capture = AudioCapture(
+            self.SAMPLE_RATE,
+            self.CHUNK_DURATION,
+            self.MAX_UTTERANCE_DURATION,
+            self.PREROLL_DURATION,
+            stream_factory,
+        )
 
     def init_model(self):
         print("[Transcriber] Loading whisper model...")
-        self.model = whisper.load_model(
-            self.MODEL_NAME, device=self.DEVICE, download_root=self.MODEL_DIR
-        )
+        self.model = self.runtime.load(self.MODEL_NAME, self.MODEL_DIR)
         print("[Transcriber] Model loaded!")
 
+    def warmup(self):
+        # One encoder pass and a few decoder steps on silence, so the first
+        # utterance does not pay for kernel selection and allocations
+        mel = whisper.log_mel_spectrogram(
+            whisper.pad_or_trim(np.zeros(self.SAMPLE_RATE, dtype=np.float32)),
+            self.model.dims.n_mels,
+        ).to(self.model.device)
+        options = whisper.DecodingOptions(
+            language="en", without_timestamps=True, fp16=self.runtime.fp16, sample_len=4
+        )
+        whisper.decode(self.model, mel, options)
+        if self.FAST_PATH:
+            silence = np.zeros(self.SAMPLE_RATE, dtype=np.float32)
+            transcribe_short(self.model, silence, "en", self.runtime.fp16)
+
     def stop(self):
         self._stopped = True
 
-    def listen_and_transcribe(self) -> str:
+    def listen_and_transcribe(
+        self,
+        on_partial=None,
+        echo_level=None,
+        on_speech_start=None,
+        on_pause=None,
+        on_resume=None,
+    ) -> str:
+        # on_partial(committed, tentative) switches to streaming mode: the
+        # utterance is decoded while the user is still talking and only the
+        # uncommitted tail is left to decode at end of speech.
+        # echo_level() is the current playback level while the assistant is
+        # talking, for echo gating; on_speech_start() runs on the audio thread
+        # as soon as speech is detected (barge-in).
+        # on_pause(text) gets the utterance so far, transcribed after
+        # PAUSE_DURATION of silence; on_resume() runs on the audio thread if
+        # the user goes on after it. If the pause was the end of the
+        # utterance, that transcript is returned without decoding again.
         if self.model is None:
             raise RuntimeError("Model not initialized. Call init_model() first.")
 
         self._stopped = False
-        audio_buffer = []
         is_speaking = False
-        silence_chunks = 0
-        silence_needed = int(self.SILENCE_DURATION / self.CHUNK_DURATION)
-        min_speech_chunks = int(self.MIN_SPEECH_DURATION / self.CHUNK_DURATION)
+        speculate = on_pause is not None and on_partial is None
+        endpointer = Endpointer(
+            self.vad,
+            self.SILENCE_DURATION,
+            self.MIN_SPEECH_DURATION,
+            self.PAUSE_DURATION if speculate else None,
+        )
         done = False
-        captured_audio = None
+        start = end = None
+        end_time = None
+        paused_at = None  # end of the audio at the last pause, None once resumed
+        speculation = None  # (paused_at, transcript)
+        pause_lock = threading.Lock()
 
-        def audio_callback(indata, frames, time_info, status):
-            nonlocal is_speaking, silence_chunks, done, captured_audio
+        def on_chunk(chunk, position):
+            nonlocal is_speaking, done, start, end, end_time, paused_at
 
             if done or self._stopped:
                 done = True
                 return
 
-            chunk = indata.copy()
-            energy = np.sqrt(np.mean(chunk ** 2))
+            echo = level = 0.0
+            if echo_level is not None and self.echo_gate is not None:
+                level = echo_level()
+                echo = self.echo_gate.threshold(level)
+            event = endpointer.update(chunk, echo)
+            if level and not endpointer.in_utterance:
+                self.echo_gate.observe(chunk, level)
 
-            if energy > self.SILENCE_THRESHOLD:
+            if event == "start":
+                # start before is_speaking: the streaming loop reads both
+                start = self.capture.onset(position - len(chunk))
                 is_speaking = True
-                silence_chunks = 0
-                audio_buffer.append(chunk)
-            elif is_speaking:
-                audio_buffer.append(chunk)
-                silence_chunks += 1
-
-                if silence_chunks >= silence_needed:
-                    speech_chunks = len(audio_buffer) - silence_chunks
-                    if speech_chunks >= min_speech_chunks:
-                        captured_audio = np.concatenate(audio_buffer, axis=0).flatten()
-                    done = True
-
-        stream = sd.InputStream(
-            samplerate=self.SAMPLE_RATE,
-            channels=1,
-            dtype="float32",
-            blocksize=int(self.SAMPLE_RATE * self.CHUNK_DURATION),
-            callback=audio_callback,
-        )
+                if on_speech_start:
+                    on_speech_start()
+            if event == "pause":
+                paused_at = position
+            elif event == "resume":
+                with pause_lock:
+                    paused_at = None
+                    if on_resume:
+                        on_resume()
+            if event == "end":
+                end_time = time.perf_counter()
+                end = position
+                done = True
+            elif event == "discard":
+                done = True
 
-        stream.start()
-        while not done:
-            sd.sleep(100)
-        stream.stop()
-        stream.close()
+        agreement = LocalAgreement() if on_partial else None
+        stream_samples = int(self.SAMPLE_RATE * self.STREAM_INTERVAL)
+        decoded_until = 0
 
-        if self._stopped or captured_audio is None:
+        self.capture.start(on_chunk)
+        while not done and not self._stopped:
+            time.sleep(0.1)
+            pause = paused_at
+            if speculate and pause is not None and (speculation is None or speculation[0] != pause):
+                text = self.__transcribe__(self.capture.audio(start, pause))
+                with pause_lock:
+                    # Not if the user went on while it was being transcribed
+                    if paused_at == pause:
+                        speculation = (pause, text)
+                        on_pause(text)
+                continue
+            if agreement is None or not is_speaking or done:
+                continue
+            position = self.capture.ring.total
+            if position - max(start, decoded_until) < stream_samples:
+                continue
+            decoded_until = position
+            audio = self.capture.audio(start, position)
+            agreement.update(self.__decode_words__(audio, agreement))
+            on_partial(agreement.text(), agreement.tentative_text())
+        if not self.keep_listening:
+            self.capture.stop()
+
+        if self._stopped or end is None:
             return ""
 
+        # Marked here rather than on the audio thread, so it goes to the turn
+        # this thread is tracing
+        tracing.mark("eos", at=end_time)
+        # Contiguous view into the ring buffer, no copy
+        captured_audio = self.capture.audio(start, end)
         print("[Transcriber] Transcribing...")
-        result = self.model.transcribe(captured_audio, language="en", fp16=True, verbose=None)
-        text = result["text"].strip()
+        tracing.annotate(utterance_ms=round(len(captured_audio) / self.SAMPLE_RATE * 1000))
+        if agreement is not None:
+            tail = self.__decode_tail__(captured_audio, agreement)
+            text = f"{agreement.text()} {tail}".strip()
+        elif speculation is not None and speculation[0] == paused_at:
+            # Nothing was said after the pause: only silence to add
+            text = speculation[1]
+            tracing.annotate(transcribed_at_pause=True)
+        else:
+            text = self.__transcribe__(captured_audio)
+        tracing.mark("transcribed")
+        return text
+
+    def __transcribe__(self, audio: np.ndarray) -> str:
+        # Fast path first; the full 30 s window with temperature fallback when
+        # the utterance is long or the fast result looks unreliable
+        text = None
+        if self.FAST_PATH:
+            text = transcribe_short(self.model, audio, "en", self.runtime.fp16)
+            tracing.annotate(fast_path=text is not None)
+        if text is None:
+            result = self.model.transcribe(
+                audio, language="en", fp16=self.runtime.fp16, verbose=None
+            )
+            text = result["text"].strip()
         return text
 
+    def __decode_words__(self, audio: np.ndarray, agreement: LocalAgreement):
+        # Words of the not-yet-committed window, with absolute timestamps
+        offset = agreement.offset
+        result = self.model.transcribe(
+            audio[int(offset * self.SAMPLE_RATE) :],
+            language="en",
+            fp16=self.runtime.fp16,
+            verbose=None,
+            word_timestamps=True,
+            condition_on_previous_text=False,
+            initial_prompt=agreement.text() or None,
+        )
+        return [
+            (w["word"].strip(), offset + w["start"], offset + w["end"])
+            for segment in result["segments"]
+            for w in segment.get("words", [])
+        ]
+
+    def __decode_tail__(self, audio: np.ndarray, agreement: LocalAgreement) -> str:
+        tail = audio[int(agreement.offset * self.SAMPLE_RATE) :]
+        if len(tail) < self.SAMPLE_RATE * self.CHUNK_DURATION:
+            return ""
+        result = self.model.transcribe(
+            tail,
+            language="en",
+            fp16=self.runtime.fp16,
+            verbose=None,
+            condition_on_previous_text=False,
+            initial_prompt=agreement.text() or None,
+        )
+        return result["text"].strip()
+
     def cleanup(self):
         if self.model is not None:
-            del self.model
+            # Rebinding rather than del: another thread may be checking it
             self.model = None
-            gc.collect()
-            if self.DEVICE == "mps":
-                torch.mps.empty_cache()
+            self.runtime.release()
             print("[Transcriber] Model cleaned up.")
@@ -1,5 +1,14 @@
+import queue
 import subprocess
+import threading
+import wave
+from concurrent.futures import Future
 from typing import Literal
+from My_player import AudioPlayer
+from My_segmenter import split_sentences
+from My_tts_cache import TTSCache
+from My_tts_engine import TTSEngine, voice_sample_rate
+import My_tracing as tracing
 
 VoiceName = Literal["joe-medium", "lessac-high"]
 
@@ -11,28 +20,97 @@ class MyTTS:
         "lessac-high": f"{__VOICE_DIR__}/en_US-lessac-high.onnx",
     }
     __System__ = "mac"
+    # play() returns with this much audio left, so the next sentence is
+    # queued before the player runs dry (at least the jitter buffer)
+    PLAY_AHEAD = 0.2
 
     @classmethod
     def list_voices(cls):
         return list(cls.__VOICES__.keys())
 
     def __init__(
-        self, voiceName: VoiceName, slowness: float = 1, sentence_silence: float = 0
+        self,
+        voiceName: VoiceName,
+        slowness: float = 1,
+        sentence_silence: float = 0,
+        resident: bool = True,
+        use_cache: bool = True,
     ):
         self.voice = self.__VOICES__[voiceName]
         self.slowness = slowness
         self.sentence_silence = sentence_silence
+        # resident: keep the voice loaded in-process instead of spawning piper
+        # (and reloading the ONNX model) for every utterance
+        self.engine = TTSEngine.get(self.voice) if resident else None
+        self.cache = TTSCache.default() if resident and use_cache else None
+        # From the voice's .onnx.json, so the rate is right before it loads
+        self.sample_rate = voice_sample_rate(self.voice)
         self._piper_proc = None
-        self._play_proc = None
+        self._stopped = False
 
-    def stop(self):
-        for proc in (self._play_proc, self._piper_proc):
-            if proc and proc.poll() is None:
-                proc.kill()
+    @property
+    def player(self) -> AudioPlayer:
+        # The persistent output stream for this voice's sample rate
+        rate = self.engine.sample_rate if self.engine and self.engine.sample_rate else None
+        return AudioPlayer.get(rate or self.sample_rate)
+
+    def preload(self):
+        if self.engine:
+            self.engine.load()
+
+    def warmup(self):
+        # One throwaway synthesis (not cached, not played) so the first reply
+        # does not pay for ONNX session setup
+        if self.engine:
+            self.engine.synthesize("Hello.", self.slowness)
+
+    def playback_level(self) -> float:
+        # RMS (0..1) of the audio being played right now, for echo gating
+        return self.player.level()
+
+    def synthesize(self, text: str) -> bytes:
+        # Blocking: PCM for text from the resident engine (or the cache)
+        return self.__collect__(self.submit(text))
+
+    def submit(self, text: str) -> list[Future]:
+        # Queues synthesis of text; one future (PCM bytes) per sentence
+        return self.__synthesize__(text)
+
+    def collect(self, futures: list[Future]) -> bytes:
+        # Blocking: PCM from submit()'s futures, sentence_silence between them
+        return self.__collect__(futures)
+
+    def play(self, pcm: bytes):
+        # Blocking: queues PCM from synthesize(), unless stopped, and returns
+        # once all but PLAY_AHEAD seconds of it have played; calls in a row
+        # play gaplessly. drain() waits for the end.
+        self.__play_pcm__(pcm)
+        self.player.wait(self.PLAY_AHEAD)
+
+    def drain(self):
+        # Blocking: until everything queued has played (or stop())
+        self.player.drain()
+
+    def reset(self):
+        # Allow playback again after stop()
+        self._stopped = False
+
+    def stop(self, on_silent=None):
+        # Silences playback at once (from the player's next block); on_silent
+        # gets the perf_counter() time the speaker actually goes quiet
+        self._stopped = True
+        self.player.stop(on_silent)
+        proc = self._piper_proc
+        if proc and proc.poll() is None:
+            proc.kill()
         self._piper_proc = None
-        self._play_proc = None
 
     def process_play(self, text: str):
+        if self.engine:
+            self.__play_pcm__(self.__collect__(self.__synthesize__(text)))
+            self.drain()
+            return
+
         self._piper_proc = subprocess.Popen(
             [
                 "piper",
@@ -47,31 +125,115 @@ class MyTTS:
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
         )
+        proc = self._piper_proc
+        proc.stdin.write(text.encode("utf-8"))
+        proc.stdin.close()
+        # Raw s16le at the voice's rate, played as it arrives; the player's
+        # jitter buffer evens out piper's bursts
+        player = AudioPlayer.get(self.sample_rate)
+        while not self._stopped and (chunk := proc.stdout.read1(4096)):
+            if len(chunk) % 2:
+                chunk += proc.stdout.read(1)
+            player.write(chunk)
+            tracing.mark("first_audio")
+        proc.stdout.close()
+        proc.wait()
+        player.drain()
+        self._piper_proc = None
 
-        self._play_proc = subprocess.Popen(
-            [
-                "ffplay",
-                "-nodisp",
-                "-autoexit",
-                "-loglevel",
-                "quiet",
-                "-f",
-                "s16le",  # raw 16-bit signed little-endian
-                "-ar",
-                "22050",  # piper's default sample rate (check your model)
-                "-i",
-                "pipe:0",
-            ],
-            stdin=self._piper_proc.stdout,
-        )
+    def process_play_stream(self, sentences):
+        # Speaks each sentence as soon as it arrives, e.g. while the LLM is
+        # still generating the rest of the reply
+        self.reset()
+        if self.engine is None:
+            for sentence in sentences:
+                if self._stopped:
+                    break
+                self.process_play(sentence)
+            tracing.mark("playback_end")
+            return
 
-        self._piper_proc.stdin.write(text.encode("utf-8"))
-        self._piper_proc.stdin.close()
-        self._play_proc.wait()
-        self._piper_proc = None
-        self._play_proc = None
+        # Queue synthesis as sentences arrive so the next one is ready by the
+        # time the current one finishes playing
+        pending = queue.Queue()
+
+        def feed():
+            try:
+                for sentence in sentences:
+                    if self._stopped:
+                        break
+                    pending.put(self.__synthesize__(sentence))
+            finally:
+                pending.put(None)
+
+        threading.Thread(target=feed, daemon=True).start()
+        while True:
+            futures = pending.get()
+            if futures is None:
+                break
+            if self._stopped:
+                for future in futures:
+                    future.cancel()
+                continue
+            self.play(self.__collect__(futures))
+        self.drain()
+        tracing.mark("playback_end")
+
+    def __synthesize__(self, text: str) -> list[Future]:
+        # One request per sentence so sentences repeated across replies are
+        # served from the cache
+        sentences = split_sentences(text) or [text]
+        return [self.__synthesize_sentence__(sentence) for sentence in sentences]
+
+    def __synthesize_sentence__(self, sentence: str) -> Future:
+        if self.cache is None:
+            return self.engine.submit(sentence, self.slowness, self.sentence_silence)
+
+        key = self.cache.key(self.voice, self.slowness, self.sentence_silence, sentence)
+        pcm = self.cache.get(key)
+        if pcm is not None:
+            future = Future()
+            future.set_result(pcm)
+            return future
+
+        def store(future):
+            if not future.cancelled() and future.exception() is None:
+                self.cache.put(key, future.result())
+
+        future = self.engine.submit(sentence, self.slowness, self.sentence_silence)
+        future.add_done_callback(store)
+        return future
+
+    def __collect__(self, futures: list[Future]):
+        if len(futures) == 1:
+            return futures[0].result()
+        silence = bytes(int(self.sample_rate * self.sentence_silence) * 2)
+        return silence.join(future.result() for future in futures)
+
+    def __play_pcm__(self, pcm: bytes):
+        if self._stopped:
+            return
+        self.player.write(pcm)
+        tracing.mark("first_audio")
 
     def process_save(self, text: str, output_file: str, play: bool = False):
+        if self.engine:
+            pcm = self.__collect__(self.__synthesize__(text))
+            with wave.open(output_file, "wb") as wav_file:
+                wav_file.setnchannels(1)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(self.sample_rate)
+                wav_file.writeframes(pcm)
+        else:
+            self.__save_with_subprocess__(text, output_file)
+
+        if play:
+            with wave.open(output_file, "rb") as wav_file:
+                player = AudioPlayer.get(wav_file.getframerate())
+                player.write(wav_file.readframes(wav_file.getnframes()))
+            player.drain()
+
+    def __save_with_subprocess__(self, text: str, output_file: str):
         piper_proc = subprocess.Popen(
             [
                 "piper",
@@ -91,7 +253,3 @@ class MyTTS:
         piper_proc.stdin.close()
         piper_proc.wait()
 
-        if play:
-            subprocess.run(
-                ["ffplay", "-nodisp", "-autoexit", "-loglevel", "quiet", output_file]
-            )
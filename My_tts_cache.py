@@ -0,0 +1,133 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class TTSCache:
+    # Sentence-level PCM cache: an in-memory LRU in front of a size-capped disk
+    # tier of raw int16 files that are memory-mapped on a hit
+    __DEFAULT__ = None
+
+    @classmethod
+    def default(cls) -> "TTSCache":
+        if cls.__DEFAULT__ is None:
+            cls.__DEFAULT__ = cls()
+        return cls.__DEFAULT__
+
+    def __init__(
+        self,
+        cache_dir: str = "./cache/tts",
+        memory_bytes: int = 32 * 1024 * 1024,
+        disk_bytes: int = 512 * 1024 * 1024,
+    ):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk_size = 0
+        self._lock = threading.Lock()
+
+        if self.disk_bytes:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._disk_size = sum(size for _, _, size in self.__disk_entries__())
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.split())
+
+    def key(self, voice: str, slowness: float, sentence_silence: float, text: str):
+        raw = (
+            f"{os.path.basename(voice)}|{slowness:.3f}|{sentence_silence:.3f}|"
+            f"{self.normalize(text)}"
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            pcm = self._memory.get(key)
+            if pcm is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return pcm
+
+            path = self.__file_path__(key)
+            if not self.disk_bytes or not os.path.exists(path):
+                self.misses += 1
+                return None
+
+            pcm = np.memmap(path, dtype=np.int16, mode="r")
+            os.utime(path)  # disk tier evicts least recently used by mtime
+            self.disk_hits += 1
+            self.__remember__(key, pcm)
+            return pcm
+
+    def put(self, key: str, pcm: bytes):
+        if not pcm:
+            return
+        with self._lock:
+            self.__remember__(key, pcm)
+            if not self.disk_bytes:
+                return
+            path = self.__file_path__(key)
+            if os.path.exists(path):
+                return
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(pcm)
+            os.replace(tmp_path, path)
+            self._disk_size += len(pcm)
+            if self._disk_size > self.disk_bytes:
+                self.__evict_disk__()
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_bytes": self._memory_size,
+            "disk_bytes": self._disk_size,
+        }
+
+    def __file_path__(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pcm")
+
+    def __remember__(self, key: str, pcm):
+        size = memoryview(pcm).nbytes
+        if size > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_size -= memoryview(old).nbytes
+        self._memory[key] = pcm
+        self._memory_size += size
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= memoryview(evicted).nbytes
+
+    def __disk_entries__(self):
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".pcm"):
+                stat = entry.stat()
+                yield entry.path, stat.st_mtime, stat.st_size
+
+    def __evict_disk__(self):
+        # Trim to 90% of the cap so we don't rescan on every insert
+        target = self.disk_bytes * 0.9
+        for path, _, size in sorted(self.__disk_entries__(), key=lambda e: e[1]):
+            if self._disk_size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._disk_size -= size
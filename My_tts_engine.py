@@ -0,0 +1,100 @@
+import json
+import queue
+import threading
+from concurrent.futures import Future
+
+DEFAULT_SAMPLE_RATE = 22050  # most Piper voices
+
+
+def voice_sample_rate(voice_path: str) -> int:
+    # From the voice's config (voice.onnx.json), without loading the model
+    try:
+        with open(f"{voice_path}.json", encoding="utf-8") as f:
+            return int(json.load(f)["audio"]["sample_rate"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return DEFAULT_SAMPLE_RATE
+
+
+class TTSEngine:
+    # One resident engine per voice file, shared by every MyTTS using that voice
+    __ENGINES__: dict = {}
+    __LOCK__ = threading.Lock()
+
+    @classmethod
+    def get(cls, voice_path: str) -> "TTSEngine":
+        with cls.__LOCK__:
+            engine = cls.__ENGINES__.get(voice_path)
+            if engine is None:
+                engine = cls.__ENGINES__[voice_path] = cls(voice_path)
+            return engine
+
+    def __init__(self, voice_path: str):
+        self.voice_path = voice_path
+        self.voice = None
+        self.sample_rate = None
+        self._requests = queue.Queue()
+        self._worker = None
+        self._load_lock = threading.Lock()
+
+    def load(self):
+        with self._load_lock:
+            if self.voice is None:
+                from piper import PiperVoice
+
+                print(f"[TTS] Loading voice {self.voice_path}...")
+                self.voice = PiperVoice.load(self.voice_path)
+                self.sample_rate = self.voice.config.sample_rate
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+        return self
+
+    def submit(
+        self, text: str, slowness: float = 1, sentence_silence: float = 0
+    ) -> Future:
+        # Future resolves to raw 16-bit mono PCM at self.sample_rate
+        self.load()
+        future = Future()
+        self._requests.put((text, slowness, sentence_silence, future))
+        return future
+
+    def synthesize(
+        self, text: str, slowness: float = 1, sentence_silence: float = 0
+    ) -> bytes:
+        return self.submit(text, slowness, sentence_silence).result()
+
+    def close(self):
+        with self._load_lock:
+            if self._worker is not None:
+                self._requests.put(None)
+                self._worker = None
+            self.voice = None
+
+    def _run(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            text, slowness, sentence_silence, future = request
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self._synthesize(text, slowness, sentence_silence))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _synthesize(self, text: str, slowness: float, sentence_silence: float):
+        if hasattr(self.voice, "synthesize_stream_raw"):  # piper-tts < 1.3
+            return b"".join(
+                self.voice.synthesize_stream_raw(
+                    text, length_scale=slowness, sentence_silence=sentence_silence
+                )
+            )
+
+        from piper import SynthesisConfig
+
+        silence = bytes(int(self.sample_rate * sentence_silence) * 2)
+        config = SynthesisConfig(length_scale=slowness)
+        return silence.join(
+            chunk.audio_int16_bytes for chunk in self.voice.synthesize(text, config)
+        )
@@ -0,0 +1,243 @@
+import numpy as np
+
+
+class VoiceActivityDetector:
+    # Frame-level VAD. Energy, zero-crossing rate and spectral flatness are
+    # computed for all frames of a block at once; the noise floor is calibrated
+    # on the first calibration_duration seconds and then tracks non-speech
+    # frames. Speech starts above start_ratio * floor and only ends below the
+    # lower stop_ratio * floor (hysteresis). Speech that is not that loud (low
+    # SNR) can start too, if it stands out from a tracked noise spectrum for
+    # long enough.
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_duration: float = 0.02,
+        calibration_duration: float = 0.5,
+        start_ratio: float = 2.0,
+        stop_ratio: float = 1.5,
+        min_start_energy: float = 0.002,
+        flatness_ratio: float = 0.8,
+        max_zcr: float = 0.35,
+        start_frames: int = 2,
+        strong_ratio: float = 4.0,
+        quiet_ratio: float = 1.2,
+        spectral_threshold: float = 1.0,
+        quiet_start_frames: int = 2,
+        hangover: float = 0.3,
+        floor_adaptation: float = 0.05,
+    ):
+        self.sample_rate = sample_rate
+        self.frame_size = int(sample_rate * frame_duration)
+        self.frame_duration = self.frame_size / sample_rate
+        self.calibration_frames = max(1, int(calibration_duration / self.frame_duration))
+        self.start_ratio = start_ratio
+        self.stop_ratio = stop_ratio
+        self.min_start_energy = min_start_energy
+        self.flatness_ratio = flatness_ratio
+        self.max_zcr = max_zcr
+        self.start_frames = start_frames
+        self.strong_ratio = strong_ratio
+        self.quiet_ratio = quiet_ratio
+        self.spectral_threshold = spectral_threshold
+        self.quiet_start_frames = quiet_start_frames
+        self.hangover_frames = int(round(hangover / self.frame_duration))
+        self.floor_adaptation = floor_adaptation
+        self._window = np.hanning(self.frame_size).astype(np.float32)
+        self.reset()
+
+    def reset(self):
+        self.noise_floor = None
+        self.noise_flatness = None
+        self.noise_spectrum = None
+        self.is_speech = False
+        self._calibration = []
+        self._candidate_frames = 0
+        self._quiet_frames = 0
+        self._hangover = 0
+        self._remainder = np.zeros(0, dtype=np.float32)
+
+    def features(self, frames: np.ndarray):
+        # frames: (n_frames, frame_size) -> energy, zcr, flatness per frame and
+        # the power spectra
+        energy = np.sqrt(np.mean(frames**2, axis=1))
+        signs = np.signbit(frames)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+        power = np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2 + 1e-12
+        flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+        return energy, zcr, flatness, power
+
+    def spectral_distance(self, power: np.ndarray) -> float:
+        # Mean per-bin log likelihood ratio of speech over the noise spectrum
+        # (as in Sohn et al.'s statistical VAD): about 0.6 for noise of any
+        # colour, growing with the bins the frame lifts above it
+        snr = power / self.noise_spectrum
+        return float(np.mean(snr - np.log(snr) - 1))
+
+    def process(self, block: np.ndarray, echo: float = 0.0) -> np.ndarray:
+        # Speech flag for every complete frame; partial frames carry over.
+        # echo: energy speech has to exceed to start while the assistant is
+        # talking (see EchoGate); the noise floor is not tracked meanwhile
+        samples = np.concatenate((self._remainder, np.asarray(block, np.float32).ravel()))
+        n_frames = len(samples) // self.frame_size
+        self._remainder = samples[n_frames * self.frame_size :]
+        if n_frames == 0:
+            return np.zeros(0, dtype=bool)
+
+        frames = samples[: n_frames * self.frame_size].reshape(n_frames, self.frame_size)
+        energy, zcr, flatness, power = self.features(frames)
+
+        flags = np.zeros(n_frames, dtype=bool)
+        for i in range(n_frames):
+            if self.noise_floor is None:
+                self.__calibrate__(energy[i], flatness[i], power[i])
+                continue
+            floor = self.noise_floor
+            if self.is_speech:
+                # Hysteresis: stay in speech down to the lower stop threshold,
+                # then for hangover frames to bridge pauses between words
+                if energy[i] > floor * self.stop_ratio:
+                    self._hangover = self.hangover_frames
+                else:
+                    self._hangover -= 1
+                    self.is_speech = self._hangover > 0
+            else:
+                loud = energy[i] > max(floor * self.start_ratio, self.min_start_energy, echo)
+                # Voiced speech is more tonal (lower flatness) than the noise,
+                # and noise-like hiss has a high zero-crossing rate
+                speech_like = (
+                    flatness[i] < self.noise_flatness * self.flatness_ratio
+                    or zcr[i] < self.max_zcr
+                )
+                # Far above the floor anything counts (plosives, fricatives)
+                strong = loud and energy[i] > floor * self.strong_ratio
+                self._candidate_frames = (
+                    self._candidate_frames + 1 if strong or (loud and speech_like) else 0
+                )
+                # Close to the floor, the spectrum has to depart from the
+                # noise's, for longer
+                quiet = (
+                    energy[i] > max(floor * self.quiet_ratio, self.min_start_energy, echo)
+                    and self.spectral_distance(power[i]) > self.spectral_threshold
+                )
+                self._quiet_frames = self._quiet_frames + 1 if quiet else 0
+                self.is_speech = (
+                    self._candidate_frames >= self.start_frames
+                    or self._quiet_frames >= self.quiet_start_frames
+                )
+                if self.is_speech:
+                    self._hangover = self.hangover_frames
+                elif not echo and not (self._candidate_frames or self._quiet_frames):
+                    # A start that has not been confirmed (yet) is not noise
+                    self.__track_noise__(energy[i], flatness[i], power[i])
+            flags[i] = self.is_speech
+        return flags
+
+    def __calibrate__(self, energy: float, flatness: float, power: np.ndarray):
+        self._calibration.append((energy, flatness, power))
+        if len(self._calibration) >= self.calibration_frames:
+            energies, flatnesses, powers = zip(*self._calibration)
+            # Low percentile: robust to the user talking during calibration
+            self.noise_floor = max(float(np.percentile(energies, 20)), 1e-5)
+            self.noise_flatness = float(np.median(flatnesses))
+            # Per bin, the median over ln 2: the mean of an exponentially
+            # distributed power, robust to the odd loud frame
+            self.noise_spectrum = np.median(np.array(powers), axis=0) / np.log(2)
+            self._calibration = []
+
+    def __track_noise__(self, energy: float, flatness: float, power: np.ndarray):
+        # Floor drops quickly when the room gets quieter, rises slowly with
+        # louder noise
+        a = self.floor_adaptation
+        if energy < self.noise_floor:
+            self.noise_floor = max(float(energy), 1e-5)
+        else:
+            self.noise_floor = (1 - a) * self.noise_floor + a * float(energy)
+        self.noise_flatness = (1 - a) * self.noise_flatness + a * float(flatness)
+        self.noise_spectrum = (1 - a) * self.noise_spectrum + a * power
+
+
+class Endpointer:
+    # Turns VAD frames into utterance events: "start" when speech begins, then
+    # "end" after silence_duration of silence, or "discard" if there was less
+    # than min_speech_duration of speech. With pause_duration, a shorter
+    # silence after enough speech is a "pause" (the utterance may be over),
+    # and speech after it a "resume".
+    def __init__(
+        self,
+        vad: VoiceActivityDetector,
+        silence_duration: float = 1.5,
+        min_speech_duration: float = 0.5,
+        pause_duration: float = None,
+    ):
+        self.vad = vad
+        self.silence_frames = int(round(silence_duration / vad.frame_duration))
+        self.min_speech_frames = int(round(min_speech_duration / vad.frame_duration))
+        self.pause_frames = int(round(pause_duration / vad.frame_duration)) if pause_duration else 0
+        self.reset()
+
+    def reset(self):
+        self.in_utterance = False
+        self.paused = False
+        self.speech_frames = 0
+        self.trailing_silence = 0
+
+    def update(self, block: np.ndarray, echo: float = 0.0):
+        event = None
+        for speech in self.vad.process(block, echo):
+            if speech:
+                if not self.in_utterance:
+                    self.in_utterance = True
+                    event = "start"
+                elif self.paused:
+                    self.paused = False
+                    # A pause and its resume within one block cancel out
+                    event = None if event == "pause" else "resume"
+                self.speech_frames += 1
+                self.trailing_silence = 0
+            elif self.in_utterance:
+                self.trailing_silence += 1
+                if self.trailing_silence >= self.silence_frames:
+                    enough = self.speech_frames >= self.min_speech_frames
+                    self.reset()
+                    return "end" if enough else "discard"
+                if (
+                    self.trailing_silence == self.pause_frames
+                    and self.speech_frames >= self.min_speech_frames
+                ):
+                    self.paused = True
+                    event = "pause"
+        return event
+
+
+class EchoGate:
+    # Keeps the assistant's own voice from triggering the VAD during playback.
+    # The microphone picks up playback at roughly coupling * playback level;
+    # while the assistant talks, speech must be margin times louder than
+    # that. coupling starts high (safe) and is learned from blocks where only
+    # the assistant talks: it rises quickly and decays slowly, so blocks
+    # where the echo has not arrived yet don't pull the threshold down.
+    def __init__(
+        self,
+        margin: float = 2.0,
+        coupling: float = 1.0,
+        rise: float = 0.3,
+        decay: float = 0.05,
+        max_coupling: float = 4.0,
+    ):
+        self.margin = margin
+        self.coupling = coupling
+        self.rise = rise
+        self.decay = decay
+        self.max_coupling = max_coupling
+
+    def threshold(self, playback_level: float) -> float:
+        return self.margin * self.coupling * playback_level
+
+    def observe(self, block: np.ndarray, playback_level: float):
+        # Call only for blocks without user speech
+        if playback_level < 1e-3:
+            return
+        ratio = float(np.sqrt(np.mean(np.square(block)))) / playback_level
+        a = self.rise if ratio > self.coupling else self.decay
+        self.coupling = min(self.coupling + a * (ratio - self.coupling), self.max_coupling)
@@ -0,0 +1,187 @@
+# Offline transcription of whole directories of recordings.
+#   python batch_transcribe.py ./recordings -o transcripts.jsonl --model base
+#   python batch_transcribe.py manifest.txt -o transcripts.jsonl --workers 2
+# Each worker process loads the model once; audio is decoded with ffmpeg in
+# threads of the main process while the workers transcribe. Results are
+# appended to the JSONL output as they finish, and files already in it are
+# skipped on restart. --audio-cache keeps the decoded audio (cache/audio/), so
+# rerunning with another model skips ffmpeg.
+import argparse
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from time import perf_counter
+
+import numpy as np
+import whisper
+
+from My_audio_cache import AudioCache
+from My_device import WhisperRuntime, cpu_threads
+
+MODEL_DIR = "./models"
+MODEL_NAME = "large-v3-turbo"
+SAMPLE_RATE = 16000
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".m4a", ".flac", ".ogg", ".opus", ".webm", ".mp4")
+
+# Set in each worker process by init_worker
+_model = None
+_fp16 = False
+
+
+def init_worker(model_name: str, model_dir: str, device: str, threads: int, quantize: bool):
+    global _model, _fp16
+    runtime = WhisperRuntime(device, quantize, threads)
+    _model = runtime.load(model_name, model_dir, label=f"[Worker {os.getpid()}]")
+    _fp16 = runtime.fp16
+
+
+def transcribe_file(path: str, audio, language: str) -> dict:
+    start = perf_counter()
+    try:
+        result = _model.transcribe(audio, language=language, fp16=_fp16, verbose=None)
+    except Exception as e:
+        return {"path": path, "error": str(e)}
+    return {
+        "path": path,
+        "text": result["text"].strip(),
+        "language": result["language"],
+        "duration": round(len(audio) / SAMPLE_RATE, 3),
+        "seconds": round(perf_counter() - start, 3),
+    }
+
+
+def list_inputs(inputs: list, language: str = None) -> list[tuple]:
+    # (path, language) for every audio file in the given directories and
+    # manifests. A manifest has one path per line, relative to the manifest,
+    # or JSON lines {"path": ..., "language": ...}
+    files = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, names in os.walk(item):
+                for name in sorted(names):
+                    if name.lower().endswith(AUDIO_EXTENSIONS):
+                        files.append((os.path.join(root, name), language))
+        elif item.lower().endswith(AUDIO_EXTENSIONS):
+            files.append((item, language))
+        else:
+            base = os.path.dirname(item)
+            with open(item) as manifest:
+                for line in manifest:
+                    line = line.strip()
+                    if not line or line.startswith("#"):
+                        continue
+                    entry = json.loads(line) if line.startswith("{") else {"path": line}
+                    files.append(
+                        (os.path.join(base, entry["path"]), entry.get("language", language))
+                    )
+    return [(os.path.abspath(path), lang) for path, lang in files]
+
+
+def load_done(output: str) -> set:
+    # Paths transcribed by an earlier run; failed files are retried
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # last line of an interrupted run
+            if "error" not in record:
+                done.add(record["path"])
+    return done
+
+
+def main():
+    cpus = cpu_threads()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("inputs", nargs="+", help="audio files, directories or manifests")
+    parser.add_argument("-o", "--output", default="transcripts.jsonl")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--device", default=None, help="cpu | cuda | mps, default: best available")
+    parser.add_argument(
+        "--no-quantize", dest="quantize", action="store_false", default=None,
+        help="keep fp32 linear layers on CPU",
+    )
+    parser.add_argument("--language", default=None, help="default: detect per file")
+    parser.add_argument("--threads", type=int, default=min(4, cpus), help="torch threads per worker")
+    parser.add_argument("--workers", type=int, default=None, help="default: cpus / threads")
+    parser.add_argument("--decoders", type=int, default=2, help="ffmpeg decoding threads")
+    parser.add_argument("--audio-cache", action="store_true", help="reuse decoded audio across runs")
+    args = parser.parse_args()
+    workers = args.workers or max(1, cpus // args.threads)
+
+    files = list_inputs(args.inputs, args.language)
+    done = load_done(args.output)
+    todo = [(path, lang) for path, lang in files if path not in done]
+    print(f"[Batch] {len(files)} files, {len(files) - len(todo)} already done, {len(todo)} to go")
+    if not todo:
+        return
+    print(f"[Batch] {workers} workers x {args.threads} threads, model {args.model}")
+
+    results = queue.Queue()
+    # Decoded audio waiting for a worker is bounded, so ffmpeg stays just
+    # ahead of inference instead of decoding the whole directory into memory
+    slots = threading.Semaphore(2 * workers)
+    cache = AudioCache.default() if args.audio_cache else None
+    pool = ProcessPoolExecutor(
+        workers,
+        mp_context=get_context("spawn"),
+        initializer=init_worker,
+        initargs=(args.model, args.model_dir, args.device, args.threads, args.quantize),
+    )
+
+    def finished(path: str, future):
+        slots.release()
+        try:
+            results.put(future.result())
+        except Exception as e:
+            results.put({"path": path, "error": f"worker failed: {e}"})
+
+    def decode_and_submit(path: str, language: str):
+        slots.acquire()
+        try:
+            if cache is not None:
+                audio = np.array(cache.load(path, SAMPLE_RATE))  # sent to a worker
+            else:
+                audio = whisper.load_audio(path, SAMPLE_RATE)
+        except Exception as e:
+            slots.release()
+            results.put({"path": path, "error": f"decode failed: {e}"})
+            return
+        future = pool.submit(transcribe_file, path, audio, language)
+        future.add_done_callback(lambda f: finished(path, f))
+
+    start = perf_counter()
+    audio_seconds = 0.0
+    failed = 0
+    with ThreadPoolExecutor(args.decoders) as decoders, open(args.output, "a") as out:
+        for path, language in todo:
+            decoders.submit(decode_and_submit, path, language)
+        for i in range(len(todo)):
+            record = results.get()
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if "error" in record:
+                failed += 1
+                print(f"[Batch] {i + 1}/{len(todo)} {record['path']}: {record['error']}")
+                continue
+            audio_seconds += record["duration"]
+            print(f"[Batch] {i + 1}/{len(todo)} {os.path.basename(record['path'])}: {record['text']}")
+    pool.shutdown()
+
+    elapsed = perf_counter() - start
+    print(
+        f"\n[Batch] {len(todo) - failed} files ({failed} failed) in {elapsed:.1f}s: "
+        f"{len(todo) / elapsed:.2f} files/s, {audio_seconds:.1f}s of audio, "
+        f"RTF {elapsed / max(audio_seconds, 1e-9):.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
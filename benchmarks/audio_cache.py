@@ -0,0 +1,84 @@
+# Cold vs warm loading of audio files through AudioCache, in a scratch cache
+# directory: plain ffmpeg decoding (what model.transcribe(path) pays every
+# time), the first cached load (decode + write), warm loads from a fresh
+# cache instance in this process and in a new process, and the same for the
+# 30 s log-mel window.
+#   python -m benchmarks.audio_cache --audio-dir ./audios --repeats 5
+import argparse
+import glob
+import statistics
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+import numpy as np
+import whisper
+
+from My_audio_cache import AudioCache
+from My_capture import load_audio_file
+
+CHILD = """
+import sys
+from time import perf_counter
+from My_audio_cache import AudioCache
+start = perf_counter()
+cache = AudioCache(sys.argv[1])
+for path in sys.argv[2:]:
+    float(cache.load(path).sum())
+print(perf_counter() - start)
+"""
+
+
+def timed(fcn, repeats: int) -> float:
+    # Median seconds; the result is summed so mapped pages are actually read
+    times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        float(np.asarray(fcn()).sum())
+        times.append(perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--audio-dir", default="./audios")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--n-mels", type=int, default=80)
+    args = parser.parse_args()
+    clips = sorted(glob.glob(f"{args.audio_dir}/*.m4a") + glob.glob(f"{args.audio_dir}/*.wav"))
+
+    rows = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for path in clips:
+            decode = timed(lambda: load_audio_file(path), args.repeats)
+            cold = timed(lambda: AudioCache(cache_dir).load(path), 1)
+            warm = timed(lambda: AudioCache(cache_dir).load(path), args.repeats)
+            mel = timed(
+                lambda: whisper.log_mel_spectrogram(
+                    whisper.pad_or_trim(load_audio_file(path)), args.n_mels
+                ),
+                args.repeats,
+            )
+            mel_cold = timed(lambda: AudioCache(cache_dir).mel(path, args.n_mels), 1)
+            mel_warm = timed(lambda: AudioCache(cache_dir).mel(path, args.n_mels), args.repeats)
+            rows.append((path, decode, cold, warm, mel, mel_cold, mel_warm))
+
+        # Another process, as in a rerun with a different model
+        process = subprocess.run(
+            [sys.executable, "-c", CHILD, cache_dir, *clips], capture_output=True, text=True, check=True
+        )
+        warm_process = float(process.stdout.strip().splitlines()[-1])
+
+    print(f"{'file':<32}{'decode':>9}{'cold':>9}{'warm':>9}{'mel':>9}{'cold':>9}{'warm':>9}  (ms)")
+    for path, *times in rows:
+        print(f"{path.split('/')[-1][:31]:<32}" + "".join(f"{t * 1000:9.1f}" for t in times))
+    decode = sum(row[1] for row in rows)
+    warm = sum(row[3] for row in rows)
+    print(f"\nAll {len(rows)} files: decode {decode * 1000:.1f} ms, warm {warm * 1000:.1f} ms "
+          f"({decode / warm:.0f}x), warm in a new process {warm_process * 1000:.1f} ms "
+          f"including cache startup")
+
+
+if __name__ == "__main__":
+    main()
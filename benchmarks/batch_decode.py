@@ -0,0 +1,87 @@
+# Throughput vs per-segment latency of batched decoding on CPU: a burst of
+# segments queued at once is decoded one by one with model.transcribe (old
+# transcriber thread) and in batches of increasing size with transcribe_batch.
+#   python -m benchmarks.batch_decode --model base --segments 8 --batch 1 2 4 8
+import argparse
+import glob
+import statistics
+from time import perf_counter
+
+import torch
+import whisper
+
+from My_audio_cache import AudioCache
+from My_batch_decode import transcribe_batch
+
+SAMPLE_RATE = 16000
+
+
+def load_segments(audio_dir: str, count: int) -> list:
+    clips = sorted(glob.glob(f"{audio_dir}/*.m4a") + glob.glob(f"{audio_dir}/*.wav"))
+    audios = [AudioCache.default().load(path) for path in clips]
+    return [audios[i % len(audios)] for i in range(count)]
+
+
+def run(decode, segments: list, batch_size: int):
+    # All segments arrive at t=0; each one's latency is when its batch is done
+    latencies = []
+    texts = []
+    start = perf_counter()
+    for i in range(0, len(segments), batch_size):
+        texts += decode(segments[i : i + batch_size])
+        latencies += [perf_counter() - start] * len(segments[i : i + batch_size])
+    return perf_counter() - start, latencies, texts
+
+
+def report(name: str, total: float, latencies: list[float], audio_seconds: float):
+    print(
+        f"{name:<14} {len(latencies) / total:6.2f} seg/s | "
+        f"RTF {total / audio_seconds:5.3f} | "
+        f"latency p50 {statistics.median(latencies) * 1000:8.0f} ms | "
+        f"max {max(latencies) * 1000:8.0f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--model-dir", default="./models")
+    parser.add_argument("--audio-dir", default="./audios")
+    parser.add_argument("--segments", type=int, default=8)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    model = whisper.load_model(args.model, device="cpu", download_root=args.model_dir)
+    segments = load_segments(args.audio_dir, args.segments)
+    audio_seconds = sum(len(s) for s in segments) / SAMPLE_RATE
+    print(
+        f"{len(segments)} segments, {audio_seconds:.1f} s of audio, "
+        f"{torch.get_num_threads()} threads\n"
+    )
+
+    # Warm-up so the first measured run does not pay for lazy initialisation
+    transcribe_batch(model, segments[:1], fp16=False)
+
+    def sequential(batch):
+        return [
+            model.transcribe(a, language="en", fp16=False, verbose=None)["text"].strip()
+            for a in batch
+        ]
+
+    total, latencies, reference = run(sequential, segments, 1)
+    report("transcribe", total, latencies, audio_seconds)
+    for size in args.batch:
+        total, latencies, texts = run(
+            lambda batch: transcribe_batch(model, batch, fp16=False), segments, size
+        )
+        changed = sum(a != b for a, b in zip(texts, reference))
+        report(f"batch={size}", total, latencies, audio_seconds)
+        if changed:
+            print(f"{'':<14} {changed} transcripts differ from transcribe()")
+
+
+if __name__ == "__main__":
+    main()
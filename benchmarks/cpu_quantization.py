@@ -0,0 +1,104 @@
+# Latency and accuracy of the int8 dynamically quantized CPU path against the
+# same model unquantized in fp32. Accuracy is the word error rate of the
+# quantized transcripts, taking the fp32 transcripts as the reference.
+#   python -m benchmarks.cpu_quantization --model base --repeats 2
+import argparse
+import copy
+import glob
+import io
+import statistics
+from time import perf_counter
+
+import torch
+import whisper
+from whisper.normalizers import EnglishTextNormalizer
+
+from My_audio_cache import AudioCache
+from My_device import cpu_threads, quantize_linear
+
+SAMPLE_RATE = 16000
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    normalize = EnglishTextNormalizer()
+    ref = normalize(reference).split()
+    hyp = normalize(hypothesis).split()
+    # Levenshtein distance over words
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        previous, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (r != h))
+    return row[-1] / max(len(ref), 1)
+
+
+def model_megabytes(model) -> float:
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 1e6
+
+
+def run(model, audios: list, language: str, repeats: int):
+    latencies, texts = [], []
+    for audio in audios:
+        times = []
+        for _ in range(repeats):
+            start = perf_counter()
+            result = model.transcribe(audio, language=language, fp16=False, verbose=None)
+            times.append(perf_counter() - start)
+        latencies.append(min(times))
+        texts.append(result["text"].strip())
+    return latencies, texts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--model-dir", default="./models")
+    parser.add_argument("--audio-dir", default="./audios")
+    parser.add_argument("--language", default=None)
+    parser.add_argument("--repeats", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=cpu_threads())
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    clips = sorted(glob.glob(f"{args.audio_dir}/*.m4a") + glob.glob(f"{args.audio_dir}/*.wav"))
+    audios = [AudioCache.default().load(path) for path in clips]
+    audio_seconds = sum(len(a) for a in audios) / SAMPLE_RATE
+
+    start = perf_counter()
+    fp32 = whisper.load_model(args.model, device="cpu", download_root=args.model_dir)
+    load_fp32 = perf_counter() - start
+    start = perf_counter()
+    int8 = quantize_linear(copy.deepcopy(fp32))
+    quantize_time = perf_counter() - start
+    print(
+        f"{args.model} on CPU, {args.threads} threads, {len(clips)} clips, "
+        f"{audio_seconds:.1f} s of audio\n"
+    )
+
+    # Warm-up
+    for model in (fp32, int8):
+        model.transcribe(audios[0][:SAMPLE_RATE], fp16=False, verbose=None)
+
+    reference_latencies, references = run(fp32, audios, args.language, args.repeats)
+    latencies, texts = run(int8, audios, args.language, args.repeats)
+
+    for name, model, lat, setup in (
+        ("fp32", fp32, reference_latencies, f"load {load_fp32:.1f}s"),
+        ("int8", int8, latencies, f"+{quantize_time:.1f}s quantize"),
+    ):
+        print(
+            f"{name:<5} {model_megabytes(model):7.0f} MB | {setup:<16} | "
+            f"p50 {statistics.median(lat) * 1000:7.0f} ms | "
+            f"RTF {sum(lat) / audio_seconds:5.3f}"
+        )
+    speedup = sum(reference_latencies) / sum(latencies)
+    wers = [word_error_rate(r, t) for r, t in zip(references, texts)]
+    print(f"\nint8 speedup {speedup:.2f}x, WER vs fp32 {statistics.fmean(wers) * 100:.1f}%\n")
+    for path, reference, text, wer in zip(clips, references, texts, wers):
+        print(f"{path.split('/')[-1]} (WER {wer * 100:.1f}%)\n  fp32: {reference}\n  int8: {text}")
+
+
+if __name__ == "__main__":
+    main()
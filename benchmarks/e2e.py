@@ -0,0 +1,289 @@
+# Hermetic end-to-end latency/throughput runs (see benchmarks/harness.py for
+# the stand-ins). Runs on a GPU-less Linux box with no audio devices; only the
+# Whisper checkpoint has to be available (--stt-model name or .pt path).
+#   python -m benchmarks.e2e llm --turns 20 --tokens-per-sec 40
+#   python -m benchmarks.e2e assistant --stt-model tiny --repeats 3
+#   python -m benchmarks.e2e live --stt-model tiny --speed 2
+#   python -m benchmarks.e2e barge_in --stt-model tiny --echo-coupling 0.3 --no-echo-gate
+#   python -m benchmarks.e2e speculative --stt-model tiny --continue-gap 1.0
+import argparse
+import asyncio
+import builtins
+import glob
+import time
+from time import perf_counter
+
+import numpy as np
+
+import My_tracing as tracing
+from My_capture import ReplayInputStream, load_audio_file
+from My_pipeline import Pipeline
+from My_tracing import Tracer, format_summary, percentile
+from benchmarks.harness import hermetic, install_fake_voice, make_llm, replay_with_echo
+
+SAMPLE_RATE = 16000
+PROMPTS = [
+    "What is the capital of Canada?",
+    "Tell me a fun fact about octopuses.",
+    "How do I boil an egg?",
+    "Give me one tip for better sleep.",
+]
+
+
+def report(title: str, tracer: Tracer, elapsed: float):
+    print(f"\n== {title}: {len(tracer.turns)} turns in {elapsed:.1f}s "
+          f"({len(tracer.turns) / elapsed:.2f} turns/s)")
+    print(format_summary(tracer.summary()))
+
+
+def bench_llm(args):
+    with hermetic(args.tokens_per_sec, args.load_delay) as mock:
+        llm = make_llm(mock)
+        llm.warm()
+        tracer = Tracer(args.trace_out)
+        start = perf_counter()
+        for i in range(args.turns):
+            turn = tracer.start_turn(scenario="llm")
+            tracing.mark("transcribed")
+            llm.chat(PROMPTS[i % len(PROMPTS)], print_output=False)
+            tracer.end_turn(turn)
+        report("MyLlm.chat", tracer, perf_counter() - start)
+        tokens = sum(turn.info.get("eval_count") or 0 for turn in tracer.turns)
+        print(f"{tokens / (perf_counter() - start):.1f} generated tokens/s overall")
+
+
+def bench_assistant(args, clips):
+    from My_transcriber import MyTranscriber
+    from My_tts import MyTTS
+
+    with hermetic(args.tokens_per_sec, args.load_delay, args.tts_rtf, args.realtime_sink) as mock:
+        install_fake_voice(MyTTS.__VOICES__["joe-medium"], args.tts_rtf)
+        transcriber = MyTranscriber(model_name=args.stt_model, device=args.device)
+        transcriber.MODEL_DIR = args.model_dir
+        transcriber.init_model()
+        transcriber.warmup()
+        llm = make_llm(mock)
+        llm.warm()
+        tts = MyTTS("joe-medium", use_cache=False)
+        pipeline = Pipeline(transcriber, llm, tts, Tracer(args.trace_out))
+
+        start = perf_counter()
+        for _ in range(args.repeats):
+            for clip in clips:
+                transcriber.capture.stream_factory = ReplayInputStream.factory(
+                    clip, speed=args.speed
+                )
+                asyncio.run(pipeline.converse())
+        report("Pipeline.converse", pipeline.tracer, perf_counter() - start)
+        print(f"playback: {tts.player.stats()}")
+
+
+def speech_onset(audio: np.ndarray, frame: int = 320) -> float:
+    # Seconds into audio of the first 20 ms frame within 20 dB of the loudest
+    frames = audio[: len(audio) // frame * frame].reshape(-1, frame)
+    energy = np.sqrt(np.mean(frames**2, axis=1))
+    return int(np.argmax(energy >= energy.max() * 0.1)) * frame / SAMPLE_RATE
+
+
+def bench_barge_in(args, clips):
+    # Each clip is said once to start a turn, then again --barge-in-after
+    # seconds later, over the reply. The reply leaks back into the microphone
+    # (--echo-coupling), which must not count as the user talking.
+    from My_transcriber import MyTranscriber
+    from My_tts import MyTTS
+
+    with hermetic(args.tokens_per_sec, args.load_delay, args.tts_rtf, args.realtime_sink) as mock:
+        install_fake_voice(MyTTS.__VOICES__["joe-medium"], args.tts_rtf)
+        transcriber = MyTranscriber(model_name=args.stt_model, device=args.device)
+        transcriber.MODEL_DIR = args.model_dir
+        transcriber.init_model()
+        transcriber.warmup()
+        if args.no_echo_gate:
+            transcriber.echo_gate = None
+        llm = make_llm(mock)
+        llm.warm()
+        tts = MyTTS("joe-medium", use_cache=False)
+        pipeline = Pipeline(transcriber, llm, tts, Tracer(args.trace_out), full_duplex=True)
+
+        detection, false_barge_ins, missed = [], 0, 0
+        for _ in range(args.repeats):
+            for clip in clips:
+                audio = load_audio_file(clip)
+                factory = replay_with_echo(
+                    [clip, clip], tts, args.echo_coupling,
+                    lead_silence=1.0, gap=args.barge_in_after, speed=1,
+                )
+                transcriber.capture.stream_factory = factory
+                turns = len(pipeline.tracer.turns)
+                asyncio.run(pipeline.converse())
+
+                stream = factory.streams[0]
+                onset = stream.started_at + 1.0 + len(audio) / SAMPLE_RATE
+                onset += args.barge_in_after + speech_onset(audio)
+                barge_ins = [
+                    turn.started + turn.marks["barge_in"]
+                    for turn in pipeline.tracer.turns[turns:]
+                    if "barge_in" in turn.marks
+                ]
+                false_barge_ins += sum(t < onset for t in barge_ins)
+                late = [t - onset for t in barge_ins if t >= onset]
+                if late:
+                    detection.append(late[0] * 1000)
+                else:
+                    missed += 1
+
+    summary = pipeline.tracer.summary()
+    print(f"\n== Barge-in: {len(detection)} detected, {missed} missed, "
+          f"{false_barge_ins} false (echo coupling {args.echo_coupling}, "
+          f"echo gate {'off' if args.no_echo_gate else 'on'})")
+    if detection:
+        print(f"speech onset -> barge-in: p50 {percentile(detection, 50):.0f} ms, "
+              f"p95 {percentile(detection, 95):.0f} ms")
+    if "interruption" in summary:
+        print(f"barge-in -> silence at the speaker: p50 {summary['interruption']['p50']:.1f} ms, "
+              f"p95 {summary['interruption']['p95']:.1f} ms")
+    print(format_summary(summary))
+
+
+def bench_speculative(args, clips):
+    # The same turns with and without speculative replies. Each clip is said
+    # once on its own (the pause is the end of the utterance) and once
+    # followed, --continue-gap seconds later, by another clip in the same
+    # utterance (the user goes on after a pause: the speculation is wasted).
+    from My_transcriber import MyTranscriber
+    from My_tts import MyTTS
+
+    utterances = [[clip] for clip in clips] + [[clip, clip] for clip in clips]
+    with hermetic(args.tokens_per_sec, args.load_delay, args.tts_rtf, args.realtime_sink) as mock:
+        install_fake_voice(MyTTS.__VOICES__["joe-medium"], args.tts_rtf)
+        transcriber = MyTranscriber(model_name=args.stt_model, device=args.device)
+        transcriber.MODEL_DIR = args.model_dir
+        transcriber.init_model()
+        transcriber.warmup()
+        llm = make_llm(mock)
+        llm.warm()
+        tts = MyTTS("joe-medium", use_cache=False)
+
+        responses = {}
+        for speculative in (False, True):
+            pipeline = Pipeline(
+                transcriber, llm, tts, Tracer(args.trace_out), speculative=speculative
+            )
+            start = perf_counter()
+            for _ in range(args.repeats):
+                for paths in utterances:
+                    transcriber.capture.stream_factory = ReplayInputStream.factory(
+                        paths, gap=args.continue_gap, speed=args.speed
+                    )
+                    asyncio.run(pipeline.converse())
+                    llm.clearChat()
+            responses[speculative] = [
+                turn.spans()["response"] for turn in pipeline.tracer.turns
+                if "response" in turn.spans()
+            ]
+            title = "speculative" if speculative else "baseline"
+            report(f"Pipeline.converse, {title}", pipeline.tracer, perf_counter() - start)
+
+    stats = pipeline.speculation_summary()
+    print(f"\n== Speculative replies (pause {transcriber.PAUSE_DURATION * 1000:.0f} ms, "
+          f"continue gap {args.continue_gap:.1f} s)")
+    for speculative, title in ((False, "baseline"), (True, "speculative")):
+        values = responses[speculative]
+        if values:
+            print(f"end of speech -> first audio, {title:<12}: "
+                  f"p50 {percentile(values, 50):.0f} ms, p95 {percentile(values, 95):.0f} ms "
+                  f"({len(values)} turns)")
+    print(f"{stats['started']} speculative requests: {stats['committed']} committed, "
+          f"{stats['abandoned']} abandoned (waste rate {stats['waste_rate'] * 100:.0f}%, "
+          f"{stats['wasted_llm_s']:.1f} s of generation, "
+          f"{stats['wasted_tokens']} tokens thrown away)")
+    if stats["saved_ms_p50"] is not None:
+        print(f"request started ahead of end of speech: p50 {stats['saved_ms_p50']:.0f} ms, "
+              f"p95 {stats['saved_ms_p95']:.0f} ms")
+
+
+def bench_live(args, clips):
+    import live_transcribe
+
+    live_transcribe.MODEL_NAME = args.stt_model
+    live_transcribe.MODEL_DIR = args.model_dir
+    live_transcribe.DEVICE = args.device
+    streams = []
+
+    def factory(**kwargs):
+        stream = ReplayInputStream(clips * args.repeats, speed=args.speed, **kwargs)
+        streams.append(stream)
+        return stream
+
+    answers = iter(["start"])
+
+    def scripted_input(prompt=""):
+        # "start" once, then "stop" when the replay has finished
+        for answer in answers:
+            return answer
+        while not streams:
+            time.sleep(0.05)
+        streams[0].finished.wait()
+        return "stop"
+
+    real_input = builtins.input
+    builtins.input = scripted_input
+    try:
+        start = perf_counter()
+        latencies = live_transcribe.main(factory)
+        elapsed = perf_counter() - start
+    finally:
+        builtins.input = real_input
+
+    audio_seconds = len(streams[0].audio) / SAMPLE_RATE
+    print(f"\n== live_transcribe.main: {len(latencies)} segments, "
+          f"{audio_seconds:.1f}s of audio replayed at {args.speed or 'max'}x speed in {elapsed:.1f}s")
+    if latencies:
+        print(f"end of speech -> transcript: p50 {percentile(latencies, 50) * 1000:.0f} ms, "
+              f"p95 {percentile(latencies, 95) * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "scenario", choices=["llm", "assistant", "live", "barge_in", "speculative", "all"]
+    )
+    parser.add_argument("--audio-dir", default="./audios")
+    parser.add_argument("--stt-model", default="tiny")
+    parser.add_argument("--model-dir", default="./models")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--turns", type=int, default=10, help="llm scenario")
+    parser.add_argument("--repeats", type=int, default=1, help="passes over the clips")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed, 0 = max")
+    parser.add_argument("--tokens-per-sec", type=float, default=40)
+    parser.add_argument("--load-delay", type=float, default=2.0)
+    parser.add_argument("--tts-rtf", type=float, default=0.05)
+    parser.add_argument("--no-realtime-sink", dest="realtime_sink", action="store_false")
+    parser.add_argument("--trace-out", default=None, help="append turns to this JSONL")
+    parser.add_argument("--barge-in-after", type=float, default=6.0,
+                        help="barge_in: seconds from the end of a clip to its repeat")
+    parser.add_argument("--echo-coupling", type=float, default=0.1,
+                        help="barge_in: share of the playback leaking into the mic")
+    parser.add_argument("--no-echo-gate", action="store_true")
+    parser.add_argument("--continue-gap", type=float, default=1.0,
+                        help="speculative: pause before the user goes on")
+    args = parser.parse_args()
+
+    clips = sorted(glob.glob(f"{args.audio_dir}/*.m4a") + glob.glob(f"{args.audio_dir}/*.wav"))
+    for clip in clips:
+        load_audio_file(clip)  # fail early if ffmpeg is missing
+
+    if args.scenario in ("llm", "all"):
+        bench_llm(args)
+    if args.scenario in ("assistant", "all"):
+        bench_assistant(args, clips)
+    if args.scenario in ("live", "all"):
+        bench_live(args, clips)
+    if args.scenario in ("barge_in", "all"):
+        bench_barge_in(args, clips)
+    if args.scenario in ("speculative", "all"):
+        bench_speculative(args, clips)
+
+
+if __name__ == "__main__":
+    main()
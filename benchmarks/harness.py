@@ -0,0 +1,158 @@
+# Local stand-ins for everything the assistant talks to, so end-to-end runs
+# need no microphone, speakers, Ollama, piper binary or network:
+#   - ReplayInputStream (My_capture) replays audio fixtures as the microphone
+#   - MockOllama serves streaming chat at a configurable token rate
+#   - FakePiperVoice produces a voice-like buzz at a set real-time factor,
+#     inside the resident TTS engine
+#   - a fake `piper` executable on PATH (the non-resident TTS path)
+#   - NullOutputStream (My_player) as the audio output: a null sink that
+#     consumes audio in real time (or instantly)
+#   - replay_with_echo adds what is being played back to the replayed
+#     microphone, like speakers leaking into the mic
+#   - StaticSearchBackend (My_search) instead of DDGS
+import os
+import stat
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from My_capture import ReplayInputStream
+from My_player import AudioPlayer, NullOutputStream
+from My_search import StaticSearchBackend
+from My_tts_engine import TTSEngine
+from benchmarks.mock_ollama import MockOllama
+
+FAKE_SAMPLE_RATE = 22050
+CHARS_PER_SECOND = 14  # rough speaking rate of a Piper voice
+
+FAKE_PIPER = """#!{python}
+# Fake piper --output-raw: near-silent PCM for the text on stdin (not all
+# zeros, so a non-realtime NullOutputStream does not pace it as idle)
+import sys, time
+text = sys.stdin.read()
+seconds = len(text) / {cps}
+time.sleep(seconds * {rtf})
+sys.stdout.buffer.write(b"\\x01\\x00" * int(seconds * {rate}))
+"""
+
+
+class FakePiperVoice:
+    # Quacks like an old-API PiperVoice (synthesize_stream_raw), so the real
+    # TTSEngine worker, futures and caching are exercised. The audio is a
+    # 140 Hz harmonic buzz with a 4 Hz syllable envelope: voiced enough to
+    # trip the VAD when it leaks back into the microphone.
+    def __init__(self, rtf: float = 0.05, sample_rate: int = FAKE_SAMPLE_RATE):
+        self.rtf = rtf
+        self.config = type("Config", (), {"sample_rate": sample_rate})()
+        self.calls = 0
+
+    def synthesize_stream_raw(self, text: str, length_scale: float = 1, sentence_silence: float = 0):
+        self.calls += 1
+        seconds = len(text) / CHARS_PER_SECOND * length_scale
+        time.sleep(seconds * self.rtf)
+        t = np.arange(int(seconds * self.config.sample_rate)) / self.config.sample_rate
+        envelope = 0.5 * (1 - np.cos(2 * np.pi * 4 * t))
+        buzz = sum(np.sin(2 * np.pi * 140 * k * t) / k for k in range(1, 6))
+        yield (0.15 * envelope * buzz * 32767).astype(np.int16).tobytes()
+
+
+def install_fake_voice(voice_path: str, rtf: float = 0.05) -> TTSEngine:
+    # Every MyTTS for voice_path now shares an engine backed by FakePiperVoice
+    engine = TTSEngine(voice_path)
+    engine.voice = FakePiperVoice(rtf)
+    engine.sample_rate = engine.voice.config.sample_rate
+    TTSEngine.__ENGINES__[voice_path] = engine
+    return engine
+
+
+def replay_with_echo(paths, tts, coupling: float = 0.3, delay: float = 0.05, **replay_kwargs):
+    # Stream factory replaying paths as the microphone, plus whatever tts is
+    # playing, delayed and scaled by the speaker-to-mic coupling. Created
+    # streams are kept in factory.streams.
+    def echo(frames: int, rate: int) -> np.ndarray:
+        if not coupling:
+            return np.zeros(frames, dtype=np.float32)
+        # What the player output over this block's duration, delay ago,
+        # resampled to the microphone's rate
+        player = tts.player
+        played = player.recent(frames / rate + delay)
+        n = int(frames / rate * player.sample_rate)
+        if len(played) < n:
+            played = np.concatenate([np.zeros(n - len(played), np.int16), played])
+        idx = np.minimum((np.arange(frames) * player.sample_rate / rate).astype(int), n - 1)
+        return (played[:n][idx] / 32768 * coupling).astype(np.float32)
+
+    def factory(**kwargs):
+        callback = kwargs.pop("callback")
+        rate = kwargs.get("samplerate", 16000)
+
+        def with_echo(indata, frames, time_info, status):
+            callback(indata + echo(frames, rate).reshape(-1, 1), frames, time_info, status)
+
+        stream = ReplayInputStream(paths, callback=with_echo, **replay_kwargs, **kwargs)
+        factory.streams.append(stream)
+        return stream
+
+    factory.streams = []
+    return factory
+
+
+@contextmanager
+def fake_binaries(rtf: float = 0.05):
+    # Puts a fake piper first on PATH for the duration
+    with tempfile.TemporaryDirectory() as bin_dir:
+        for name, template in (("piper", FAKE_PIPER),):
+            path = os.path.join(bin_dir, name)
+            with open(path, "w") as f:
+                f.write(
+                    template.format(
+                        python=sys.executable,
+                        cps=CHARS_PER_SECOND,
+                        rtf=rtf,
+                        rate=FAKE_SAMPLE_RATE,
+                    )
+                )
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        old_path = os.environ.get("PATH", "")
+        os.environ["PATH"] = bin_dir + os.pathsep + old_path
+        try:
+            yield bin_dir
+        finally:
+            os.environ["PATH"] = old_path
+
+
+@contextmanager
+def null_sink(realtime: bool = True):
+    # Every AudioPlayer opened meanwhile plays into a NullOutputStream
+    previous = AudioPlayer.STREAM_FACTORY
+    AudioPlayer.STREAM_FACTORY = NullOutputStream.factory(realtime=realtime)
+    try:
+        yield
+    finally:
+        AudioPlayer.close_all()
+        AudioPlayer.STREAM_FACTORY = previous
+
+
+@contextmanager
+def hermetic(
+    tokens_per_sec: float = 40,
+    load_delay: float = 2.0,
+    tts_rtf: float = 0.05,
+    realtime_sink: bool = True,
+):
+    # Mock Ollama, a fake piper and a null audio sink; yields the mock server
+    with MockOllama(load_delay, tokens_per_sec) as mock, fake_binaries(tts_rtf), null_sink(
+        realtime_sink
+    ):
+        yield mock
+
+
+def make_llm(mock: MockOllama, **kwargs):
+    from My_LLM import MyLlm
+
+    llm = MyLlm(search_backend=StaticSearchBackend(), **kwargs)
+    llm.SERVER_URL = mock.url
+    return llm
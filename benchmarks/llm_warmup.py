@@ -0,0 +1,64 @@
+# Cold vs warm first-token latency, and connection reuse, for MyLlm against the
+# local mock Ollama server.
+#   python -m benchmarks.llm_warmup --load-delay 2 --turns 10
+import argparse
+import statistics
+from time import perf_counter
+
+import requests
+
+from benchmarks.mock_ollama import MockOllama
+from My_LLM import MyLlm
+
+
+def first_token_latency(llm: MyLlm, prompt: str) -> float:
+    start = perf_counter()
+    latency = None
+    for _ in llm.chat_stream(prompt):
+        if latency is None:
+            latency = perf_counter() - start
+    return latency
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--load-delay", type=float, default=2.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--turns", type=int, default=10)
+    args = parser.parse_args()
+
+    with MockOllama(args.load_delay, args.tokens_per_sec) as mock:
+        llm = MyLlm()
+        llm.SERVER_URL = mock.url
+        cold = first_token_latency(llm, "Where is Toronto?")
+        print(f"cold first token        {cold * 1000:8.1f} ms")
+
+        mock.unload()
+        llm = MyLlm()
+        llm.SERVER_URL = mock.url
+        warm_time = llm.warm()  # runs during Whisper load in the assistant
+        warm = first_token_latency(llm, "Where is Toronto?")
+        print(f"warm() call             {warm_time * 1000:8.1f} ms (overlaps Whisper load)")
+        print(f"warm first token        {warm * 1000:8.1f} ms")
+
+        before = mock.connections
+        latencies = [first_token_latency(llm, "And Ottawa?") for _ in range(args.turns)]
+        print(
+            f"pooled session          {statistics.median(latencies) * 1000:8.1f} ms p50, "
+            f"{mock.connections - before} new connections over {args.turns} turns"
+        )
+
+        before = mock.connections
+        for _ in range(args.turns):
+            requests.post(
+                mock.url,
+                json={"model": llm.Model, "messages": [{"role": "user", "content": "hi"}]},
+            ).content
+        print(
+            f"bare requests.post      {mock.connections - before} new connections "
+            f"over {args.turns} turns"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# Local stand-in for the Ollama /api/chat endpoint: simulates model load time,
+# keep_alive residency and a fixed token rate, and counts TCP connections.
+#   python -m benchmarks.mock_ollama --port 11434 --tokens-per-sec 40
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "Toronto is the capital of Ontario and the largest city in Canada. "
+    "It sits on the northwestern shore of Lake Ontario. "
+    "Is there anything else you would like to know?"
+)
+
+
+def parse_keep_alive(value) -> float:
+    # Ollama accepts durations like "5m", "30s", "1h", plain seconds, or negative
+    # values meaning forever
+    if value is None:
+        return 300.0
+    if isinstance(value, (int, float)):
+        return float("inf") if value < 0 else float(value)
+    value = str(value).strip()
+    if value.startswith("-"):
+        return float("inf")
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    for suffix in ("ms", "s", "m", "h"):
+        if value.endswith(suffix):
+            return float(value[: -len(suffix)]) * units[suffix]
+    return float(value)
+
+
+class MockOllama:
+    def __init__(
+        self,
+        load_delay: float = 2.0,
+        tokens_per_sec: float = 40.0,
+        prompt_tokens_per_sec: float = 2000.0,
+        reply: str = DEFAULT_REPLY,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.load_delay = load_delay
+        self.tokens_per_sec = tokens_per_sec
+        self.prompt_tokens_per_sec = prompt_tokens_per_sec
+        self.reply = reply
+        self.connections = 0
+        self.requests = 0
+        self._loaded_until = 0.0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self.__handler__())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/chat"
+
+    def start(self) -> "MockOllama":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def unload(self):
+        self._loaded_until = 0.0
+
+    def _ensure_loaded(self, keep_alive) -> float:
+        # Returns the load time paid by this request
+        with self._load_lock:
+            now = time.monotonic()
+            load = 0.0
+            if now >= self._loaded_until:
+                time.sleep(self.load_delay)
+                load = self.load_delay
+            self._loaded_until = time.monotonic() + parse_keep_alive(keep_alive)
+            return load
+
+    def __handler__(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with mock._lock:
+                    mock.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with mock._lock:
+                    mock.requests += 1
+                messages = body.get("messages") or []
+                load = mock._ensure_loaded(body.get("keep_alive"))
+
+                if not messages:
+                    self._send_json(
+                        {"model": body.get("model"), "done": True, "done_reason": "load"}
+                    )
+                    return
+
+                prompt_tokens = sum(len(m["content"]) // 4 + 4 for m in messages)
+                prompt_eval = prompt_tokens / mock.prompt_tokens_per_sec
+                time.sleep(prompt_eval)
+                tokens = [word + " " for word in mock.reply.split(" ")]
+                final = {
+                    "model": body.get("model"),
+                    "done": True,
+                    "load_duration": int(load * 1e9),
+                    "prompt_eval_count": prompt_tokens,
+                    "prompt_eval_duration": int(prompt_eval * 1e9),
+                    "eval_count": len(tokens),
+                    "eval_duration": int(len(tokens) / mock.tokens_per_sec * 1e9),
+                }
+
+                if body.get("stream", True) is False:
+                    time.sleep(len(tokens) / mock.tokens_per_sec)
+                    final["message"] = {"role": "assistant", "content": mock.reply}
+                    self._send_json(final)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for token in tokens:
+                        time.sleep(1 / mock.tokens_per_sec)
+                        self._send_chunk(
+                            {"message": {"role": "assistant", "content": token}, "done": False}
+                        )
+                    self._send_chunk(final)
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True  # client cancelled
+
+            def _send_json(self, payload: dict):
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_chunk(self, payload: dict):
+                data = json.dumps(payload).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--load-delay", type=float, default=2.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0)
+    args = parser.parse_args()
+
+    mock = MockOllama(args.load_delay, args.tokens_per_sec, port=args.port).start()
+    print(f"[Mock Ollama] Serving {mock.url}")
+    try:
+        mock._thread.join()
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+# Accuracy and speed of every model size x device x precision x beam size,
+# on reference clips with ground-truth transcripts: WER/CER, real-time
+# factor, peak RSS and load time. Each configuration runs in a fresh process,
+# so load time and peak RSS are its own (nothing already loaded or cached in
+# memory). Results are one row per configuration in a CSV or JSONL table;
+# --compare diffs it against an earlier run and exits 1 on regressions.
+#
+# Ground truth: a manifest of {"audio": path, "text": ..., "language": ...}
+# lines (--references), or a transcript next to each clip (audios/X.txt for
+# audios/X.m4a). Clips without one only count towards the timings, and a
+# run without any ground truth is refused unless --timings-only is given.
+#   python -m benchmarks.model_matrix --models tiny base small --precisions fp32 int8 \
+#       --beam-sizes 1 5 -o results/matrix.csv --compare results/previous.csv
+#   python -m benchmarks.model_matrix --compare results/previous.csv results/matrix.csv
+import argparse
+import csv
+import glob
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+from time import perf_counter
+
+SAMPLE_RATE = 16000
+KEY = ("model", "device", "precision", "beam_size")
+COLUMNS = KEY + (
+    "threads", "clips", "audio_s", "load_s", "rtf", "wer", "cer", "ref_words", "ref_chars",
+    "peak_rss_mb", "gpu_peak_mb", "torch", "whisper",
+)
+# Languages written without spaces between words: CER only
+NO_SPACES = {"zh", "ja", "th", "lo", "my", "yue"}
+
+
+def edit_distance(reference: list, hypothesis: list) -> int:
+    row = list(range(len(hypothesis) + 1))
+    for i, r in enumerate(reference, 1):
+        previous, row[0] = row[0], i
+        for j, h in enumerate(hypothesis, 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (r != h))
+    return row[-1]
+
+
+def normalizer(language: str):
+    from whisper.normalizers import BasicTextNormalizer, EnglishTextNormalizer
+
+    if language == "en":
+        return EnglishTextNormalizer()
+    return BasicTextNormalizer()
+
+
+def references(args) -> list:
+    # [(audio path, transcript or None, language or None)]
+    if args.references:
+        base = os.path.dirname(args.references)
+        with open(args.references, encoding="utf-8") as f:
+            items = [json.loads(line) for line in f if line.strip()]
+        return [
+            (os.path.join(base, item["audio"]), item.get("text"), item.get("language", args.language))
+            for item in items
+        ]
+    clips = []
+    for path in sorted(glob.glob(f"{args.audio_dir}/*.m4a") + glob.glob(f"{args.audio_dir}/*.wav")):
+        text_path = os.path.splitext(path)[0] + ".txt"
+        text = None
+        if os.path.exists(text_path):
+            with open(text_path, encoding="utf-8") as f:
+                text = f.read().strip()
+        clips.append((path, text, args.language))
+    return clips
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3  # bytes vs KiB
+
+
+def measure(config: dict) -> dict:
+    # One configuration, in the worker process
+    import torch
+    import whisper
+
+    from My_audio_cache import AudioCache
+    from My_device import WhisperRuntime
+
+    clips = config["clips"]
+    audios = [AudioCache.default().load(path) for path, _, _ in clips]
+
+    start = perf_counter()
+    runtime = WhisperRuntime(
+        config["device"], quantize=config["precision"] == "int8", threads=config["threads"]
+    )
+    runtime.fp16 = config["precision"] == "fp16"
+    model = runtime.load(config["model"], config["model_dir"], label="[Matrix]")
+    load_s = perf_counter() - start
+
+    beam_size = config["beam_size"] if config["beam_size"] > 1 else None
+    options = dict(fp16=runtime.fp16, beam_size=beam_size, verbose=None)
+    model.transcribe(audios[0][:SAMPLE_RATE], **options)  # warm-up
+
+    seconds = 0.0
+    word_edits = ref_words = char_edits = ref_chars = 0
+    for (_, text, language), audio in zip(clips, audios):
+        times = []
+        for _ in range(config["repeats"]):
+            start = perf_counter()
+            result = model.transcribe(audio, language=language, **options)
+            times.append(perf_counter() - start)
+        seconds += min(times)
+        if text is None:
+            continue
+        normalize = normalizer(language or result["language"])
+        reference, hypothesis = normalize(text), normalize(result["text"])
+        if (language or result["language"]) not in NO_SPACES:
+            word_edits += edit_distance(reference.split(), hypothesis.split())
+            ref_words += len(reference.split())
+        reference, hypothesis = reference.replace(" ", ""), hypothesis.replace(" ", "")
+        char_edits += edit_distance(list(reference), list(hypothesis))
+        ref_chars += len(reference)
+
+    audio_s = sum(len(audio) for audio in audios) / SAMPLE_RATE
+    gpu_peak = torch.cuda.max_memory_allocated() / 1e6 if runtime.device == "cuda" else None
+    return {
+        "model": config["model"],
+        "device": config["device"],
+        "precision": config["precision"],
+        "beam_size": config["beam_size"],
+        "threads": runtime.threads if runtime.device == "cpu" else None,
+        "clips": len(clips),
+        "audio_s": round(audio_s, 2),
+        "load_s": round(load_s, 3),
+        "rtf": round(seconds / audio_s, 4),
+        # Corpus-level: all edits over all reference words/characters
+        "wer": round(word_edits / ref_words, 4) if ref_words else None,
+        "cer": round(char_edits / ref_chars, 4) if ref_chars else None,
+        "ref_words": ref_words,
+        "ref_chars": ref_chars,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "gpu_peak_mb": round(gpu_peak, 1) if gpu_peak is not None else None,
+        "torch": torch.__version__,
+        "whisper": whisper.__version__,
+    }
+
+
+def configurations(args) -> list:
+    import torch
+
+    available = {
+        "cpu": True,
+        "cuda": torch.cuda.is_available(),
+        "mps": torch.backends.mps.is_available(),
+    }
+    configs = []
+    for device in args.devices:
+        if not available.get(device):
+            print(f"[Matrix] Skipping {device}: not available")
+            continue
+        for precision in args.precisions:
+            # fp16 is GPU only; dynamic int8 quantization is CPU only
+            if (precision == "fp16" and device == "cpu") or (precision == "int8" and device != "cpu"):
+                print(f"[Matrix] Skipping {precision} on {device}: not supported")
+                continue
+            for model in args.models:
+                for beam_size in args.beam_sizes:
+                    configs.append(
+                        {"model": model, "device": device, "precision": precision,
+                         "beam_size": beam_size}
+                    )
+    return configs
+
+
+def run_worker(config: dict) -> dict:
+    process = subprocess.run(
+        [sys.executable, "-m", "benchmarks.model_matrix", "--worker", json.dumps(config)],
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode:
+        error = process.stderr.strip().splitlines()
+        print(f"[Matrix] {config['model']} {config['device']} {config['precision']} failed: "
+              f"{error[-1] if error else process.returncode}")
+        return None
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def write_table(path: str, rows: list):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if path.endswith(".jsonl"):
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+        else:
+            writer = csv.DictWriter(f, COLUMNS)
+            writer.writeheader()
+            writer.writerows({k: "" if v is None else v for k, v in row.items()} for row in rows)
+
+
+def read_table(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        for name, value in row.items():
+            if value == "":
+                row[name] = None
+            elif name not in ("model", "device", "precision", "torch", "whisper"):
+                row[name] = float(value)
+    return rows
+
+
+def compare(old_rows: list, new_rows: list, tolerance: float, wer_tolerance: float) -> int:
+    # Relative tolerance for the timings and memory, absolute for WER/CER
+    def key(row):
+        return tuple(str(row[k]).removesuffix(".0") for k in KEY)
+
+    old = {key(row): row for row in old_rows}
+    regressions = 0
+    print(f"\n{'configuration':<36}{'rtf':>16}{'wer':>16}{'cer':>16}{'rss MB':>16}{'load s':>14}")
+    for row in new_rows:
+        before = old.get(key(row))
+        if before is None:
+            print(f"{' '.join(key(row)):<36}  (new)")
+            continue
+        cells, flagged = [], False
+        for name, relative in (("rtf", True), ("wer", False), ("cer", False),
+                               ("peak_rss_mb", True), ("load_s", True)):
+            a, b = before.get(name), row.get(name)
+            if a is not None and b is None and not relative:
+                # Accuracy was measured before and no longer is
+                flagged = True
+                cells.append("gone!")
+                continue
+            if a is None or b is None:
+                cells.append("-")
+                continue
+            worse = b > a * (1 + tolerance) if relative else b > a + wer_tolerance
+            flagged |= worse
+            change = f"{(b / a - 1) * 100:+.0f}%" if relative and a else f"{(b - a) * 100:+.1f}pp"
+            cells.append(f"{b:g} {change}{'!' if worse else ''}")
+        regressions += flagged
+        print(f"{' '.join(key(row)):<36}" + "".join(
+            f"{cell:>16}" if i < 4 else f"{cell:>14}" for i, cell in enumerate(cells)
+        ))
+    for missing in old.keys() - {key(row) for row in new_rows}:
+        print(f"{' '.join(missing):<36}  (missing from the new run)")
+    print(f"\n{regressions} regressed configuration(s) ('!' = beyond tolerance)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models", nargs="+", default=["tiny", "base", "small"])
+    parser.add_argument("--devices", nargs="+", default=["cpu", "cuda", "mps"])
+    parser.add_argument("--precisions", nargs="+", default=["fp32", "fp16", "int8"],
+                        choices=["fp32", "fp16", "int8"])
+    parser.add_argument("--beam-sizes", type=int, nargs="+", default=[1, 5], help="1 = greedy")
+    parser.add_argument("--model-dir", default="./models")
+    parser.add_argument("--audio-dir", default="./audios")
+    parser.add_argument("--references", default=None, help="JSONL manifest of audio/text/language")
+    parser.add_argument("--language", default=None, help="for clips without one; None detects")
+    parser.add_argument("--timings-only", action="store_true",
+                        help="run even if no clip has a reference transcript (no WER/CER)")
+    parser.add_argument("--repeats", type=int, default=2, help="best of, per clip")
+    parser.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    parser.add_argument("-o", "--output", default="./results/model_matrix.csv", help=".csv or .jsonl")
+    parser.add_argument("--compare", nargs="+", metavar="TABLE",
+                        help="earlier table to diff against; with two tables, only diff them")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative, rtf/rss/load")
+    parser.add_argument("--wer-tolerance", type=float, default=0.005, help="absolute, WER/CER")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(json.loads(args.worker))))
+        return
+    if args.compare and len(args.compare) == 2:
+        old, new = (read_table(path) for path in args.compare)
+        sys.exit(1 if compare(old, new, args.tolerance, args.wer_tolerance) else 0)
+
+    clips = references(args)
+    if not clips:
+        sys.exit(f"No clips in {args.references or args.audio_dir}")
+    with_text = sum(text is not None for _, text, _ in clips)
+    print(f"[Matrix] {len(clips)} clips, {with_text} with reference transcripts, on "
+          f"{platform.machine()} {platform.system()}")
+    for path, text, _ in clips:
+        if text is None:
+            print(f"[Matrix] No reference transcript for {path}: timings only")
+    if not with_text and not args.timings_only:
+        sys.exit(
+            "[Matrix] None of the clips has a reference transcript, so WER/CER cannot be "
+            "measured. Add audios/X.txt next to each clip or pass --references MANIFEST "
+            "(--timings-only to run anyway)"
+        )
+
+    rows = []
+    header = f"{'model':<16}{'device':<7}{'prec':<6}{'beam':>5}{'load s':>8}{'RTF':>8}" \
+             f"{'WER':>7}{'CER':>7}{'RSS MB':>9}"
+    print(header)
+    for config in configurations(args):
+        config.update(clips=clips, model_dir=args.model_dir, repeats=args.repeats,
+                      threads=args.threads)
+        row = run_worker(config)
+        if row is None:
+            continue
+        rows.append(row)
+        wer = f"{row['wer'] * 100:.1f}" if row["wer"] is not None else "-"
+        cer = f"{row['cer'] * 100:.1f}" if row["cer"] is not None else "-"
+        print(f"{row['model']:<15} {row['device']:<7}{row['precision']:<6}{row['beam_size']:>5}"
+              f"{row['load_s']:>8.2f}{row['rtf']:>8.3f}{wer:>7}{cer:>7}{row['peak_rss_mb']:>9.0f}")
+
+    write_table(args.output, rows)
+    print(f"\n[Matrix] {len(rows)} configurations written to {args.output}")
+    if args.compare:
+        sys.exit(1 if compare(read_table(args.compare[0]), rows, args.tolerance,
+                              args.wer_tolerance) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# Unloading and reloading Whisper through the residency manager
+# (My_residency): a full load through whisper.load_model against reloads
+# from the memory-mapped snapshot written on the first unload, with the
+# process's resident memory after each step, a check that the reloaded model
+# transcribes the same, and the idle and memory-pressure triggers. Snapshots
+# go to a scratch directory.
+#   python -m benchmarks.residency --model base --device cpu --cycles 3
+import argparse
+import glob
+import statistics
+import tempfile
+import time
+from time import perf_counter
+
+import numpy as np
+
+from My_audio_cache import AudioCache
+from My_residency import ResidencyManager, WhisperResident, available_memory, resident_memory
+from My_transcriber import MyTranscriber
+
+
+def megabytes(value) -> str:
+    return f"{value / 2**20:.0f} MB" if value is not None else "n/a"
+
+
+def wait_for(condition, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="base", help="name or checkpoint path")
+    parser.add_argument("--model-dir", default="./models")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--audio-dir", default="./audios")
+    parser.add_argument("--cycles", type=int, default=3)
+    args = parser.parse_args()
+
+    transcriber = MyTranscriber(args.model, args.device)
+    transcriber.MODEL_DIR = args.model_dir
+    clips = sorted(glob.glob(f"{args.audio_dir}/*.m4a") + glob.glob(f"{args.audio_dir}/*.wav"))
+    audio = None
+    if clips:  # one 30 s window
+        audio = np.asarray(AudioCache.default().load(clips[0])[: 30 * 16000], np.float32)
+
+    def transcribe():
+        if audio is None:
+            return None
+        result = transcriber.model.transcribe(
+            audio, language="en", temperature=0.0, fp16=transcriber.runtime.fp16, verbose=None
+        )
+        return result["text"].strip()
+
+    base_rss = resident_memory()
+    loads = []
+    for _ in range(2):  # the second with the checkpoint in the page cache
+        start = perf_counter()
+        transcriber.init_model()
+        loads.append(perf_counter() - start)
+        reference = transcribe()
+        transcriber.cleanup()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        manager = ResidencyManager(idle_timeout=None)
+        manager.add("whisper", WhisperResident(transcriber, cache_dir))
+        transcriber.init_model()
+        loaded_rss = resident_memory()
+        start = perf_counter()
+        manager.unload()
+        snapshot = perf_counter() - start  # first unload writes the snapshot
+
+        unloads, rss = [], []
+        for _ in range(args.cycles):
+            rss.append((resident_memory(), None))
+            manager.ensure_loaded()
+            rss[-1] = (rss[-1][0], resident_memory())
+            start = perf_counter()
+            manager.unload()
+            unloads.append(perf_counter() - start)
+        manager.ensure_loaded()
+        same = transcribe() == reference
+
+        # Triggers: a short idle timeout, then more free memory required than there is
+        manager.idle_timeout, manager.check_interval = 0.5, 0.1
+        manager.start()
+        idle = wait_for(lambda: not manager.residents["whisper"].loaded, 5)
+        manager.ensure_loaded()
+        manager.idle_timeout = None
+        available = available_memory()
+        if available is not None:
+            manager.min_available_mb = available / 2**20 * 2
+            pressure = wait_for(lambda: not manager.residents["whisper"].loaded, 5)
+        manager.close()
+        stats = manager.stats()
+
+    reloads = manager.reloads["whisper"]
+    print(f"{args.model} on {transcriber.runtime.describe()}")
+    print(f"full load            {loads[0] * 1000:8.0f} ms cold, {loads[1] * 1000:.0f} ms warm "
+          f"(whisper.load_model)")
+    print(f"first unload         {snapshot * 1000:8.0f} ms (writes the snapshot)")
+    print(f"unload               {statistics.median(unloads) * 1000:8.0f} ms p50")
+    print(f"reload               {statistics.median(reloads) * 1000:8.0f} ms p50 "
+          f"({loads[1] / statistics.median(reloads):.1f}x faster than a warm full load)")
+    print(f"resident memory      {megabytes(base_rss)} before loading, {megabytes(loaded_rss)} "
+          f"loaded; unloaded/reloaded: "
+          + ", ".join(f"{megabytes(a)}/{megabytes(b)}" for a, b in rss))
+    print(f"same transcript      {same if audio is not None else 'n/a (no clips)'}")
+    print(f"idle unload          {idle}")
+    print(f"pressure unload      {pressure if available is not None else 'n/a'}")
+    print(f"stats                {stats}")
+
+
+if __name__ == "__main__":
+    main()
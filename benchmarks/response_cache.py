@@ -0,0 +1,91 @@
+# Reply latency with and without the LLM response cache (My_response_cache)
+# against the local mock Ollama server and the stub search backend. A script
+# of FAQ-style repeats, follow-ups that depend on the conversation and a
+# search query runs over several sessions (history cleared in between), then
+# once more with a fresh cache loaded from disk, as after a restart.
+#   python -m benchmarks.response_cache --sessions 3 --search-ttl 1
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from time import perf_counter
+
+from benchmarks.mock_ollama import MockOllama
+from My_LLM import MyLlm
+from My_response_cache import ResponseCache
+from My_search import StaticSearchBackend
+
+SCRIPT = [
+    "What can you do?",
+    "Tell me a joke.",
+    "Tell me more about it.",  # refers back: keyed on the previous exchange
+    "What's the weather today?",  # web search: short TTL
+    "what can you do",
+]
+
+
+def run_session(llm: MyLlm) -> list[tuple[str, float]]:
+    llm.clearChat()
+    times = []
+    for prompt in SCRIPT:
+        start = perf_counter()
+        for _ in llm.chat_stream(prompt):
+            pass
+        times.append((prompt, perf_counter() - start))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0)
+    parser.add_argument("--search-latency", type=float, default=0.5)
+    parser.add_argument("--sessions", type=int, default=3)
+    parser.add_argument("--search-ttl", type=float, default=1.0)
+    args = parser.parse_args()
+
+    with MockOllama(0.0, args.tokens_per_sec) as mock, tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "responses.json")
+
+        def make_llm(cache):
+            # The web search is cached on its own; a fresh one per session
+            # shows the response cache's TTL rather than the search cache's
+            llm = MyLlm(
+                search_backend=StaticSearchBackend(delay=args.search_latency),
+                response_cache=cache,
+            )
+            llm.SERVER_URL = mock.url
+            return llm
+
+        cache = ResponseCache(path, search_ttl=args.search_ttl)
+        rows = []
+        for session in range(args.sessions):
+            uncached = run_session(make_llm(None))
+            before = mock.requests
+            cached = run_session(make_llm(cache))
+            requests = mock.requests - before
+            rows.append((f"session {session + 1}", uncached, cached, requests))
+            time.sleep(args.search_ttl)  # the search-backed reply expires
+
+        restarted = ResponseCache(path, search_ttl=args.search_ttl)
+        uncached = run_session(make_llm(None))
+        before = mock.requests
+        cached = run_session(make_llm(restarted))
+        rows.append(("after restart", uncached, cached, mock.requests - before))
+
+    print(f"{'':<16}" + "".join(f"{prompt[:14]:>16}" for prompt in SCRIPT) + "   requests")
+    for label, uncached, cached, requests in rows:
+        print(f"{label + ' off':<16}" + "".join(f"{t * 1000:>13.0f} ms" for _, t in uncached))
+        print(f"{label + ' on':<16}" + "".join(f"{t * 1000:>13.0f} ms" for _, t in cached)
+              + f"   {requests}/{len(SCRIPT)}")
+
+    off = [t for _, uncached, _, _ in rows for _, t in uncached]
+    on = [t for _, _, cached, _ in rows for _, t in cached]
+    print(f"\nreply p50 {statistics.median(off) * 1000:.0f} -> {statistics.median(on) * 1000:.0f} ms, "
+          f"total {sum(off):.1f} -> {sum(on):.1f} s")
+    print(f"cache: {cache.stats()}")
+    print(f"after restart: {restarted.stats()}")
+
+
+if __name__ == "__main__":
+    main()
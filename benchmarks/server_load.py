@@ -0,0 +1,158 @@
+# Load test for server.py: how many concurrent sessions one machine serves at
+# a target p95 turn latency (end of the user's utterance to the first reply
+# audio, as seen by the client). Runs the server in-process with the real
+# Whisper model and the hermetic stand-ins for Ollama and Piper
+# (benchmarks/harness.py; the mock serves requests in parallel, so this
+# measures the server, not Ollama's own concurrency).
+#
+# Every simulated client opens a session and loops: "speak" a clip from
+# audios/ (sleeping its duration), send it, read the streamed reply and
+# "listen" to it (sleeping its audio duration). --time-scale shortens both.
+#   python -m benchmarks.server_load --stt-model tiny --sessions 1 2 4 8 16 --target-p95 1500
+import argparse
+import base64
+import glob
+import json
+import random
+import threading
+import time
+from time import perf_counter
+
+import numpy as np
+import requests
+
+from My_capture import load_audio_file
+from My_LLM import pooled_session
+from My_tracing import percentile
+from My_tts import MyTTS
+from benchmarks.harness import hermetic, install_fake_voice, make_llm
+from server import SAMPLE_RATE, VoiceServer, load_scheduler
+
+
+def client(url, clips, stop_at, time_scale, results):
+    http = requests.Session()
+    session = http.post(f"{url}/sessions").json()["session"]
+    order = random.sample(range(len(clips)), len(clips))
+    time.sleep(random.uniform(0, 3) * time_scale)  # don't start in lockstep
+    i = 0
+    while perf_counter() < stop_at:
+        seconds, pcm = clips[order[i % len(order)]]
+        i += 1
+        time.sleep(seconds * time_scale)  # the user speaking
+        start = perf_counter()
+        res = http.post(f"{url}/sessions/{session}/turns", data=pcm, stream=True)
+        if res.status_code == 429:
+            results["rejected"] += 1
+            res.close()
+            time.sleep(float(res.headers.get("Retry-After", 1)))
+            continue
+        first_audio, reply_seconds = None, 0.0
+        for line in res.iter_lines():
+            event = json.loads(line)
+            if event["event"] == "audio":
+                if first_audio is None:
+                    first_audio = perf_counter() - start
+                reply_seconds += len(base64.b64decode(event["pcm"])) / 2 / event["sample_rate"]
+        if first_audio is None:
+            results["silent"] += 1
+        else:
+            results["latencies"].append(first_audio * 1000)
+        time.sleep(reply_seconds * time_scale)  # the user listening
+    http.delete(f"{url}/sessions/{session}")
+
+
+def run_level(server, clips, sessions, args) -> dict:
+    results = {"latencies": [], "rejected": 0, "silent": 0}
+    before = server.scheduler.stats()
+    stop_at = perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=client, args=(server.url, clips, stop_at, args.time_scale, results))
+        for _ in range(sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    after = server.scheduler.stats()
+    batches = after["batches"] - before["batches"]
+    utterances = after["utterances"] - before["utterances"]
+    latencies = results["latencies"]
+    return {
+        "sessions": sessions,
+        "turns": len(latencies),
+        "p50": percentile(latencies, 50) if latencies else None,
+        "p95": percentile(latencies, 95) if latencies else None,
+        "rejected": results["rejected"],
+        "silent": results["silent"],
+        "mean_batch": utterances / batches if batches else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--audio-dir", default="./audios")
+    parser.add_argument("--stt-model", default="tiny")
+    parser.add_argument("--model-dir", default="./models")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--duration", type=float, default=60, help="seconds per level")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="speaking/listening time")
+    parser.add_argument("--target-p95", type=float, default=1500, help="ms")
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--batch-wait", type=float, default=0.01)
+    parser.add_argument("--tokens-per-sec", type=float, default=40)
+    parser.add_argument("--tts-rtf", type=float, default=0.05)
+    args = parser.parse_args()
+
+    clips = []
+    for path in sorted(glob.glob(f"{args.audio_dir}/*.m4a") + glob.glob(f"{args.audio_dir}/*.wav")):
+        audio = load_audio_file(path)
+        pcm = (np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes()
+        clips.append((len(audio) / SAMPLE_RATE, pcm))
+
+    scheduler, runtime = load_scheduler(
+        args.stt_model,
+        args.model_dir,
+        args.device,
+        args.threads,
+        max_batch=args.max_batch,
+        max_wait=args.batch_wait,
+        per_session=1,
+        max_pending=max(args.sessions),
+    )
+    with hermetic(args.tokens_per_sec, 0.0, args.tts_rtf) as mock:
+        install_fake_voice(MyTTS.__VOICES__["joe-medium"], args.tts_rtf)
+        http = pooled_session(max(args.sessions))
+        server = VoiceServer(
+            scheduler,
+            lambda: make_llm(mock, session=http),
+            max_sessions=max(args.sessions),
+            port=0,
+        )
+        with server:
+            levels = [run_level(server, clips, n, args) for n in args.sessions]
+    scheduler.close()
+
+    print(f"\n{'sessions':>8}{'turns':>7}{'p50 ms':>9}{'p95 ms':>9}{'batch':>7}{'429s':>6}{'silent':>8}")
+    for level in levels:
+        p50 = f"{level['p50']:.0f}" if level["p50"] is not None else "-"
+        p95 = f"{level['p95']:.0f}" if level["p95"] is not None else "-"
+        print(f"{level['sessions']:>8}{level['turns']:>7}{p50:>9}{p95:>9}"
+              f"{level['mean_batch']:>7.2f}{level['rejected']:>6}{level['silent']:>8}")
+
+    ok = [
+        level["sessions"] for level in levels
+        if level["p95"] is not None and level["p95"] <= args.target_p95 and not level["rejected"]
+    ]
+    cores = runtime.threads if runtime.device == "cpu" else 1
+    unit = "core" if runtime.device == "cpu" else runtime.device
+    if ok:
+        print(f"\n{max(ok)} sessions at p95 <= {args.target_p95:.0f} ms "
+              f"on {runtime.describe()}: {max(ok) / cores:.2f} sessions per {unit}")
+    else:
+        print(f"\nNo level met p95 <= {args.target_p95:.0f} ms on {runtime.describe()}")
+
+
+if __name__ == "__main__":
+    main()
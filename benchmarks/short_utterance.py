@@ -0,0 +1,100 @@
+# CPU latency of the short-utterance fast path (My_fast_decode) against the
+# full path (model.transcribe: 30 s window, temperature fallback). Each clip
+# from audios/ is given the pre-roll and trailing silence the endpointer
+# leaves on an utterance, as MyTranscriber would hand it over. "fast" is what
+# the transcriber pays with the fast path on: the fast attempt, plus the full
+# path when the attempt falls back; "attempt" is the fast attempt alone.
+#   python -m benchmarks.short_utterance --model base --repeats 3
+import argparse
+import glob
+import statistics
+from time import perf_counter
+
+import numpy as np
+
+from My_audio_cache import AudioCache
+from My_device import WhisperRuntime
+from My_fast_decode import transcribe_short
+from My_transcriber import MyTranscriber
+from benchmarks.cpu_quantization import word_error_rate
+
+SAMPLE_RATE = 16000
+
+
+def utterance(audio: np.ndarray, preroll: float, silence: float, seed: int = 0) -> np.ndarray:
+    # Faint noise rather than digital silence, like a real microphone
+    rng = np.random.default_rng(seed)
+    before = rng.normal(0, 1e-3, int(preroll * SAMPLE_RATE))
+    after = rng.normal(0, 1e-3, int(silence * SAMPLE_RATE))
+    return np.concatenate((before, audio, after)).astype(np.float32)
+
+
+def timed(fcn, repeats: int):
+    times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        result = fcn()
+        times.append(perf_counter() - start)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--model-dir", default="./models")
+    parser.add_argument("--audio-dir", default="./audios")
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--no-quantize", action="store_true", help="fp32 linear layers")
+    parser.add_argument("--trailing-silence", type=float, default=MyTranscriber.SILENCE_DURATION)
+    args = parser.parse_args()
+
+    runtime = WhisperRuntime("cpu", quantize=not args.no_quantize, threads=args.threads)
+    model = runtime.load(args.model, args.model_dir, label="[Benchmark]")
+    clips = sorted(glob.glob(f"{args.audio_dir}/*.m4a") + glob.glob(f"{args.audio_dir}/*.wav"))
+    preroll = MyTranscriber.PREROLL_DURATION
+    audios = [
+        utterance(AudioCache.default().load(path), preroll, args.trailing_silence) for path in clips
+    ]
+
+    def full(audio):
+        result = model.transcribe(audio, language=args.language, fp16=False, verbose=None)
+        return result["text"].strip()
+
+    def fast(audio):
+        text = transcribe_short(model, audio, args.language, fp16=False)
+        return (full(audio), False) if text is None else (text, True)
+
+    # Warm-up, both paths
+    full(audios[0][:SAMPLE_RATE])
+    transcribe_short(model, audios[0][:SAMPLE_RATE], args.language, fp16=False)
+
+    print(f"\n{'file':<28}{'audio s':>8}{'full ms':>9}{'attempt':>9}{'fast ms':>9}{'speedup':>9}"
+          f"  path")
+    totals = [0.0, 0.0]
+    taken, wers = 0, []
+    for path, audio in zip(clips, audios):
+        full_time, reference = timed(lambda: full(audio), args.repeats)
+        attempt_time, _ = timed(
+            lambda: transcribe_short(model, audio, args.language, fp16=False), args.repeats
+        )
+        fast_time, (text, fast_path) = timed(lambda: fast(audio), args.repeats)
+        totals[0] += full_time
+        totals[1] += fast_time
+        taken += fast_path
+        wers.append(word_error_rate(reference, text))
+        print(f"{path.split('/')[-1][:27]:<28}{len(audio) / SAMPLE_RATE:>8.1f}"
+              f"{full_time * 1000:>9.0f}{attempt_time * 1000:>9.0f}{fast_time * 1000:>9.0f}"
+              f"{full_time / fast_time:>8.2f}x"
+              f"  {'fast' if fast_path else 'fallback'}")
+        if text != reference:
+            print(f"{'':<4}full: {reference[:100]}\n{'':<4}fast: {text[:100]}")
+
+    print(f"\n{args.model} on {runtime.describe()}: {taken}/{len(clips)} clips on the fast path, "
+          f"total {totals[0] * 1000:.0f} -> {totals[1] * 1000:.0f} ms "
+          f"({totals[0] / totals[1]:.2f}x), WER vs full path {statistics.fmean(wers) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
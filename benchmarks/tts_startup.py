@@ -0,0 +1,68 @@
+# Startup cost vs per-utterance latency: piper subprocess per call (old path)
+# against the resident in-process engine.
+#   python -m benchmarks.tts_startup --voice joe-medium --repeats 3
+import argparse
+import statistics
+import subprocess
+from time import perf_counter
+
+from My_tts import MyTTS
+from My_tts_engine import TTSEngine
+
+PHRASES = [
+    "Hello!",
+    "No speech detected.",
+    "Sure, I can help with that.",
+    "Toronto is the capital of the province of Ontario, in Canada.",
+    "The weather today is mostly sunny with a high of twenty degrees.",
+]
+
+
+def synthesize_subprocess(voice_path: str, text: str) -> bytes:
+    result = subprocess.run(
+        ["piper", "--model", voice_path, "--output-raw"],
+        input=text.encode("utf-8"),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+    return result.stdout
+
+
+def timed(fcn, *args):
+    start = perf_counter()
+    fcn(*args)
+    return perf_counter() - start
+
+
+def report(name: str, startup: float, latencies: list[float]):
+    print(
+        f"{name:<12} startup {startup * 1000:8.1f} ms | "
+        f"first {latencies[0] * 1000:8.1f} ms | "
+        f"p50 {statistics.median(latencies) * 1000:8.1f} ms | "
+        f"mean {statistics.fmean(latencies) * 1000:8.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--voice", default="joe-medium", choices=MyTTS.list_voices())
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    voice_path = MyTTS.__VOICES__[args.voice]
+    phrases = PHRASES * args.repeats
+
+    # Every subprocess call pays the process spawn and ONNX load again
+    latencies = [timed(synthesize_subprocess, voice_path, p) for p in phrases]
+    report("subprocess", 0.0, latencies)
+
+    engine = TTSEngine(voice_path)
+    startup = timed(engine.load)
+    latencies = [timed(engine.synthesize, p) for p in phrases]
+    report("resident", startup, latencies)
+    engine.close()
+
+
+if __name__ == "__main__":
+    main()
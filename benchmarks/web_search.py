@@ -0,0 +1,35 @@
+# Search-stage latency with a stalled network, a healthy one, and the TTL cache,
+# using the local stub backend.
+#   python -m benchmarks.web_search --stall 10 --timeout 2
+import argparse
+from time import perf_counter
+
+from My_search import StaticSearchBackend, WebSearch
+
+
+def timed_search(search: WebSearch, query: str):
+    start = perf_counter()
+    results = search.search(query)
+    return perf_counter() - start, results is not None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stall", type=float, default=10.0)
+    parser.add_argument("--latency", type=float, default=0.8)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    args = parser.parse_args()
+
+    stalled = WebSearch(StaticSearchBackend(delay=args.stall), timeout=args.timeout)
+    elapsed, found = timed_search(stalled, "weather today")
+    print(f"stalled network    {elapsed * 1000:8.1f} ms (results: {found})")
+
+    search = WebSearch(StaticSearchBackend(delay=args.latency), timeout=args.timeout)
+    for query in ("Weather today?", "weather   today", "What's the latest news"):
+        elapsed, found = timed_search(search, query)
+        print(f"{query!r:<26} {elapsed * 1000:8.1f} ms (results: {found})")
+    print(f"backend calls: {search.backend.calls}, {search.stats()}")
+
+
+if __name__ == "__main__":
+    main()
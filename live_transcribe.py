@@ -1,26 +1,35 @@
 import numpy as np
-import sounddevice as sd
-import whisper
-import torch
-import gc
 import threading
 import queue
+import time
+from My_batch_decode import transcribe_batch
+from My_capture import AudioCapture
+from My_device import WhisperRuntime
+from My_fast_decode import transcribe_short
+from My_vad import Endpointer, VoiceActivityDetector
 
 # Configuration
-DEVICE = "mps"                # "cpu" | "cuda" | "mps"
+DEVICE = None                 # "cpu" | "cuda" | "mps", None picks the best available
 MODEL_DIR = "./models"
 MODEL_NAME = "large-v3-turbo"
 SAMPLE_RATE = 16000           # Whisper expects 16kHz audio
-SILENCE_THRESHOLD = 0.01      # RMS energy threshold (adjust for your environment)
+FRAME_DURATION = 0.02         # VAD frame size (noise floor is calibrated automatically)
 SILENCE_DURATION = 1.5        # Seconds of silence before triggering transcription
 CHUNK_DURATION = 0.1          # Seconds per audio chunk
 MIN_SPEECH_DURATION = 0.5     # Minimum speech duration to bother transcribing
+PREROLL_DURATION = 0.3        # Audio kept from before speech was detected
+BUFFER_DURATION = 60          # Ring buffer size in seconds
+MAX_BATCH = 4                 # Pending segments decoded together in one pass
+BATCH_WAIT = 0.0              # Seconds to wait for more segments before decoding
+FAST_PATH = True              # A lone short segment skips the 30 s window (My_fast_decode)
 
 
-def main():
+def main(stream_factory=None) -> list[float]:
+    # Returns each segment's latency from end of speech to its transcript
     print("Loading whisper model...")
-    model = whisper.load_model(MODEL_NAME, device=DEVICE, download_root=MODEL_DIR)
-    print("Model loaded!\n")
+    runtime = WhisperRuntime(DEVICE)
+    model = runtime.load(MODEL_NAME, MODEL_DIR, label="Model loaded!")
+    print()
 
     while True:
         user_input = input("Type 'start' to begin recording: ").strip().lower()
@@ -32,11 +41,10 @@ def main():
     audio_q = queue.Queue()
     transcribe_q = queue.Queue()
     stop_event = threading.Event()
-
-    def audio_callback(indata, frames, time_info, status):
-        if status:
-            print(f"[Audio: {status}]")
-        audio_q.put(indata.copy())
+    latencies = []
+    capture = AudioCapture(
+        SAMPLE_RATE, CHUNK_DURATION, BUFFER_DURATION, PREROLL_DURATION, stream_factory
+    )
 
     def stop_listener():
         while not stop_event.is_set():
@@ -49,77 +57,84 @@ def main():
     def transcriber():
         while True:
             try:
-                audio_data = transcribe_q.get(timeout=0.5)
+                batch = [transcribe_q.get(timeout=0.5)]
             except queue.Empty:
                 if stop_event.is_set():
                     break
                 continue
-            result = model.transcribe(
-                audio_data, language="en", fp16=True, verbose=None
-            )
-            text = result["text"].strip()
-            if text:
-                print(f">> {text}")
-            transcribe_q.task_done()
+            # Drain whatever backed up while the last batch was decoding
+            deadline = time.monotonic() + BATCH_WAIT
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(
+                        transcribe_q.get(timeout=max(0, deadline - time.monotonic()))
+                    )
+                except queue.Empty:
+                    break
+            backlog = transcribe_q.qsize()
+            if len(batch) > 1 or backlog:
+                print(f"[Transcriber] Decoding {len(batch)} segments, {backlog} still queued")
+            segments = [audio for _, audio in batch]
+            if FAST_PATH and len(segments) == 1:
+                text = transcribe_short(model, segments[0], "en", runtime.fp16)
+                if text is None:
+                    # Too long or unreliable: the full 30 s window with
+                    # temperature fallback, as MyTranscriber does
+                    text = model.transcribe(
+                        segments[0], language="en", fp16=runtime.fp16, verbose=None
+                    )["text"].strip()
+                texts = [text]
+            else:
+                texts = transcribe_batch(model, segments, language="en", fp16=runtime.fp16)
+            for (end_time, _), text in zip(batch, texts):
+                latencies.append(time.perf_counter() - end_time)
+                if text:
+                    print(f">> {text}")
+            for _ in batch:
+                transcribe_q.task_done()
 
     threading.Thread(target=stop_listener, daemon=True).start()
     threading.Thread(target=transcriber, daemon=True).start()
 
-    stream = sd.InputStream(
-        samplerate=SAMPLE_RATE,
-        channels=1,
-        dtype="float32",
-        blocksize=int(SAMPLE_RATE * CHUNK_DURATION),
-        callback=audio_callback,
-    )
-    stream.start()
+    # The audio callback only writes into the ring; the main loop gets the
+    # end position of each chunk
+    capture.start(lambda chunk, position: audio_q.put((position, len(chunk))))
 
-    audio_buffer = []
-    is_speaking = False
-    silence_chunks = 0
-    silence_needed = int(SILENCE_DURATION / CHUNK_DURATION)
-    min_speech_chunks = int(MIN_SPEECH_DURATION / CHUNK_DURATION)
+    endpointer = Endpointer(
+        VoiceActivityDetector(SAMPLE_RATE, FRAME_DURATION),
+        SILENCE_DURATION,
+        MIN_SPEECH_DURATION,
+    )
+    start = None
 
     while not stop_event.is_set():
         try:
-            chunk = audio_q.get(timeout=0.5)
+            position, n = audio_q.get(timeout=0.5)
         except queue.Empty:
             continue
 
-        energy = np.sqrt(np.mean(chunk ** 2))
-
-        if energy > SILENCE_THRESHOLD:
-            is_speaking = True
-            silence_chunks = 0
-            audio_buffer.append(chunk)
-        elif is_speaking:
-            audio_buffer.append(chunk)
-            silence_chunks += 1
+        event = endpointer.update(capture.audio(position - n, position))
 
-            if silence_chunks >= silence_needed:
-                speech_chunks = len(audio_buffer) - silence_chunks
-                if speech_chunks >= min_speech_chunks:
-                    audio_data = np.concatenate(audio_buffer, axis=0).flatten()
-                    transcribe_q.put(audio_data)
-                audio_buffer.clear()
-                is_speaking = False
-                silence_chunks = 0
+        if event == "start":
+            start = capture.onset(position - n)
+        if event == "end":
+            # Copied once: the ring keeps being overwritten while it waits
+            transcribe_q.put((time.perf_counter(), np.array(capture.audio(start, position))))
+        if event in ("end", "discard"):
+            start = None
 
-    stream.stop()
-    stream.close()
+    capture.stop()
 
     # Transcribe any remaining audio in the buffer
-    if audio_buffer:
-        audio_data = np.concatenate(audio_buffer, axis=0).flatten()
-        transcribe_q.put(audio_data)
+    if start is not None:
+        transcribe_q.put((time.perf_counter(), np.array(capture.audio(start))))
 
     transcribe_q.join()
     print("\nRecording stopped.")
 
     del model
-    gc.collect()
-    if DEVICE == "mps":
-        torch.mps.empty_cache()
+    runtime.release()
+    return latencies
 
 
 if __name__ == "__main__":
@@ -0,0 +1,327 @@
+# Multi-session voice assistant server. Every session shares one Whisper model
+# (behind a batching, fair TranscriptionScheduler), one pooled HTTP session to
+# Ollama and the resident Piper engine; each keeps its own chat history.
+#   python server.py --port 8765 --model large-v3-turbo
+#
+# Streaming HTTP API. Clients do their own endpointing and send one utterance
+# per turn:
+#   POST   /sessions              -> 201 {"session": id}
+#   POST   /sessions/<id>/turns   body: 16 kHz mono s16le PCM
+#          -> 200 NDJSON stream, one event per line:
+#             {"event": "transcript", "text": ...}
+#             {"event": "audio", "text": sentence, "sample_rate": ..., "pcm": base64 s16le}
+#             {"event": "done", "reply": ..., "spans": {...}}
+#          -> 429 + Retry-After when transcription is backed up
+#   DELETE /sessions/<id>
+#   GET    /stats
+import argparse
+import base64
+import itertools
+import json
+import threading
+from collections import deque
+from contextlib import closing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import My_tracing as tracing
+from My_batch_decode import transcribe_batch
+from My_device import WhisperRuntime
+from My_LLM import MyLlm, pooled_session
+from My_scheduler import SchedulerBusy, TranscriptionScheduler
+from My_segmenter import SentenceSegmenter
+from My_tracing import Tracer
+from My_tts import MyTTS
+
+SAMPLE_RATE = 16000
+RETRY_AFTER = 1  # seconds, with 429
+
+
+class Session:
+    def __init__(self, session_id: int, llm, tts):
+        self.id = session_id
+        self.llm = llm
+        self.tts = tts
+        self.busy = threading.Lock()  # one turn at a time
+
+
+class VoiceServer:
+    def __init__(
+        self,
+        scheduler: TranscriptionScheduler,
+        llm_factory,
+        voice: str = "joe-medium",
+        tracer: Tracer = None,
+        max_sessions: int = 64,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+    ):
+        # llm_factory() makes each session's MyLlm, sharing a connection pool
+        self.scheduler = scheduler
+        self.llm_factory = llm_factory
+        self.voice = voice
+        self.tracer = tracer or Tracer(keep=1000)
+        self.max_sessions = max_sessions
+        self.sessions = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self.__handler__())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "VoiceServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def open_session(self) -> Session:
+        with self._lock:
+            if len(self.sessions) >= self.max_sessions:
+                raise SchedulerBusy(f"{len(self.sessions)} sessions open")
+            session = Session(next(self._ids), self.llm_factory(), MyTTS(self.voice))
+            self.sessions[session.id] = session
+        return session
+
+    def close_session(self, session_id: int) -> bool:
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.llm.cancel()
+        self.scheduler.forget(session_id)
+        return True
+
+    def submit(self, session: Session, audio: np.ndarray):
+        # Queues the utterance for transcription; raises SchedulerBusy before
+        # anything has been sent to the client
+        turn = self.tracer.start_turn(activate=False, session=session.id)
+        turn.mark("eos")
+        try:
+            return turn, self.scheduler.submit(session.id, audio)
+        except SchedulerBusy:
+            self.tracer.discard(turn)
+            raise
+
+    def respond(self, session: Session, turn, future):
+        # Events for one turn. Runs in the request's thread, which records
+        # into the turn.
+        tracing.bind(turn)
+        try:
+            text = future.result()
+            tracing.mark("transcribed")
+            yield {"event": "transcript", "text": text}
+            reply = ""
+            if text:
+                reply = yield from self.__speak__(session, text)
+            yield {"event": "done", "reply": reply, "spans": turn.spans()}
+        finally:
+            tracing.bind(None)
+            self.tracer.end_turn(turn)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "scheduler": self.scheduler.stats(),
+            "turns": self.tracer.summary(),
+        }
+
+    def __speak__(self, session: Session, text: str):
+        # Sentences are queued on the shared TTS engine as soon as they are
+        # complete and sent, in order, as soon as they are synthesized
+        segmenter = SentenceSegmenter()
+        pending = deque()  # (sentence, futures)
+        reply = ""
+        try:
+            for chunk in session.llm.chat_stream(text):
+                reply += chunk
+                for sentence in segmenter.feed(chunk):
+                    pending.append((sentence, session.tts.submit(sentence)))
+                while pending and all(future.done() for future in pending[0][1]):
+                    yield self.__audio_event__(session, *pending.popleft())
+            rest = segmenter.flush()
+            if rest:
+                pending.append((rest, session.tts.submit(rest)))
+            while pending:
+                yield self.__audio_event__(session, *pending.popleft())
+        finally:
+            # Client gone: drop what is still queued for synthesis
+            for _, futures in pending:
+                for future in futures:
+                    future.cancel()
+        return reply
+
+    def __audio_event__(self, session: Session, sentence: str, futures: list) -> dict:
+        pcm = session.tts.collect(futures)
+        tracing.mark("first_audio")
+        return {
+            "event": "audio",
+            "text": sentence,
+            "sample_rate": session.tts.sample_rate,
+            "pcm": base64.b64encode(pcm).decode("ascii"),
+        }
+
+    def __handler__(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/stats":
+                    self.__json__(200, server.stats())
+                else:
+                    self.__json__(404, {"error": "not found"})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                parts = self.path.strip("/").split("/")
+                if parts == ["sessions"]:
+                    try:
+                        session = server.open_session()
+                    except SchedulerBusy as e:
+                        return self.__json__(503, {"error": str(e)})
+                    return self.__json__(201, {"session": session.id})
+                session = self.__session__(parts, "turns")
+                if session is None:
+                    return self.__json__(404, {"error": "no such session"})
+                if not body or len(body) % 2:
+                    return self.__json__(400, {"error": "body must be non-empty s16le PCM"})
+                audio = np.frombuffer(body, np.int16).astype(np.float32) / 32768
+                self.__turn__(session, audio)
+
+            def do_DELETE(self):
+                parts = self.path.strip("/").split("/")
+                if len(parts) == 2 and parts[0] == "sessions" and parts[1].isdigit():
+                    if server.close_session(int(parts[1])):
+                        return self.__json__(200, {})
+                self.__json__(404, {"error": "no such session"})
+
+            def __session__(self, parts, action):
+                if len(parts) != 3 or parts[0] != "sessions" or parts[2] != action:
+                    return None
+                return server.sessions.get(int(parts[1])) if parts[1].isdigit() else None
+
+            def __turn__(self, session, audio):
+                if not session.busy.acquire(blocking=False):
+                    return self.__json__(409, {"error": "a turn is already in progress"})
+                try:
+                    try:
+                        turn, future = server.submit(session, audio)
+                    except SchedulerBusy as e:
+                        return self.__json__(
+                            429, {"error": str(e)}, {"Retry-After": str(RETRY_AFTER)}
+                        )
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    try:
+                        with closing(server.respond(session, turn, future)) as events:
+                            for event in events:
+                                self.__chunk__(json.dumps(event).encode() + b"\n")
+                        self.__chunk__(b"")
+                    except (BrokenPipeError, ConnectionResetError):
+                        session.llm.cancel()
+                        self.close_connection = True
+                finally:
+                    session.busy.release()
+
+            def __chunk__(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def __json__(self, status, data, headers=None):
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+def load_scheduler(model_name, model_dir="./models", device=None, threads=None, **kwargs):
+    # One Whisper model for all sessions, warmed up with a silent batch
+    runtime = WhisperRuntime(device, threads=threads)
+    model = runtime.load(model_name, model_dir, label="[Server]")
+    transcribe_batch(model, [np.zeros(SAMPLE_RATE, np.float32)], fp16=runtime.fp16)
+    return TranscriptionScheduler(model, runtime.fp16, **kwargs), runtime
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--model", default="large-v3-turbo")
+    parser.add_argument("--model-dir", default="./models")
+    parser.add_argument("--device", default=None)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--voice", default="joe-medium")
+    parser.add_argument("--max-sessions", type=int, default=64)
+    parser.add_argument("--max-batch", type=int, default=8, help="utterances per Whisper batch")
+    parser.add_argument("--batch-wait", type=float, default=0.01, help="seconds to fill a batch")
+    parser.add_argument("--max-pending", type=int, default=32, help="waiting utterances in total")
+    parser.add_argument("--trace-out", default="./traces/server.jsonl")
+    args = parser.parse_args()
+
+    scheduler, _ = load_scheduler(
+        args.model,
+        args.model_dir,
+        args.device,
+        args.threads,
+        max_batch=args.max_batch,
+        max_wait=args.batch_wait,
+        per_session=1,  # sessions run one turn at a time anyway
+        max_pending=args.max_pending,
+    )
+    tts = MyTTS(args.voice)
+    tts.preload()
+    tts.warmup()
+    http = pooled_session(args.max_sessions)
+    MyLlm(session=http).warm(prime=True)
+
+    server = VoiceServer(
+        scheduler,
+        lambda: MyLlm(session=http),
+        args.voice,
+        Tracer(args.trace_out, keep=1000),
+        args.max_sessions,
+        args.host,
+        args.port,
+    )
+    print(f"[Server] Listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.close()
+
+
+if __name__ == "__main__":
+    main()
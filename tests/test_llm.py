@@ -0,0 +1,15 @@
+from benchmarks.harness import make_llm
+from benchmarks.mock_ollama import MockOllama
+
+
+def test_cancel_before_the_stream_is_consumed_stops_it():
+    # The pipeline cancels speculative and barged-in replies whose stream may
+    # not have been iterated yet; that cancel must not be reset by the stream
+    with MockOllama(load_delay=0, tokens_per_sec=1000) as mock:
+        llm = make_llm(mock)
+        before = list(llm.conversation_history)
+        stream = llm.chat_stream("What is the date today?")
+        llm.cancel()
+        assert list(stream) == []
+        assert list(llm.conversation_history) == before
+        assert list(llm.chat_stream("What is the date today?"))
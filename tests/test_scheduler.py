@@ -0,0 +1,14 @@
+import pytest
+
+from My_scheduler import SchedulerBusy, TranscriptionScheduler
+
+
+def test_close_fails_waiting_utterances_and_later_submits():
+    # Handlers blocked on future.result() during shutdown must not hang
+    scheduler = TranscriptionScheduler(model=None, max_wait=30)
+    future = scheduler.submit("session", [0.0])
+    scheduler.close()
+    with pytest.raises(SchedulerBusy):
+        future.result(timeout=1)
+    with pytest.raises(SchedulerBusy):
+        scheduler.submit("session", [0.0])
@@ -0,0 +1,31 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from My_scheduler import TranscriptionScheduler
+from My_tts import MyTTS
+from server import VoiceServer
+
+
+def post(url, body=b""):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, body, method="POST")) as r:
+            return r.status, json.loads(r.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.mark.parametrize("body", [b"", b"\x01\x00\x02"])
+def test_turn_without_whole_samples_is_rejected(tmp_path, monkeypatch, body):
+    (tmp_path / "voice.onnx.json").write_text(json.dumps({"audio": {"sample_rate": 16000}}))
+    monkeypatch.setitem(MyTTS.__VOICES__, "joe-medium", str(tmp_path / "voice.onnx"))
+    scheduler = TranscriptionScheduler(model=None)
+    with VoiceServer(scheduler, lambda: None, port=0) as server:
+        status, data = post(f"{server.url}/sessions")
+        assert status == 201
+        status, data = post(f"{server.url}/sessions/{data['session']}/turns", body)
+        assert status == 400
+        assert server.scheduler.stats()["utterances"] == 0
+    scheduler.close()
@@ -0,0 +1,36 @@
+import json
+import wave
+
+import numpy as np
+
+from My_segmenter import split_sentences
+from My_tts import MyTTS
+from My_tts_cache import TTSCache
+
+
+def test_save_with_every_sentence_cached_does_not_need_the_engine(tmp_path, monkeypatch):
+    # As on the second run of text_to_speech.py: every sentence is a cache hit
+    # (from the disk tier, in a fresh process), so the voice never loads and
+    # the sample rate has to come from its .onnx.json
+    voice = tmp_path / "voice.onnx"
+    (tmp_path / "voice.onnx.json").write_text(json.dumps({"audio": {"sample_rate": 16000}}))
+    monkeypatch.setitem(MyTTS.__VOICES__, "joe-medium", str(voice))
+    text = "Hello there. How are you today?"
+    sentences = split_sentences(text)
+    pcm = np.arange(800, dtype=np.int16).tobytes()
+
+    tts = MyTTS("joe-medium", sentence_silence=0.25)
+    cache = TTSCache(str(tmp_path / "tts"))
+    for sentence in sentences:
+        cache.put(cache.key(tts.voice, tts.slowness, tts.sentence_silence, sentence), pcm)
+    tts.cache = TTSCache(str(tmp_path / "tts"))
+
+    output = tmp_path / "out.wav"
+    tts.process_save(text, str(output))
+
+    assert tts.engine.voice is None
+    assert tts.cache.disk_hits == len(sentences) > 1
+    with wave.open(str(output), "rb") as wav_file:
+        assert wav_file.getframerate() == 16000
+        silence = int(16000 * 0.25)
+        assert wav_file.getnframes() == 800 * len(sentences) + silence * (len(sentences) - 1)
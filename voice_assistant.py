@@ -1,17 +1,46 @@
 import tkinter as tk
-import threading
+import argparse
 from My_LLM import MyLlm
+from My_pipeline import Pipeline, PipelineThread
+from My_residency import ResidencyManager, VoiceResident, WhisperResident
+from My_response_cache import ResponseCache
+from My_tracing import Tracer
 from My_tts import MyTTS
 from My_transcriber import MyTranscriber
 
 
 class VoiceAssistant:
-    def __init__(self):
-        self.transcriber = None
-        self.llm = None
-        self.tts = None
+    def __init__(
+        self,
+        lazy_whisper: bool = False,
+        full_duplex: bool = False,
+        speculative: bool = False,
+        response_cache: bool = False,
+        idle_unload: float = None,
+        min_available_mb: float = None,
+        preload_on_focus: bool = False,
+    ):
+        # lazy_whisper: load Whisper on the first "Talk" instead of at startup
+        self.lazy_whisper = lazy_whisper
+        # full_duplex: keep listening while speaking, so the user can cut in
+        self.full_duplex = full_duplex
+        # speculative: start the reply at the first pause, before end of speech
+        self.speculative = speculative
+        # response_cache: answer repeated questions from cache/responses.json
+        self.response_cache = ResponseCache("./cache/responses.json") if response_cache else None
+        # idle_unload (seconds) / min_available_mb: free Whisper and the voice
+        # while idle or short of memory; they come back on the next Talk, or
+        # when the window gains focus with preload_on_focus
+        self.residency = None
+        if idle_unload or min_available_mb:
+            self.residency = ResidencyManager(idle_unload, min_available_mb)
+        self.preload_on_focus = preload_on_focus
+        self.pipeline = None
         self.is_running = False
-        self._stop_requested = False
+        # One JSONL record per turn; summarize with `python My_tracing.py`
+        self.tracer = Tracer("./traces/turns.jsonl")
+        # The pipeline's event loop; Tk keeps the main thread
+        self.runner = PipelineThread()
 
         self.root = tk.Tk()
         self.root.title("Voice Assistant")
@@ -53,24 +82,48 @@ class VoiceAssistant:
         self.status_var.set(text)
         self.root.update_idletasks()
 
+    def _post_status(self, text):
+        # From the pipeline's event loop thread
+        self.root.after(0, lambda: self._set_status(text))
+
     def _on_init(self):
         self.init_btn.config(state=tk.DISABLED, text="Initializing...")
         self._set_status("Loading models...")
 
-        def do_init():
-            self.transcriber = MyTranscriber()
-            self.transcriber.init_model()
-
-            self.llm = MyLlm()
-            self.tts = MyTTS("joe-medium")
-
-            self.root.after(0, self._init_done)
-
-        threading.Thread(target=do_init, daemon=True).start()
+        transcriber, tts = MyTranscriber(), MyTTS("joe-medium")
+        if self.residency is not None:
+            self.residency.add("whisper", WhisperResident(transcriber))
+            if tts.engine is not None:
+                self.residency.add("tts", VoiceResident(tts))
+        self.pipeline = Pipeline(
+            transcriber,
+            MyLlm(response_cache=self.response_cache),
+            tts,
+            self.tracer,
+            full_duplex=self.full_duplex,
+            on_status=self._post_status,
+            speculative=self.speculative,
+            residency=self.residency,
+        )
+        # Whisper, the LLM and the voice load and warm up at once
+        self.runner.submit(
+            self.pipeline.load(self.lazy_whisper),
+            lambda failed: self.root.after(
+                0, lambda: self._init_done(["pipeline"] if failed is None else failed)
+            ),
+        )
 
-    def _init_done(self):
+    def _init_done(self, failed=()):
+        if failed:
+            self.init_btn.config(state=tk.NORMAL, text="Initialize")
+            self._set_status(f"Failed to load {', '.join(failed)}")
+            return
         self.init_btn.config(text="Initialized ✓")
         self.listen_btn.config(state=tk.NORMAL)
+        if self.residency is not None:
+            self.residency.start()
+            if self.preload_on_focus:
+                self.root.bind("<FocusIn>", lambda _: self.residency.preload())
         self._set_status("Ready")
         print("[System] All models initialized.")
 
@@ -78,71 +131,64 @@ class VoiceAssistant:
         if self.is_running:
             return
         self.is_running = True
-        self._stop_requested = False
         self.listen_btn.config(state=tk.DISABLED, text="Listening...")
         self.stop_btn.config(state=tk.NORMAL)
         self._set_status("Listening...")
 
-        threading.Thread(target=self._pipeline, daemon=True).start()
+        self.runner.submit(
+            self.pipeline.converse(), lambda _: self.root.after(0, self._pipeline_done)
+        )
 
     def _on_stop(self):
-        self._stop_requested = True
         self.stop_btn.config(state=tk.DISABLED)
         self._set_status("Stopping...")
         print("[System] Stop requested.")
-
-        # Stop listening
-        if self.transcriber:
-            self.transcriber.stop()
-        # Stop speaking
-        if self.tts:
-            self.tts.stop()
-
-    def _pipeline(self):
-        try:
-            # 1. Listen and transcribe
-            text = self.transcriber.listen_and_transcribe()
-            if self._stop_requested or not text:
-                if not self._stop_requested:
-                    print("[System] No speech detected.")
-                self.root.after(0, self._pipeline_done)
-                return
-
-            print(f"\nYou: {text}")
-            self.root.after(0, lambda: self._set_status("Thinking..."))
-
-            # 2. Send to LLM
-            if self._stop_requested:
-                self.root.after(0, self._pipeline_done)
-                return
-            response = self.llm.chat(text, print_output=False)
-
-            if self._stop_requested:
-                self.root.after(0, self._pipeline_done)
-                return
-            print(f"LLM: {response}")
-            self.root.after(0, lambda: self._set_status("Speaking..."))
-
-            # 3. Speak the response
-            self.tts.process_play(response)
-
-        except Exception as e:
-            if not self._stop_requested:
-                print(f"[Error] {e}")
-        finally:
-            self.root.after(0, self._pipeline_done)
+        # Cancels whichever stages are running: listening, thinking, speaking
+        self.pipeline.cancel()
 
     def _pipeline_done(self):
         self.is_running = False
-        self._stop_requested = False
         self.listen_btn.config(state=tk.NORMAL, text="🎤 Talk")
         self.stop_btn.config(state=tk.DISABLED)
         self._set_status("Ready")
 
     def run(self):
         self.root.mainloop()
+        if self.residency is not None:
+            print(f"[Residency] {self.residency.stats()}")
 
 
 if __name__ == "__main__":
-    app = VoiceAssistant()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--lazy-whisper", action="store_true", help="load Whisper on the first Talk"
+    )
+    parser.add_argument(
+        "--full-duplex", action="store_true", help="interrupt replies by talking"
+    )
+    parser.add_argument(
+        "--speculative", action="store_true", help="request the reply at the first pause"
+    )
+    parser.add_argument(
+        "--response-cache", action="store_true", help="answer repeated questions from cache"
+    )
+    parser.add_argument(
+        "--idle-unload", type=float, metavar="SECONDS", help="free models after this idle time"
+    )
+    parser.add_argument(
+        "--min-available-mb", type=float, help="free models when memory runs lower"
+    )
+    parser.add_argument(
+        "--preload-on-focus", action="store_true", help="reload freed models on window focus"
+    )
+    args = parser.parse_args()
+    app = VoiceAssistant(
+        lazy_whisper=args.lazy_whisper,
+        full_duplex=args.full_duplex,
+        speculative=args.speculative,
+        response_cache=args.response_cache,
+        idle_unload=args.idle_unload,
+        min_available_mb=args.min_available_mb,
+        preload_on_focus=args.preload_on_focus,
+    )
     app.run()
@@ -1,8 +1,8 @@
 from time import perf_counter
+import argparse
 import functools
-import gc
-import torch
-import whisper
+from My_audio_cache import AudioCache
+from My_device import WhisperRuntime
 from tqdm import tqdm
 
 #? Helper function to get the runtime
@@ -19,35 +19,42 @@ def timeit(fcn):
     return wrapper
 
 @timeit
-def getTranscript(model_name:str, model, audio_path:str, language:str):
-    result = model.transcribe(audio_path, language=language, verbose=False, fp16=True)
+def getTranscript(model_name:str, model, audio, language:str, fp16:bool=True):
+    # audio: file path (decoded by ffmpeg on every call) or decoded 16 kHz samples
+    result = model.transcribe(audio, language=language, verbose=False, fp16=fp16)
     print(f">> {result['text']}")
     print("")
 
 
 # Configuration
-DEVICE = "mps"  # "cpu | gpu"
+DEVICE = None  # "cpu" | "cuda" | "mps", None picks the best available
 MODEL_DIR = "./models"
 
-model_names = ["large-v3-turbo"]
 
-# Get audio file
-audio_path = "./audios/CH_Where_is_toronto.m4a"
+def main():
+    # Compare models on one file; for whole directories use batch_transcribe.py
+    parser = argparse.ArgumentParser()
+    parser.add_argument("audio_path", nargs="?", default="./audios/CH_Where_is_toronto.m4a")
+    parser.add_argument("--language", default="Zh")
+    parser.add_argument("--models", nargs="+", default=["large-v3-turbo"])
+    parser.add_argument("--no-cache", action="store_true", help="decode with ffmpeg every time")
+    args = parser.parse_args()
+    runtime = WhisperRuntime(DEVICE)
+    # Decoded once, then shared by every model and later runs (cache/audio/)
+    audio = args.audio_path if args.no_cache else AudioCache.default().load(args.audio_path)
 
-# Load and process one model at a time to avoid OOM errors
-# for model_name in tqdm(model_names, desc="Processing models"):
-for model_name in model_names:
-    print(f"\nLoading {model_name}...")
-    model = whisper.load_model(
-        model_name,
-        device=DEVICE,
-        download_root=MODEL_DIR
-    )
+    # Load and process one model at a time to avoid OOM errors
+    # for model_name in tqdm(model_names, desc="Processing models"):
+    for model_name in args.models:
+        print(f"\nLoading {model_name}...")
+        model = runtime.load(model_name, MODEL_DIR, label="[Whisper]")
 
-    getTranscript(model_name, model, audio_path, "Zh")
+        getTranscript(model_name, model, audio, args.language, runtime.fp16)
 
-    # Free memory before loading next model
-    del model
-    gc.collect()
-    if DEVICE == "mps":
-        torch.mps.empty_cache()
\ No newline at end of file
+        # Free memory before loading next model
+        del model
+        runtime.release()
+
+
+if __name__ == "__main__":
+    main()